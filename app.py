@@ -1,10 +1,16 @@
-from flask import Flask, render_template, redirect, url_for, request, jsonify
+from flask import (
+    Flask, Response, render_template, redirect, url_for, request, jsonify, abort,
+    send_from_directory,
+)
 from dotenv import load_dotenv
+from jinja2 import FileSystemBytecodeCache
+import hmac
 import os
-from zoneinfo import ZoneInfo
-from datetime import datetime, date, time
+import time
+from dataclasses import replace
+from datetime import datetime, date
 
-from sqlalchemy import func
+from sqlalchemy import func, select
 from flask_login import (
     login_required,
     current_user,
@@ -13,113 +19,125 @@ from flask_login import (
 )
 
 from extensions import db, login_manager, cors
-from models import User, Mesa, Producto, Pedido, PedidoDetalle
+from models import User, Mesa, Producto, Pedido, PedidoDetalle, MutacionAplicada, TrabajoImpresion
+from zonas import UTC, BOG, to_bogota, bogota_now, bogota_day_to_utc_range
+import consultas
+import pedidos
+import versiones
+import eventos
+import caja
+import exportar
+import db_utils
+import reportes
+import catalogo
+import fragmentos
+import sincronizar
+import estaticos
+import compresion
+import impresion
+import perfiles_db
+import identidades
+import metricas
+import perfilado
+from catalogo import CATEGORIAS
 
 load_dotenv()
 
-app = Flask(__name__)
-
-# ---------- CONFIGURACIÓN ----------
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret")
-
-db_url = os.getenv("DATABASE_URL", "sqlite:///database.db")
-if db_url.startswith("postgres://"):
-    db_url = db_url.replace("postgres://", "postgresql://", 1)
-
-app.config["SQLALCHEMY_DATABASE_URI"] = db_url
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# ---------- INICIALIZAR EXTENSIONES ----------
-db.init_app(app)
-login_manager.init_app(app)
-cors.init_app(app)
-login_manager.login_view = "login"
-
-# ---------- CATEGORÍAS ----------
-CATEGORIAS = [
-    "especialidad",
-    "desayunos",
-    "almuerzos",
-    "porciones",
-    "bebidas calientes",
-    "bebidas frías",
-]
-
-# ---------- ZONAS HORARIAS ----------
-UTC = ZoneInfo("UTC")
-BOG = ZoneInfo("America/Bogota")
-
-
-def to_bogota(dt: datetime) -> datetime:
-    if not dt:
-        return dt
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=UTC)
-    return dt.astimezone(BOG)
-
-
-def bogota_now() -> datetime:
-    return datetime.now(tz=BOG)
-
-
-def bogota_day_to_utc_range(d: date):
-    inicio_bog = datetime.combine(d, time.min).replace(tzinfo=BOG)
-    fin_bog    = datetime.combine(d, time.max).replace(tzinfo=BOG)
-    inicio_utc = inicio_bog.astimezone(UTC).replace(tzinfo=None)
-    fin_utc    = fin_bog.astimezone(UTC).replace(tzinfo=None)
-    return inicio_utc, fin_utc
+# ---------- APLICACIÓN ----------
+def _db_url():
+    db_url = os.getenv("DATABASE_URL", "sqlite:///database.db")
+    if db_url.startswith("postgres://"):
+        db_url = db_url.replace("postgres://", "postgresql://", 1)
+    return db_url
 
 
-# ---------- SEED ----------
-def seed_users():
-    if not User.query.filter_by(username="admin").first():
-        admin = User(username="admin", role="admin", activo=True)
-        admin.set_password(os.getenv("ADMIN_PASSWORD", "admin123"))
-        db.session.add(admin)
-        print("✅ Usuario admin creado")
-    else:
-        print("ℹ️  Usuario admin ya existe")
-
-    if not User.query.filter_by(username="mesero").first():
-        mesero = User(username="mesero", role="mesero", activo=True)
-        mesero.set_password(os.getenv("MESERO_PASSWORD", "mesero123"))
-        db.session.add(mesero)
-        print("✅ Usuario mesero creado")
-    else:
-        print("ℹ️  Usuario mesero ya existe")
-
-    db.session.commit()
-
+def create_app():
+    """
+    Configuración, extensiones y comandos. No toca la BD: el esquema y los
+    datos base los prepara `flask --app app init-db`, una vez por despliegue,
+    así que un worker de gunicorn arranca sin consultas.
+    """
+    app = Flask(__name__)
+
+    # ---------- CONFIGURACIÓN ----------
+    app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret")
+
+    db_url = _db_url()
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    app.config["DB_PERFIL"] = perfiles_db.elegir(db_url)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = perfiles_db.opciones_engine(app.config["DB_PERFIL"], db_url)
+    if app.config["DB_PERFIL"] == "postgres-pooled":
+        necesarias, tope = perfiles_db.conexiones_por_worker()
+        if necesarias > tope:
+            app.logger.warning(
+                "pool de BD: %d hilos por worker y caben %d conexiones (DB_MAX_CONEXIONES); "
+                "los de sobra esperan turno", necesarias, tope,
+            )
 
-def seed_mesas(total=20):
-    existentes = Mesa.query.count()
-    if existentes == 0:
-        for i in range(1, total + 1):
-            db.session.add(Mesa(numero=i, estado="libre"))
-        db.session.commit()
-        print(f"✅ {total} mesas creadas")
-    else:
-        print(f"ℹ️  Ya existen {existentes} mesas")
+    # Plantillas compiladas a bytecode en disco: un worker nuevo (o un
+    # reinicio) no vuelve a parsear los .html.
+    cache_jinja = os.path.join(app.instance_path, "jinja")
+    os.makedirs(cache_jinja, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_jinja)
+
+    # ---------- INICIALIZAR EXTENSIONES ----------
+    db.init_app(app)
+    login_manager.init_app(app)
+    cors.init_app(app)
+    login_manager.login_view = "login"
+    impresion.instalar(app)
+
+    with app.app_context():
+        perfiles_db.instalar(app.config["DB_PERFIL"], db.engine)
+        # perfilado antes que metricas: su after_request (que escribe el
+        # reporte y corre EXPLAIN) se ejecuta al final y no ensucia las métricas.
+        perfilado.instalar(app, db.engine)
+        metricas.instalar(app, db.engine)
+    compresion.instalar(app)
+
+    # CSS/JS con huella (static/dist/, ver estaticos.py).
+    estaticos.cargar(app)
+    app.jinja_env.globals["estatico"] = estaticos.url
+
+    # ---------- COMANDOS ----------
+    @app.cli.command("init-db")
+    def init_db():
+        """Crea/migra el esquema y carga usuarios, mesas y productos base."""
+        import ini_db
+        ini_db.inicializar()
+
+    @app.cli.command("token-perfil")
+    def token_perfil():
+        """Token para la cabecera X-Perfil (vale una hora)."""
+        print(perfilado.token(app))
+
+    @app.cli.command("estaticos")
+    def construir_estaticos():
+        """Genera static/dist/: CSS/JS con huella, .gz y .br."""
+        manifiesto = estaticos.construir(app)
+        print(f"{len(manifiesto)} archivos en static/dist/")
+
+    @app.cli.command("impresora")
+    def impresora():
+        """Imprime la cola en este proceso (con IMPRESION_HILO=0 en la web)."""
+        impresion.trabajar(app)
+
+    return app
+
+
+def precompilar_templates(app):
+    """
+    Carga todas las plantillas en el entorno Jinja. gunicorn.conf.py lo
+    llama en el master (preload_app) para que los workers las hereden
+    compiladas al hacer fork.
+    """
+    for nombre in app.jinja_env.list_templates():
+        app.jinja_env.get_template(nombre)
 
 
-# ---------- ARRANQUE ----------
-with app.app_context():
-    try:
-        db_uri = app.config["SQLALCHEMY_DATABASE_URI"]
-        print(f"🔌 Conectando a: {db_uri[:40]}...")
-        if "sqlite" in db_uri:
-            print("⚠️  ADVERTENCIA: usando SQLite, no PostgreSQL.")
-        db.create_all()
-        print("✅ Tablas verificadas / creadas")
-        seed_users()
-        seed_mesas(20)
-        total_usuarios = User.query.count()
-        total_mesas    = Mesa.query.count()
-        print(f"📊 Estado DB → Usuarios: {total_usuarios} | Mesas: {total_mesas}")
-        print("✅ DB lista")
-    except Exception as e:
-        print(f"❌ Error al inicializar DB: {e}")
-        raise
+app = create_app()
 
 
 # ---------- FILTROS DE TEMPLATE ----------
@@ -166,11 +184,11 @@ def cop(value):
 # ---------- LOGIN MANAGER ----------
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    return identidades.cargar(int(user_id))
 
 
 def solo_admin():
-    return current_user.is_authenticated and (current_user.role or "").lower() == "admin"
+    return current_user.is_authenticated and current_user.role == "admin"
 
 
 # ---------- LOGIN ----------
@@ -185,7 +203,7 @@ def login():
             if hasattr(user, "activo") and not user.activo:
                 error = "Usuario desactivado. Contacta al administrador."
             else:
-                login_user(user)
+                login_user(identidades.recordar(user))
                 next_page = request.args.get("next")
                 if next_page:
                     return redirect(next_page)
@@ -210,7 +228,7 @@ def logout():
 @app.route("/mesas")
 @login_required
 def ver_mesas():
-    if (current_user.role or "").lower() != "mesero":
+    if current_user.role != "mesero":
         return redirect(url_for("login"))
     mesas = Mesa.query.order_by(Mesa.numero.asc()).all()
     return render_template("mesas.html", mesas=mesas)
@@ -219,10 +237,72 @@ def ver_mesas():
 @app.route("/mesas.json")
 @login_required
 def mesas_json():
-    if (current_user.role or "").lower() != "mesero":
+    if current_user.role != "mesero":
         return jsonify({"error": "forbidden"}), 403
-    mesas = Mesa.query.order_by(Mesa.numero.asc()).all()
-    return jsonify({"mesas": [{"id": m.id, "numero": m.numero, "estado": m.estado} for m in mesas]})
+
+    def construir():
+        mesas = Mesa.query.order_by(Mesa.numero.asc()).all()
+        return jsonify({"mesas": [{"id": m.id, "numero": m.numero, "estado": m.estado} for m in mesas]})
+
+    return versiones.respuesta_condicional(versiones.MESAS, construir)
+
+
+@app.route("/catalogo.json")
+@login_required
+def catalogo_json():
+    """Carta activa para el cliente offline; ETag = versión del catálogo."""
+    def construir():
+        carta = catalogo.obtener()
+        return jsonify({
+            "version":    carta.version,
+            "categorias": CATEGORIAS,
+            "productos":  [
+                {"id": p.id, "nombre": p.nombre, "precio": p.precio, "categoria": p.categoria}
+                for cat in CATEGORIAS for p in carta.por_categoria.get(cat, ())
+            ],
+        })
+
+    return versiones.respuesta_condicional(versiones.CATALOGO, construir)
+
+
+@app.route("/sw.js")
+def service_worker():
+    # Servido desde la raíz para que su alcance cubra /mesas y /mesa/<id>.
+    resp = send_from_directory(app.static_folder, "js/sw.js", mimetype="text/javascript", max_age=0)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+@app.route("/assets/<path:nombre>")
+def servir_estatico(nombre):
+    # Sin login: el CSS del login también sale de aquí.
+    return estaticos.servir(app, nombre)
+
+
+# ---------- EVENTOS EN VIVO (SSE) ----------
+@app.route("/events")
+@login_required
+def eventos_stream():
+    rol = current_user.role
+    if rol == "mesero":
+        tipos = ("mesa",)
+    elif rol == "admin":
+        tipos = ("mesa", "pedido")
+    else:
+        return jsonify({"error": "forbidden"}), 403
+
+    desde = request.headers.get("Last-Event-ID") or request.args.get("desde")
+    try:
+        desde_id = int(desde)
+    except (TypeError, ValueError):
+        desde_id = eventos.ultimo_id()
+
+    url_listen = perfiles_db.url_listen(app.config["DB_PERFIL"], db.engine)
+    resp = Response(eventos.stream(db.engine, desde_id, tipos, url_listen),
+                    mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
 
 
 # ---------- MESERO: EDITAR DETALLE DE PEDIDO ABIERTO ----------
@@ -230,172 +310,347 @@ def mesas_json():
 @login_required
 def editar_detalle(pedido_id, detalle_id):
     """
-    Cambia la cantidad de un ítem del pedido abierto.
+    Cambia la cantidad de un ítem del pedido abierto (formulario).
     Si la nueva cantidad es 0, elimina el ítem.
-    Si el pedido queda sin ítems, lo cierra y libera la mesa.
-    Solo el mesero dueño del pedido puede editarlo.
+    Si el pedido queda sin ítems, lo cancela y libera la mesa.
+    Solo el mesero dueño del pedido puede editarlo. Mismo camino que
+    editar_lineas: mesa bloqueada, 409 si el pedido ya no está abierto.
     """
-    if (current_user.role or "").lower() != "mesero":
+    if current_user.role != "mesero":
         return redirect(url_for("login"))
 
-    pedido  = Pedido.query.get_or_404(pedido_id)
-    detalle = PedidoDetalle.query.get_or_404(detalle_id)
-
+    fila = db.session.execute(
+        select(Pedido.mesa_id, Pedido.mesero_id).where(Pedido.id == pedido_id)
+    ).first()
+    if fila is None:
+        abort(404)
     # Seguridad: el pedido debe pertenecer al mesero logueado
-    if pedido.mesero_id != current_user.id:
+    if fila.mesero_id != current_user.id:
         return redirect(url_for("ver_mesas"))
 
-    # Seguridad: el detalle debe pertenecer al pedido
-    if detalle.pedido_id != pedido.id:
-        return redirect(url_for("menu_mesa", mesa_id=pedido.mesa_id))
-
     accion = request.form.get("accion", "")  # "sumar", "restar", "eliminar"
+    if accion not in pedidos.ACCIONES:
+        return redirect(url_for("menu_mesa", mesa_id=fila.mesa_id))
+
+    def aplicar():
+        db_utils.bloquear(Mesa, fila.mesa_id)
+        estado = db.session.execute(select(Pedido.estado).where(Pedido.id == pedido_id)).scalar()
+        if estado != "abierto":
+            db.session.rollback()
+            abort(409)
+
+        # Un detalle ajeno al pedido (o ya borrado por otro envío) no cambia nada.
+        restantes = pedidos.editar_linea(pedido_id, detalle_id, accion)
+        if restantes is None:
+            db.session.rollback()
+            return
+        if restantes == 0:
+            pedidos.cancelar_vacio(pedido_id)
+            eventos.pedido_cambiado(pedido_id, "cancelado")
+            mesa = db.session.get(Mesa, fila.mesa_id)
+            mesa.estado = "libre"
+            eventos.mesa_cambiada(mesa)
+        else:
+            eventos.pedido_cambiado(pedido_id, "actualizado")
+        db.session.commit()
 
-    if accion == "eliminar" or (accion == "restar" and detalle.cantidad <= 1):
-        db.session.delete(detalle)
-    elif accion == "sumar":
-        detalle.cantidad += 1
-    elif accion == "restar":
-        detalle.cantidad -= 1
+    db_utils.reintentar(aplicar)
+    return redirect(url_for("menu_mesa", mesa_id=fila.mesa_id))
 
-    db.session.flush()
 
-    # Si el pedido quedó sin ítems, liberamos la mesa
-    ítems_restantes = PedidoDetalle.query.filter_by(pedido_id=pedido.id).count()
-    if ítems_restantes == 0:
-        pedido.estado = "cancelado"
-        mesa = db.session.get(Mesa, pedido.mesa_id)
-        if mesa:
-            mesa.estado = "libre"
+@app.route("/pedido/<int:pedido_id>/lineas", methods=["POST"])
+@login_required
+def editar_lineas(pedido_id):
+    """
+    Versión JSON de editar_detalle para el menú: uno o varios cambios de
+    línea en una petición, sin redirección ni página nueva.
+        {"id": "<uuid>", "cambios": [{"detalle_id": 5, "delta": -1}, {"detalle_id": 7, "eliminar": true}]}
+    El id (opcional) queda en mutacion_aplicada como los de /sync: un
+    reenvío con el mismo id responde el estado actual sin tocar nada.
+    Responde solo lo que cambió: la cantidad de esas líneas (0 = borrada),
+    items/total del pedido y el estado de la mesa.
+    """
+    if current_user.role != "mesero":
+        return jsonify({"error": "forbidden"}), 403
 
-    db.session.commit()
-    return redirect(url_for("menu_mesa", mesa_id=pedido.mesa_id))
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict):
+        return jsonify({"error": "cambio inválido"}), 400
+    try:
+        cambios = pedidos.leer_cambios(datos.get("cambios") or [])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not cambios:
+        return jsonify({"error": "sin cambios"}), 400
+    # Id de la edición (lo genera el navegador): si la respuesta se pierde
+    # y el cambio se reenvía por aquí o por /sync, no se aplica dos veces.
+    mutacion_id = datos.get("id")
+    if mutacion_id is not None and (not isinstance(mutacion_id, str) or not 0 < len(mutacion_id) <= 40):
+        return jsonify({"error": "id inválido"}), 400
+
+    fila = db.session.execute(
+        select(Pedido.mesa_id, Pedido.mesero_id).where(Pedido.id == pedido_id)
+    ).first()
+    if fila is None:
+        abort(404)
+    if fila.mesero_id != current_user.id:
+        return jsonify({"error": "forbidden"}), 403
+
+    def aplicar():
+        # Misma mesa bloqueada que en pedidos.enviar: un envío no puede
+        # sumar líneas a un pedido que esta edición deja cancelado.
+        db_utils.bloquear(Mesa, fila.mesa_id)
+        if mutacion_id is not None and db.session.get(MutacionAplicada, mutacion_id) is not None:
+            estado, cantidades, items, total = pedidos.estado_lineas(pedido_id, cambios)
+            mesa = db.session.get(Mesa, fila.mesa_id)
+            db.session.rollback()
+            return jsonify({
+                "pedido_id": pedido_id,
+                "estado":    estado,
+                "items":     items,
+                "total":     total,
+                "lineas":    [{"id": i, "cantidad": n} for i, n in cantidades.items()],
+                "mesa":      {"id": mesa.id, "estado": mesa.estado},
+                "repetida":  True,
+            })
+        estado = db.session.execute(select(Pedido.estado).where(Pedido.id == pedido_id)).scalar()
+        if estado != "abierto":
+            db.session.rollback()
+            return jsonify({"error": "el pedido ya no está abierto", "estado": estado}), 409
+
+        cantidades, items, total = pedidos.ajustar_lineas(pedido_id, cambios)
+        estado_mesa = "ocupada"
+        if items == 0:
+            estado, estado_mesa = "cancelado", "libre"
+            pedidos.cancelar_vacio(pedido_id)
+            eventos.pedido_cambiado(pedido_id, "cancelado")
+            mesa = db.session.get(Mesa, fila.mesa_id)
+            mesa.estado = estado_mesa
+            eventos.mesa_cambiada(mesa)
+        elif cantidades:
+            eventos.pedido_cambiado(pedido_id, "actualizado")
+        if mutacion_id is not None:
+            db.session.add(MutacionAplicada(id=mutacion_id, mesero_id=current_user.id))
+        db.session.commit()
+        return jsonify({
+            "pedido_id": pedido_id,
+            "estado":    estado,
+            "items":     items,
+            "total":     total,
+            "lineas":    [{"id": i, "cantidad": n} for i, n in cantidades.items()],
+            "mesa":      {"id": fila.mesa_id, "estado": estado_mesa},
+        })
+
+    return db_utils.reintentar(aplicar)
 
 
 # ---------- MESERO: COMANDA ----------
 @app.route("/mesero/comanda/<int:pedido_id>")
 @login_required
 def comanda_mesero(pedido_id):
-    if (current_user.role or "").lower() != "mesero":
+    if current_user.role != "mesero":
         return redirect(url_for("login"))
-    pedido = Pedido.query.get_or_404(pedido_id)
+    pedido = consultas.cargar_pedido(pedido_id)
+    if not pedido:
+        abort(404)
     if pedido.mesero_id != current_user.id:
         return redirect(url_for("ver_mesas"))
+    return render_template("comanda.html", pedido=pedido, items=pedido.lineas, total=pedido.total)
 
-    items = []
-    total = 0.0
-    for d in pedido.detalles:
-        precio   = float(d.producto.precio)
-        cantidad = int(d.cantidad)
-        subtotal = precio * cantidad
-        total   += subtotal
-        items.append({
-            "nombre":   d.producto.nombre,
-            "cantidad": cantidad,
-            "precio":   precio,
-            "subtotal": subtotal
-        })
-    return render_template("comanda.html", pedido=pedido, items=items, total=total)
+
+@app.route("/mesero/comanda/<int:pedido_id>.json")
+@login_required
+def comanda_mesero_json(pedido_id):
+    """
+    Líneas y total de la comanda. ETag = versión del pedido: mientras no
+    cambie, el polling recibe 304 tras leer una sola fila.
+    """
+    if current_user.role != "mesero":
+        return jsonify({"error": "forbidden"}), 403
+    dueno = consultas.dueno_y_version(pedido_id)
+    if dueno is None:
+        abort(404)
+    mesero_id, version = dueno
+    if mesero_id != current_user.id:
+        return jsonify({"error": "forbidden"}), 403
+
+    def construir():
+        return jsonify(pedido_mesero_json(consultas.cargar_pedido(pedido_id)))
+
+    return versiones.respuesta_con_etag(f"pedido-{pedido_id}-{version}", construir)
 
 
 # ---------- MESERO: MENÚ / ENVIAR PEDIDO ----------
+def items_del_form(form, carta):
+    """
+    {producto_id: cantidad} a partir de los campos producto_<id> enviados.
+    Solo recorre lo que llegó en el form y descarta ids fuera del catálogo.
+    """
+    items = {}
+    for campo, valor in form.items():
+        if not campo.startswith("producto_"):
+            continue
+        try:
+            producto_id = int(campo[len("producto_"):])
+            cantidad    = int(valor)
+        except ValueError:
+            continue
+        if cantidad > 0 and producto_id in carta.por_id:
+            items[producto_id] = items.get(producto_id, 0) + cantidad
+    return items
+
+
+
 @app.route("/mesa/<int:mesa_id>", methods=["GET", "POST"])
 @login_required
 def menu_mesa(mesa_id):
-    if (current_user.role or "").lower() != "mesero":
+    if current_user.role != "mesero":
         return redirect(url_for("login"))
 
     mesa = Mesa.query.get_or_404(mesa_id)
-
-    productos = (
-        Producto.query
-        .filter_by(activo=True)
-        .order_by(Producto.categoria.asc(), Producto.nombre.asc())
-        .all()
-    )
-
-    pedido_abierto = (
-        Pedido.query
-        .filter_by(mesa_id=mesa.id, estado="abierto")
-        .order_by(Pedido.fecha.desc())
-        .first()
-    )
-
-    cantidades_en_pedido = {}
-    if pedido_abierto:
-        for d in (pedido_abierto.detalles or []):
-            cantidades_en_pedido[d.producto_id] = int(d.cantidad)
-
-    productos_por_categoria = {c: [] for c in CATEGORIAS}
-    for p in productos:
-        cat = (getattr(p, "categoria", None) or "almuerzos").strip().lower()
-        if cat not in productos_por_categoria:
-            cat = "almuerzos"
-        productos_por_categoria[cat].append(p)
+    carta = catalogo.obtener()
+    error = None
 
     if request.method == "POST":
-        items = []
-        for producto in productos:
-            cantidad_str = request.form.get(f"producto_{producto.id}", "0")
-            try:
-                cantidad = int(cantidad_str)
-            except ValueError:
-                cantidad = 0
-            if cantidad > 0:
-                items.append((producto.id, cantidad))
-
-        if not items:
-            return render_template(
-                "menu.html",
-                mesa=mesa,
-                categorias=CATEGORIAS,
-                productos_por_categoria=productos_por_categoria,
-                pedido_abierto=pedido_abierto,
-                cantidades_en_pedido=cantidades_en_pedido,
-                error="No seleccionaste ningún producto. El pedido no se envió."
-            )
-
-        pedido = pedido_abierto
-        if not pedido:
-            pedido = Pedido(mesa_id=mesa.id, mesero_id=current_user.id, estado="abierto")
-            db.session.add(pedido)
-            db.session.flush()
-
-        for producto_id, cantidad in items:
-            detalle_existente = (
-                PedidoDetalle.query
-                .filter_by(pedido_id=pedido.id, producto_id=producto_id)
-                .first()
-            )
-            if detalle_existente:
-                detalle_existente.cantidad += cantidad
-            else:
-                db.session.add(PedidoDetalle(
-                    pedido_id=pedido.id,
-                    producto_id=producto_id,
-                    cantidad=cantidad
-                ))
-
-        mesa.estado = "ocupada"
-        db.session.commit()
-        return redirect(url_for("menu_mesa", mesa_id=mesa.id))
+        items = items_del_form(request.form, carta)
+
+        if items:
+            # Lectura del pedido abierto, alta y líneas en una transacción
+            # con la mesa bloqueada; si choca con otro envío se repite.
+            def enviar():
+                pedido_id, creado = pedidos.enviar(mesa.id, current_user.id, items, carta)
+                # mesa se leyó antes del candado: un pedido nuevo siempre la ocupa.
+                if creado or mesa.estado != "ocupada":
+                    mesa.estado = "ocupada"
+                    eventos.mesa_cambiada(mesa)
+                eventos.pedido_cambiado(pedido_id, "creado" if creado else "actualizado")
+                impresion.encolar_cocina(pedido_id, mesa.numero, current_user.username, items, carta, creado)
+                db.session.commit()
+
+            db_utils.reintentar(enviar)
+            return redirect(url_for("menu_mesa", mesa_id=mesa.id))
+        error = "No seleccionaste ningún producto. El pedido no se envió."
+
+    pedido_abierto = consultas.cargar_pedido_abierto(mesa.id)
+
+    # La carta es igual para todas las mesas: se renderiza una vez por
+    # versión del catálogo. Lo que ya lleva el pedido lo marca menu.js a
+    # partir de la tarjeta del pedido actual.
+    lista_productos = fragmentos.obtener(
+        catalogo.FRAGMENTO_CARTA, carta.version,
+        lambda: render_template(
+            "menu_productos.html",
+            categorias=CATEGORIAS,
+            productos_por_categoria=carta.por_categoria,
+        ),
+    )
 
     return render_template(
         "menu.html",
         mesa=mesa,
-        categorias=CATEGORIAS,
-        productos_por_categoria=productos_por_categoria,
+        lista_productos=lista_productos,
         pedido_abierto=pedido_abierto,
-        cantidades_en_pedido=cantidades_en_pedido,
-        error=None
+        error=error,
+        generado=int(time.time() * 1000),
     )
 
 
+# ---------- MESERO: COLA OFFLINE ----------
+@app.route("/sync", methods=["POST"])
+@login_required
+def sincronizar_lote():
+    """
+    Aplica un lote de la cola offline (ver sincronizar.py) en una
+    transacción y devuelve el estado de las mesas y sus pedidos abiertos.
+    "ver": mesas cuyo pedido se quiere de vuelta aunque el lote no las toque.
+    """
+    if current_user.role != "mesero":
+        return jsonify({"error": "forbidden"}), 403
+    datos = request.get_json(silent=True)
+    mutaciones = datos.get("mutaciones", []) if isinstance(datos, dict) else None
+    if not isinstance(mutaciones, list) or len(mutaciones) > sincronizar.MAXIMO_LOTE:
+        return jsonify({"error": "lote inválido"}), 400
+    pedidas = datos.get("ver")
+    if pedidas is None:
+        pedidas = []
+    elif not isinstance(pedidas, (list, dict)):
+        return jsonify({"error": "ver inválido"}), 400
+    ver = set()
+    for mesa_id in pedidas:
+        if isinstance(mesa_id, int) and not isinstance(mesa_id, bool):
+            ver.add(mesa_id)
+
+    carta = catalogo.obtener()
+
+    def aplicar():
+        resultado = sincronizar.aplicar(mutaciones, current_user.id, current_user.username, carta)
+        db.session.commit()
+        return resultado
+
+    resultado = db_utils.reintentar(aplicar) if mutaciones else {"aplicadas": [], "rechazadas": [], "mesas": []}
+
+    mesas = Mesa.query.order_by(Mesa.numero.asc()).all()
+    consultadas = ver.union(resultado["mesas"])
+    abiertos = {p.mesa_id: p for p in consultas.cargar_pedidos_abiertos(consultadas)} if consultadas else {}
+    return jsonify({
+        "aplicadas":  resultado["aplicadas"],
+        "rechazadas": resultado["rechazadas"],
+        "mesas":      [{"id": m.id, "numero": m.numero, "estado": m.estado} for m in mesas],
+        "pedidos":    {
+            str(mesa_id): pedido_mesero_json(abiertos[mesa_id]) if mesa_id in abiertos else None
+            for mesa_id in sorted(consultadas)
+        },
+    })
+
+
+# ---------- SERIALIZACIÓN ----------
+def pedido_mesero_json(p):
+    """Pedido para las vistas del mesero (comanda, menú, /sync)."""
+    return {
+        "id":      p.id,
+        "version": p.version,
+        "estado":  p.estado,
+        "total":   p.total,
+        "items":   p.items,
+        "lineas":  [
+            {
+                "id":          d.id,
+                "producto_id": d.producto_id,
+                "nombre":      d.nombre,
+                "precio":      d.precio,
+                "cantidad":    d.cantidad,
+                "subtotal":    d.subtotal,
+            }
+            for d in p.lineas
+        ],
+    }
+
+
+def pedido_json(p):
+    return {
+        "id":       p.id,
+        "mesa":     p.mesa_numero,
+        "mesero":   p.mesero,
+        "fecha":    to_bogota(p.fecha).strftime("%d/%m/%Y %H:%M") if p.fecha else "",
+        "hora":     hora_bogota_filter(p.fecha),
+        "detalles": [
+            {
+                "nombre":   d.nombre,
+                "cantidad": d.cantidad,
+                "precio":   d.precio,
+                "subtotal": d.subtotal
+            }
+            for d in p.lineas
+        ],
+        "total":    p.total
+    }
+
+
 # ---------- ADMIN: PANEL ----------
 @app.route("/admin")
 @login_required
 def admin_panel():
-    if (current_user.role or "").lower() != "admin":
+    if current_user.role != "admin":
         return redirect(url_for("login"))
 
     pedidos_abiertos_count  = Pedido.query.filter_by(estado="abierto").count()
@@ -404,13 +659,7 @@ def admin_panel():
     meseros_activos_count   = User.query.filter(
         func.lower(User.role) == "mesero", User.activo == True
     ).count()
-    pedidos_cerrados = (
-        Pedido.query
-        .filter_by(estado="cerrado")
-        .order_by(Pedido.fecha_cierre.desc())
-        .limit(20)
-        .all()
-    )
+    pedidos_cerrados, _ = consultas.historial(estado="cerrado", limite=20)
     return render_template(
         "admin.html",
         pedidos_cerrados=pedidos_cerrados,
@@ -424,7 +673,7 @@ def admin_panel():
 @app.route("/admin/pedidos")
 @login_required
 def admin_pedidos():
-    if (current_user.role or "").lower() != "admin":
+    if current_user.role != "admin":
         return redirect(url_for("login"))
     return render_template("admin_pedidos.html")
 
@@ -432,57 +681,93 @@ def admin_pedidos():
 @app.route("/admin/pedidos.json")
 @login_required
 def admin_pedidos_json():
-    if (current_user.role or "").lower() != "admin":
+    if current_user.role != "admin":
         return jsonify({"error": "forbidden"}), 403
 
-    pedidos = (
-        Pedido.query
-        .filter_by(estado="abierto")
-        .order_by(Pedido.fecha.desc())
-        .all()
-    )
+    since = request.args.get("since", "").strip()
+    if since:
+        try:
+            return pedidos_delta(int(since))
+        except ValueError:
+            return jsonify({"error": "since inválido"}), 400
+
+    # Lista completa (carga inicial o "Actualizar" del panel): ETag = versión
+    # de pedidos, el navegador la revalida y recibe 304 si nada cambió.
+    def construir():
+        cursor  = eventos.ultimo_id()
+        pedidos = consultas.cargar_pedidos_abiertos()
+        return jsonify({
+            "completo": True,
+            "cursor":   cursor,
+            "pedidos":  [pedido_json(p) for p in pedidos],
+        })
 
-    data = []
-    for p in pedidos:
-        detalles = []
-        total = 0.0
-        for d in p.detalles:
-            precio   = float(d.producto.precio)
-            cantidad = int(d.cantidad)
-            subtotal = precio * cantidad
-            total   += subtotal
-            detalles.append({
-                "nombre":   d.producto.nombre,
-                "cantidad": cantidad,
-                "precio":   precio,
-                "subtotal": subtotal
-            })
-        data.append({
-            "id":       p.id,
-            "mesa":     p.mesa.numero,
-            "mesero":   p.mesero.username,
-            "fecha":    to_bogota(p.fecha).strftime("%d/%m/%Y %H:%M") if p.fecha else "",
-            "hora":     hora_bogota_filter(p.fecha),
-            "detalles": detalles,
-            "total":    total
+    return versiones.respuesta_condicional(versiones.PEDIDOS, construir)
+
+
+def pedidos_delta(desde_id):
+    """
+    Solo los pedidos creados, cambiados o cerrados después del cursor
+    (id de evento). Los que ya no están abiertos van como lápidas en
+    "eliminados". Si el cursor es demasiado viejo se manda la lista completa.
+    """
+    cursor = eventos.ultimo_id()
+    if desde_id >= cursor:
+        return jsonify({"completo": False, "cursor": cursor, "pedidos": [], "eliminados": []})
+
+    ids = eventos.pedidos_cambiados(desde_id, cursor)
+    if ids is None:
+        pedidos = consultas.cargar_pedidos_abiertos()
+        return jsonify({
+            "completo": True,
+            "cursor":   cursor,
+            "pedidos":  [pedido_json(p) for p in pedidos],
         })
-    return jsonify({"pedidos": data})
+
+    abiertos, eliminados = [], []
+    encontrados = set()
+    for p in consultas.cargar_pedidos(ids):
+        encontrados.add(p.id)
+        if p.estado == "abierto":
+            abiertos.append(pedido_json(p))
+        else:
+            eliminados.append({"id": p.id, "estado": p.estado})
+    eliminados += [{"id": i, "estado": "eliminado"} for i in ids - encontrados]
+
+    return jsonify({
+        "completo":   False,
+        "cursor":     cursor,
+        "pedidos":    abiertos,
+        "eliminados": eliminados,
+    })
 
 
 # ---------- ADMIN: CERRAR PEDIDO ----------
 @app.route("/admin/pedido/<int:pedido_id>/cerrar", methods=["POST"])
 @login_required
 def cerrar_pedido(pedido_id):
-    if (current_user.role or "").lower() != "admin":
+    if current_user.role != "admin":
         return redirect(url_for("login"))
     pedido = Pedido.query.get_or_404(pedido_id)
-    if pedido.estado != "cerrado":
-        pedido.estado       = "cerrado"
-        pedido.fecha_cierre = datetime.utcnow()
-        mesa = db.session.get(Mesa, pedido.mesa_id)
+    mesa_id = pedido.mesa_id
+
+    def aplicar():
+        # Mismo orden de candados que enviar/editar: primero la mesa. El
+        # UPDATE condicional decide quién cierra si dos llegan a la vez.
+        db_utils.bloquear(Mesa, mesa_id)
+        if not pedidos.cerrar(pedido_id):
+            db.session.rollback()
+            abort(409)
+        pedido = db.session.get(Pedido, pedido_id, populate_existing=True)
+        caja.registrar_pedido(pedido)
+        eventos.pedido_cambiado(pedido.id, "cerrado")
+        mesa = db.session.get(Mesa, mesa_id)
         if mesa:
             mesa.estado = "libre"
+            eventos.mesa_cambiada(mesa)
         db.session.commit()
+
+    db_utils.reintentar(aplicar)
     return redirect(url_for("admin_panel"))
 
 
@@ -490,63 +775,88 @@ def cerrar_pedido(pedido_id):
 @app.route("/admin/pedido/<int:pedido_id>/cobrar", methods=["POST"])
 @login_required
 def cobrar_pedido(pedido_id):
-    if (current_user.role or "").lower() != "admin":
+    if current_user.role != "admin":
         return redirect(url_for("login"))
 
-    pedido             = Pedido.query.get_or_404(pedido_id)
+    fila = db.session.execute(select(Pedido.mesa_id).where(Pedido.id == pedido_id)).first()
+    if fila is None:
+        abort(404)
     metodo_pago        = (request.form.get("metodo_pago") or "").strip().lower()
     monto_recibido_raw = (request.form.get("monto_recibido") or "").strip()
 
-    total = 0.0
-    for d in pedido.detalles:
-        total += float(d.producto.precio) * int(d.cantidad)
+    def aplicar():
+        # Candado de la mesa antes de leer: el total es el que se cobra y
+        # ninguna edición lo cambia hasta el commit.
+        db_utils.bloquear(Mesa, fila.mesa_id)
+        lectura = consultas.cargar_pedido(pedido_id)
+        if lectura.estado != "abierto":
+            # Ya cobrado, o cancelado por el mesero: no se cobra de nuevo.
+            db.session.rollback()
+            abort(409)
 
-    cambio = 0.0
-    monto_recibido = None
+        total = lectura.total
 
-    if metodo_pago == "efectivo":
-        try:
-            monto_recibido = float(monto_recibido_raw)
-        except ValueError:
-            monto_recibido = 0.0
-        cambio = monto_recibido - total
-        if cambio < 0:
-            return redirect(url_for("ver_factura", pedido_id=pedido.id, error="pago_insuficiente"))
-    elif metodo_pago in ["transferencia", "tarjeta"]:
-        monto_recibido = total
-        cambio = 0.0
-    else:
-        return redirect(url_for("ver_factura", pedido_id=pedido.id, error="metodo_invalido"))
+        cambio = 0
+        monto_recibido = None
 
-    pedido.estado         = "cerrado"
-    pedido.metodo_pago    = metodo_pago
-    pedido.monto_recibido = monto_recibido
-    pedido.cambio         = cambio
-    pedido.fecha_cierre   = datetime.utcnow()
+        if metodo_pago == "efectivo":
+            try:
+                monto_recibido = caja.pesos(monto_recibido_raw)
+            except ValueError:
+                monto_recibido = 0
+            cambio = monto_recibido - total
+            if cambio < 0:
+                db.session.rollback()
+                return redirect(url_for("ver_factura", pedido_id=pedido_id, error="pago_insuficiente"))
+        elif metodo_pago in ["transferencia", "tarjeta"]:
+            monto_recibido = total
+            cambio = 0
+        else:
+            db.session.rollback()
+            return redirect(url_for("ver_factura", pedido_id=pedido_id, error="metodo_invalido"))
+
+        # Solo una petición pasa de abierto a cerrado; la otra no vuelve a
+        # sumar el pedido a venta_dia ni a imprimir la factura.
+        if not pedidos.cerrar(pedido_id, metodo_pago=metodo_pago,
+                              monto_recibido=monto_recibido, cambio=cambio):
+            db.session.rollback()
+            abort(409)
+        pedido = db.session.get(Pedido, pedido_id, populate_existing=True)
+        caja.registrar_pedido(pedido)
+
+        eventos.pedido_cambiado(pedido.id, "cerrado")
+        mesa = db.session.get(Mesa, pedido.mesa_id)
+        if mesa:
+            mesa.estado = "libre"
+            eventos.mesa_cambiada(mesa)
+
+        # La factura va a la cola de impresión en la misma transacción; sin
+        # impresora de caja se imprime desde el navegador como antes.
+        trabajo_id = impresion.encolar_factura(replace(
+            lectura,
+            estado="cerrado",
+            metodo_pago=metodo_pago,
+            monto_recibido=monto_recibido,
+            cambio=cambio,
+            fecha_cierre=pedido.fecha_cierre,
+        ))
 
-    mesa = db.session.get(Mesa, pedido.mesa_id)
-    if mesa:
-        mesa.estado = "libre"
+        db.session.commit()
+        if trabajo_id is None:
+            return redirect(url_for("ver_factura", pedido_id=pedido.id, print=1))
+        return redirect(url_for("ver_factura", pedido_id=pedido.id, trabajo=trabajo_id))
 
-    db.session.commit()
-    return redirect(url_for("ver_factura", pedido_id=pedido.id, print=1))
+    return db_utils.reintentar(aplicar)
 
 
 # ---------- ADMIN: CAJA ----------
 @app.route("/admin/caja")
 @login_required
 def caja_dia():
-    if (current_user.role or "").lower() != "admin":
+    if current_user.role != "admin":
         return redirect(url_for("login"))
 
-    fechas_rows = (
-        db.session.query(func.date(Pedido.fecha_cierre))
-        .filter(Pedido.estado == "cerrado", Pedido.fecha_cierre.isnot(None))
-        .group_by(func.date(Pedido.fecha_cierre))
-        .order_by(func.date(Pedido.fecha_cierre).desc())
-        .all()
-    )
-    fechas_disponibles = [str(r[0]) for r in fechas_rows if r[0] is not None]
+    fechas_disponibles = [str(d) for d in caja.dias_disponibles()]
 
     fecha_str = request.args.get("fecha", "").strip()
     if fecha_str and fecha_str in fechas_disponibles:
@@ -554,55 +864,10 @@ def caja_dia():
     else:
         dia = datetime.strptime(fechas_disponibles[0], "%Y-%m-%d").date() if fechas_disponibles else date.today()
 
-    inicio_utc, fin_utc = bogota_day_to_utc_range(dia)
-
-    pedidos = (
-        Pedido.query
-        .filter(
-            Pedido.estado == "cerrado",
-            Pedido.fecha_cierre.isnot(None),
-            Pedido.fecha_cierre >= inicio_utc,
-            Pedido.fecha_cierre <= fin_utc
-        )
-        .order_by(Pedido.fecha_cierre.desc())
-        .all()
-    )
-
-    total_dia  = 0.0
-    conteo     = len(pedidos)
-    por_metodo = {"efectivo": 0.0, "transferencia": 0.0, "tarjeta": 0.0, "otro": 0.0}
-    pedidos_info = []
-    top = {}
-
-    for p in pedidos:
-        total_pedido = 0.0
-        for d in p.detalles:
-            subtotal = float(d.producto.precio) * int(d.cantidad)
-            total_pedido += subtotal
-            nombre = d.producto.nombre
-            if nombre not in top:
-                top[nombre] = {"cantidad": 0, "ventas": 0.0}
-            top[nombre]["cantidad"] += int(d.cantidad)
-            top[nombre]["ventas"]   += subtotal
-        total_dia += total_pedido
-        metodo = (p.metodo_pago or "otro").lower()
-        if metodo not in por_metodo:
-            metodo = "otro"
-        por_metodo[metodo] += total_pedido
-        hora_ok = to_bogota(p.fecha_cierre).strftime("%H:%M") if p.fecha_cierre else ""
-        pedidos_info.append({
-            "id":     p.id,
-            "mesa":   p.mesa.numero,
-            "hora":   hora_ok,
-            "metodo": (p.metodo_pago or "otro"),
-            "total":  total_pedido,
-        })
-
-    ticket_promedio = (total_dia / conteo) if conteo > 0 else 0.0
-    top_lista = sorted(
-        [{"nombre": k, "cantidad": v["cantidad"], "ventas": v["ventas"]} for k, v in top.items()],
-        key=lambda x: x["ventas"], reverse=True
-    )[:10]
+    total_dia, por_metodo, top_lista = caja.resumen_dia(dia)
+    pedidos_info    = caja.pedidos_del_dia(dia)
+    conteo          = len(pedidos_info)
+    ticket_promedio = (total_dia // conteo) if conteo > 0 else 0
 
     return render_template(
         "caja.html",
@@ -617,40 +882,220 @@ def caja_dia():
     )
 
 
+@app.route("/admin/caja/exportar.csv")
+@login_required
+def caja_exportar():
+    """CSV de pedidos cobrados entre ?desde y ?hasta (días de Bogotá, inclusive)."""
+    if current_user.role != "admin":
+        return redirect(url_for("login"))
+    try:
+        desde = date.fromisoformat(request.args.get("desde", ""))
+        hasta = date.fromisoformat(request.args.get("hasta") or str(desde))
+    except ValueError:
+        abort(400)
+    if hasta < desde:
+        desde, hasta = hasta, desde
+
+    resp = Response(exportar.csv_pedidos(db.engine, desde, hasta), mimetype="text/csv")
+    resp.headers["Content-Disposition"] = f'attachment; filename="pedidos_{desde}_{hasta}.csv"'
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+# ---------- ADMIN: HISTORIAL ----------
+def _filtros_historial() -> dict:
+    """Filtros de ?desde&hasta&mesa&mesero&metodo&estado. abort(400) si no se entienden."""
+    args = request.args
+    try:
+        filtros = {
+            "desde":     date.fromisoformat(args["desde"]) if args.get("desde") else None,
+            "hasta":     date.fromisoformat(args["hasta"]) if args.get("hasta") else None,
+            "mesa":      int(args["mesa"]) if args.get("mesa") else None,
+            "mesero_id": int(args["mesero"]) if args.get("mesero") else None,
+            "metodo":    args.get("metodo") or None,
+            "estado":    args.get("estado") or None,
+        }
+    except ValueError:
+        abort(400)
+    if filtros["metodo"] not in (None, *caja.METODOS):
+        abort(400)
+    if filtros["estado"] not in (None, *consultas.ESTADOS_TERMINADOS):
+        abort(400)
+    return filtros
+
+
+def _pagina_historial(filtros):
+    try:
+        return consultas.historial(despues=request.args.get("despues") or None, **filtros)
+    except ValueError:          # cursor mal formado
+        abort(400)
+
+
+def historial_json(p):
+    return {
+        "id":     p.id,
+        "mesa":   p.mesa_numero,
+        "mesero": p.mesero,
+        "estado": p.estado,
+        "cierre": to_bogota(p.fecha_cierre).strftime("%d/%m/%Y %H:%M"),
+        "metodo": p.metodo_pago,
+        "items":  p.items,
+        "total":  p.total,
+    }
+
+
+@app.route("/admin/historial")
+@login_required
+def admin_historial():
+    if current_user.role != "admin":
+        return redirect(url_for("login"))
+    filtros = _filtros_historial()
+    pagina, siguiente = _pagina_historial(filtros)
+    meseros = User.query.filter(func.lower(User.role) == "mesero").order_by(User.username).all()
+    return render_template(
+        "admin_historial.html",
+        pedidos=pagina,
+        siguiente=siguiente,
+        primera=not request.args.get("despues"),
+        filtros={k: v for k, v in request.args.items() if k != "despues" and v},
+        meseros=meseros,
+        metodos=caja.METODOS,
+        estados=consultas.ESTADOS_TERMINADOS,
+    )
+
+
+@app.route("/admin/historial.json")
+@login_required
+def admin_historial_json():
+    """Página de historial; ?despues=<siguiente> pide la que sigue."""
+    if current_user.role != "admin":
+        return jsonify({"error": "forbidden"}), 403
+    pagina, siguiente = _pagina_historial(_filtros_historial())
+    return jsonify({"pedidos": [historial_json(p) for p in pagina], "siguiente": siguiente})
+
+
+# ---------- ADMIN: REPORTES ----------
+def _rango_reporte():
+    try:
+        return reportes.rango(
+            request.args.get("rango", "").strip(),
+            request.args.get("desde", "").strip(),
+            request.args.get("hasta", "").strip(),
+        )
+    except ValueError:
+        abort(400)
+
+
+@app.route("/admin/reportes")
+@login_required
+def admin_reportes():
+    if current_user.role != "admin":
+        return redirect(url_for("login"))
+    desde, hasta, nombre = _rango_reporte()
+    return render_template(
+        "reportes.html",
+        reporte=reportes.generar(desde, hasta),
+        rango=nombre,
+        rangos=reportes.RANGOS,
+        desde=desde,
+        hasta=hasta,
+    )
+
+
+@app.route("/admin/reportes.json")
+@login_required
+def admin_reportes_json():
+    """Mismo reporte en JSON: ?rango=semana|mes|... o ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD."""
+    if current_user.role != "admin":
+        return jsonify({"error": "forbidden"}), 403
+    desde, hasta, nombre = _rango_reporte()
+    return jsonify({"rango": nombre, **reportes.generar(desde, hasta)})
+
+
 # ---------- ADMIN: FACTURA ----------
 @app.route("/admin/factura/<int:pedido_id>")
 @login_required
 def ver_factura(pedido_id):
-    if (current_user.role or "").lower() != "admin":
+    if current_user.role != "admin":
         return redirect(url_for("login"))
 
-    pedido = Pedido.query.get_or_404(pedido_id)
-    items  = []
-    total  = 0.0
-    for d in pedido.detalles:
-        precio   = float(d.producto.precio)
-        cantidad = int(d.cantidad)
-        subtotal = precio * cantidad
-        total   += subtotal
-        items.append({
-            "nombre":   d.producto.nombre,
-            "cantidad": cantidad,
-            "precio":   precio,
-            "subtotal": subtotal
-        })
+    pedido = consultas.cargar_pedido(pedido_id)
+    if not pedido:
+        abort(404)
 
     auto_print = request.args.get("print") == "1"
     error      = request.args.get("error")
+    trabajo_id = request.args.get("trabajo", type=int)
     return render_template(
         "factura.html",
         pedido=pedido,
-        items=items,
-        total=total,
+        items=pedido.lineas,
+        total=pedido.total,
         auto_print=auto_print,
-        error=error
+        error=error,
+        trabajo_id=trabajo_id,
+        impresora_caja=impresion.configurada(impresion.FACTURA),
     )
 
 
+@app.route("/admin/pedido/<int:pedido_id>/imprimir", methods=["POST"])
+@login_required
+def imprimir_factura(pedido_id):
+    """Reimpresión de la factura de un pedido cobrado en la impresora de caja."""
+    if current_user.role != "admin":
+        return redirect(url_for("login"))
+    pedido = consultas.cargar_pedido(pedido_id)
+    if not pedido:
+        abort(404)
+    if pedido.estado != "cerrado":
+        return redirect(url_for("ver_factura", pedido_id=pedido_id))
+    trabajo_id = impresion.encolar_factura(pedido)
+    db.session.commit()
+    if trabajo_id is None:
+        return redirect(url_for("ver_factura", pedido_id=pedido_id, print=1))
+    return redirect(url_for("ver_factura", pedido_id=pedido_id, trabajo=trabajo_id))
+
+
+# ---------- ADMIN: COLA DE IMPRESIÓN ----------
+@app.route("/admin/impresion.json")
+@login_required
+def admin_impresion_json():
+    """Últimos trabajos de impresión y las impresoras configuradas."""
+    if current_user.role != "admin":
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify({
+        "impresoras": sorted(app.config["IMPRESORAS"]),
+        "trabajos":   [impresion.trabajo_json(t) for t in impresion.recientes()],
+    })
+
+
+@app.route("/admin/impresion/<int:trabajo_id>.json")
+@login_required
+def admin_trabajo_impresion_json(trabajo_id):
+    if current_user.role != "admin":
+        return jsonify({"error": "forbidden"}), 403
+    trabajo = db.session.get(TrabajoImpresion, trabajo_id)
+    if trabajo is None:
+        abort(404)
+    resp = jsonify(impresion.trabajo_json(trabajo))
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+@app.route("/admin/impresion/<int:trabajo_id>/reintentar", methods=["POST"])
+@login_required
+def admin_reintentar_impresion(trabajo_id):
+    if current_user.role != "admin":
+        return jsonify({"error": "forbidden"}), 403
+    trabajo = impresion.reintentar(trabajo_id)
+    if trabajo is None:
+        abort(404)
+    if trabajo.estado == "imprimiendo":
+        return jsonify({"error": "se está imprimiendo"}), 409
+    db.session.commit()
+    return jsonify(impresion.trabajo_json(trabajo))
+
+
 # ---------- ADMIN: USUARIOS ----------
 @app.route("/admin/usuarios")
 @login_required
@@ -695,6 +1140,7 @@ def admin_usuario_toggle(user_id):
     if u.id == current_user.id:
         return redirect(url_for("admin_usuarios"))
     u.activo = not bool(u.activo)
+    identidades.invalidar(u.id)
     db.session.commit()
     return redirect(url_for("admin_usuarios"))
 
@@ -712,9 +1158,11 @@ def admin_usuario_eliminar(user_id):
     tiene_pedidos = Pedido.query.filter_by(mesero_id=u.id).first()
     if tiene_pedidos:
         u.activo = False
+        identidades.invalidar(u.id)
         db.session.commit()
         return redirect(url_for("admin_usuarios"))
     db.session.delete(u)
+    identidades.invalidar(user_id)
     db.session.commit()
     return redirect(url_for("admin_usuarios"))
 
@@ -747,7 +1195,7 @@ def admin_producto_nuevo():
             error = "El nombre es obligatorio."
         else:
             try:
-                precio = float(precio_str)
+                precio = caja.pesos(precio_str)
                 if precio < 0:
                     raise ValueError()
             except ValueError:
@@ -756,6 +1204,7 @@ def admin_producto_nuevo():
             return render_template("admin_producto_form.html", modo="nuevo", producto=None, error=error, categorias=CATEGORIAS)
         p = Producto(nombre=nombre, precio=precio, activo=True, categoria=categoria)
         db.session.add(p)
+        catalogo.invalidar()
         db.session.commit()
         return redirect(url_for("admin_productos"))
     return render_template("admin_producto_form.html", modo="nuevo", producto=None, error=error, categorias=CATEGORIAS)
@@ -779,7 +1228,7 @@ def admin_producto_editar(producto_id):
             error = "El nombre es obligatorio."
         else:
             try:
-                precio = float(precio_str)
+                precio = caja.pesos(precio_str)
                 if precio < 0:
                     raise ValueError()
             except ValueError:
@@ -787,7 +1236,7 @@ def admin_producto_editar(producto_id):
         if error:
             producto.nombre    = nombre
             try:
-                producto.precio = float(precio_str)
+                producto.precio = caja.pesos(precio_str)
             except Exception:
                 pass
             producto.activo    = activo
@@ -797,6 +1246,7 @@ def admin_producto_editar(producto_id):
         producto.precio    = precio
         producto.activo    = activo
         producto.categoria = categoria
+        catalogo.invalidar()
         db.session.commit()
         return redirect(url_for("admin_productos"))
     return render_template("admin_producto_form.html", modo="editar", producto=producto, error=error, categorias=CATEGORIAS)
@@ -809,6 +1259,7 @@ def admin_producto_toggle(producto_id):
         return redirect(url_for("login"))
     producto = Producto.query.get_or_404(producto_id)
     producto.activo = not bool(producto.activo)
+    catalogo.invalidar()
     db.session.commit()
     return redirect(url_for("admin_productos"))
 
@@ -822,13 +1273,58 @@ def admin_producto_eliminar(producto_id):
     usado = PedidoDetalle.query.filter_by(producto_id=producto.id).first()
     if usado:
         producto.activo = False
+        catalogo.invalidar()
         db.session.commit()
         return redirect(url_for("admin_productos"))
     db.session.delete(producto)
+    catalogo.invalidar()
     db.session.commit()
     return redirect(url_for("admin_productos"))
 
 
+# ---------- ADMIN: MÉTRICAS ----------
+@app.route("/admin/metrics")
+def admin_metrics():
+    """
+    Métricas Prometheus de este worker. Admin con sesión, o el scraper con
+    `Authorization: Bearer $METRICAS_TOKEN`.
+    """
+    token = os.getenv("METRICAS_TOKEN")
+    con_token = token and hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    )
+    if not (con_token or solo_admin()):
+        return jsonify({"error": "forbidden"}), 403
+    resp = Response(metricas.texto_prometheus(), mimetype="text/plain; version=0.0.4")
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+# ---------- ADMIN: PERFILES ----------
+@app.route("/admin/perfiles")
+@login_required
+def admin_perfiles():
+    if not solo_admin():
+        return redirect(url_for("login"))
+    return render_template("admin_perfiles.html", perfiles=perfilado.listar(app))
+
+
+@app.route("/admin/perfiles/<nombre>.<ext>")
+@login_required
+def admin_perfil_archivo(nombre, ext):
+    if not solo_admin():
+        return redirect(url_for("login"))
+    if ext == "txt":
+        return send_from_directory(perfilado.directorio(app), f"{nombre}.txt", mimetype="text/plain")
+    if ext == "prof":
+        return send_from_directory(perfilado.directorio(app), f"{nombre}.prof", as_attachment=True)
+    abort(404)
+
+
 # ---------- MAIN ----------
 if __name__ == "__main__":
+    import ini_db
+    with app.app_context():
+        ini_db.inicializar()
+    impresion.arrancar(app)
     app.run(host="0.0.0.0", port=8000, debug=False)
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+bench/arranque.py — mide el arranque real de gunicorn.
+
+Levanta `gunicorn -c gunicorn.conf.py app:app` en un puerto libre y toma
+dos tiempos desde que se lanza el proceso:
+
+  master   hasta que el master escribe "Listening at" (con preload_app ya
+           importó la app y corrió when_ready).
+  listo    hasta el primer 200 en / (el primer worker atiende).
+
+"frío" borra antes instance/jinja y static/dist; "tibio" los reutiliza
+(un reinicio normal). La BD es un SQLite temporal preparado con ini_db.py.
+Para comparar con otro commit, pasar --arbol a un `git worktree` suyo.
+
+Uso:
+    python bench/arranque.py
+    git worktree add /tmp/antes <commit> && python bench/arranque.py --arbol /tmp/antes
+"""
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def arrancar(arbol, db_url, frio):
+    """Una corrida: (segundos hasta 'Listening at', segundos hasta el primer 200)."""
+    if frio:
+        shutil.rmtree(os.path.join(arbol, "instance", "jinja"), ignore_errors=True)
+        shutil.rmtree(os.path.join(arbol, "static", "dist"), ignore_errors=True)
+    puerto = _puerto_libre()
+    env = dict(os.environ, DATABASE_URL=db_url, PORT=str(puerto), IMPRESORAS="")
+    with tempfile.TemporaryFile() as log:
+        inicio = time.monotonic()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+            cwd=arbol, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        master = None
+        try:
+            while time.monotonic() - inicio < 60:
+                if master is None:
+                    log.seek(0)
+                    if b"Listening at" in log.read():
+                        master = time.monotonic() - inicio
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{puerto}/", timeout=2) as r:
+                        if r.status == 200:
+                            return master, time.monotonic() - inicio
+                except OSError:
+                    time.sleep(0.01)
+        finally:
+            proc.terminate()
+            proc.wait()
+        log.seek(0)
+        raise RuntimeError("gunicorn no respondió en 60 s:\n" + log.read().decode()[-2000:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de gunicorn.")
+    parser.add_argument("--arbol", default=RAIZ, help="checkout a medir (por defecto este)")
+    parser.add_argument("--corridas", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{os.path.join(tmp, 'arranque.db')}"
+        if os.path.exists(os.path.join(args.arbol, "ini_db.py")):
+            subprocess.run(
+                [sys.executable, "ini_db.py"], cwd=args.arbol, check=True, capture_output=True,
+                env=dict(os.environ, DATABASE_URL=db_url, IMPRESORAS=""),
+            )
+        print(f"{'modo':<8}{'master s':>10}{'listo s':>10}   (mediana de {args.corridas})")
+        for frio in (True, False):
+            tiempos = [arrancar(args.arbol, db_url, frio) for _ in range(args.corridas)]
+            master = statistics.median(t[0] for t in tiempos if t[0] is not None)
+            listo = statistics.median(t[1] for t in tiempos)
+            print(f"{'frío' if frio else 'tibio':<8}{master:>10.2f}{listo:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+bench/concurrencia.py — envíos simultáneos a las mismas mesas.
+
+Varios meseros (hilos, cada uno con su sesión) disparan a la vez POST
+/mesa/<n> contra pocas mesas, como dos meseros o un doble toque sobre la
+misma mesa. Cada envío suma 1 unidad de un producto conocido. Al final se
+revisa en la BD:
+  - a lo sumo un pedido abierto por mesa,
+  - que no se perdió ni duplicó ninguna unidad (unidades en la BD ==
+    envíos con respuesta 302),
+  - que items/total de cada pedido cuadran con sus líneas,
+y se reporta envíos/s y p50/p95/p99.
+
+Usa app.test_client() en este proceso (hilos reales contra el mismo
+engine). Por defecto un SQLite temporal en WAL; --db para PostgreSQL.
+
+Uso:
+    python bench/concurrencia.py --meseros 16 --envios 25 --mesas 2
+    python bench/concurrencia.py --db postgresql://localhost/pos_bench
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from servicio import ADMIN_CLAVE, CLAVE_BENCH, RAIZ, _ClienteFlask, _percentil, _preparar_bd
+
+
+def correr(args):
+    sys.path.insert(0, RAIZ)
+    import app as appmod
+    from sqlalchemy import func, select
+    from extensions import db
+    from models import Pedido, PedidoDetalle, Producto
+
+    app = appmod.app
+    admin = _ClienteFlask(app)
+    admin.pedir("POST", "/", {"username": "admin", "password": ADMIN_CLAVE})
+
+    meseros = []
+    for i in range(args.meseros):
+        usuario = f"bench_mesero_{i}"
+        admin.pedir("POST", "/admin/usuarios/nuevo", {"username": usuario, "password": CLAVE_BENCH})
+        c = _ClienteFlask(app)
+        estado, _, _ = c.pedir("POST", "/", {"username": usuario, "password": CLAVE_BENCH})
+        if estado != 302:
+            raise RuntimeError(f"login de {usuario} falló ({estado})")
+        meseros.append(c)
+
+    with app.app_context():
+        producto_id, precio = db.session.execute(
+            select(Producto.id, Producto.precio).where(Producto.activo.is_(True)).order_by(Producto.id)
+        ).first()
+
+    mesas = list(range(1, args.mesas + 1))
+    tiempos, estados = [], Counter()
+    enviados = Counter()
+    lock = threading.Lock()
+    salida = threading.Barrier(args.meseros)
+
+    def mesero(i, cliente):
+        salida.wait()
+        for k in range(args.envios):
+            mesa = mesas[(i + k) % len(mesas)]
+            t0 = time.perf_counter()
+            estado, _, _ = cliente.pedir("POST", f"/mesa/{mesa}", {f"producto_{producto_id}": "1"})
+            dt = time.perf_counter() - t0
+            with lock:
+                tiempos.append(dt)
+                estados[estado] += 1
+                if estado == 302:
+                    enviados[mesa] += 1
+
+    hilos = [threading.Thread(target=mesero, args=(i, c)) for i, c in enumerate(meseros)]
+    inicio = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    duracion = time.perf_counter() - inicio
+
+    # ---------- VERIFICACIÓN ----------
+    problemas = []
+    with app.app_context():
+        abiertos = Counter(dict(db.session.execute(
+            select(Pedido.mesa_id, func.count(Pedido.id))
+            .where(Pedido.estado == "abierto")
+            .group_by(Pedido.mesa_id)
+        ).all()))
+        unidades = Counter(dict(db.session.execute(
+            select(Pedido.mesa_id, func.sum(PedidoDetalle.cantidad))
+            .join(PedidoDetalle, PedidoDetalle.pedido_id == Pedido.id)
+            .where(Pedido.estado == "abierto")
+            .group_by(Pedido.mesa_id)
+        ).all()))
+        descuadres = db.session.execute(
+            select(Pedido.id, Pedido.items, Pedido.total,
+                   func.sum(PedidoDetalle.cantidad),
+                   func.sum(PedidoDetalle.cantidad * PedidoDetalle.precio_unitario))
+            .join(PedidoDetalle, PedidoDetalle.pedido_id == Pedido.id)
+            .group_by(Pedido.id, Pedido.items, Pedido.total)
+            .having((Pedido.items != func.sum(PedidoDetalle.cantidad))
+                    | (Pedido.total != func.sum(PedidoDetalle.cantidad * PedidoDetalle.precio_unitario)))
+        ).all()
+
+    for mesa in mesas:
+        if abiertos[mesa] > 1:
+            problemas.append(f"mesa {mesa}: {abiertos[mesa]} pedidos abiertos")
+        if unidades[mesa] != enviados[mesa]:
+            problemas.append(f"mesa {mesa}: {unidades[mesa]} unidades en BD, {enviados[mesa]} envíos OK")
+    for pid, items, total, suma_items, suma_total in descuadres:
+        problemas.append(f"pedido {pid}: items {items}/{suma_items}, total {total}/{suma_total}")
+
+    total_envios = len(tiempos)
+    print(f"{args.meseros} meseros × {args.envios} envíos sobre {len(mesas)} mesas "
+          f"(producto {producto_id}, ${precio})")
+    print(f"  {total_envios} envíos en {duracion:.2f} s → {total_envios / duracion:.1f} envíos/s")
+    print(f"  p50 {_percentil(tiempos, 0.50) * 1000:.1f} ms | p95 {_percentil(tiempos, 0.95) * 1000:.1f} ms"
+          f" | p99 {_percentil(tiempos, 0.99) * 1000:.1f} ms")
+    print(f"  respuestas: {dict(estados)}")
+    for mesa in mesas:
+        print(f"  mesa {mesa}: {abiertos[mesa]} pedido(s) abierto(s), {unidades[mesa]} unidades")
+    if problemas:
+        print("❌ " + "\n❌ ".join(problemas))
+        return 1
+    print("✅ sin pedidos duplicados ni unidades perdidas")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Envíos concurrentes a las mismas mesas.")
+    parser.add_argument("--db", help="DATABASE_URL (por defecto un SQLite temporal)")
+    parser.add_argument("--meseros", type=int, default=16)
+    parser.add_argument("--envios", type=int, default=25, help="envíos por mesero")
+    parser.add_argument("--mesas", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env["DATABASE_URL"] = args.db or f"sqlite:///{os.path.join(tmp, 'concurrencia.db')}"
+        env["ADMIN_PASSWORD"] = ADMIN_CLAVE
+        if not args.db:
+            env.setdefault("DB_PERFIL", "sqlite-wal")
+        _preparar_bd(env)
+        os.environ.update(env)
+        raise SystemExit(correr(args))
+
+
+if __name__ == "__main__":
+    main()
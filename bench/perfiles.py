@@ -0,0 +1,127 @@
+"""
+bench/perfiles.py — compara los perfiles de perfiles_db.py.
+
+Cada perfil corre en un subproceso propio (el engine se arma al importar
+app) con una BD nueva. N hilos, cada uno con su test client logueado,
+mezclan lecturas (/mesas.json, /admin/pedidos.json) y envíos de pedido.
+
+Uso:
+    python bench/perfiles.py                       # sqlite y sqlite-wal
+    python bench/perfiles.py --perfil sqlite-wal --hilos 16 --segundos 20
+    DATABASE_URL=postgresql://... python bench/perfiles.py --perfil postgres-pooled pgbouncer
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def correr(hilos, segundos, escrituras):
+    """Corre dentro del subproceso: DB_PERFIL y DATABASE_URL ya vienen fijados."""
+    sys.path.insert(0, RAIZ)
+    import app as appmod
+    from extensions import db
+    from models import Producto
+
+    app = appmod.app
+    with app.app_context():
+        if not Producto.query.count():
+            for i in range(30):
+                db.session.add(Producto(nombre=f"Producto {i}", precio=1000 + i * 100,
+                                        categoria="almuerzos", activo=True))
+            db.session.commit()
+        productos = [p.id for p in Producto.query.all()]
+
+    def cliente(usuario, clave):
+        c = app.test_client()
+        r = c.post("/", data={"username": usuario, "password": clave})
+        assert r.status_code == 302, r.status_code
+        return c
+
+    tiempos, errores = [], [0]
+    candado = threading.Lock()
+    fin = time.monotonic() + segundos
+
+    def trabajar(n):
+        rnd = random.Random(n)
+        mesero = cliente("mesero", os.getenv("MESERO_PASSWORD", "mesero123"))
+        admin = cliente("admin", os.getenv("ADMIN_PASSWORD", "admin123"))
+        propios, malos = [], 0
+        while time.monotonic() < fin:
+            t0 = time.perf_counter()
+            if rnd.random() < escrituras:
+                datos = {f"producto_{rnd.choice(productos)}": str(rnd.randint(1, 3))}
+                r = mesero.post(f"/mesa/{rnd.randint(1, 20)}", data=datos)
+                ok = r.status_code == 302
+            elif rnd.random() < 0.5:
+                ok = mesero.get("/mesas.json").status_code == 200
+            else:
+                ok = admin.get("/admin/pedidos.json").status_code == 200
+            propios.append(time.perf_counter() - t0)
+            malos += not ok
+        with candado:
+            tiempos.extend(propios)
+            errores[0] += malos
+
+    hs = [threading.Thread(target=trabajar, args=(i,)) for i in range(hilos)]
+    inicio = time.monotonic()
+    for h in hs:
+        h.start()
+    for h in hs:
+        h.join()
+    duracion = time.monotonic() - inicio
+
+    return {
+        "peticiones": len(tiempos),
+        "req_s":      round(len(tiempos) / duracion, 1),
+        "p50_ms":     round(_percentil(tiempos, 0.50) * 1000, 1),
+        "p95_ms":     round(_percentil(tiempos, 0.95) * 1000, 1),
+        "errores":    errores[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput por perfil de BD.")
+    parser.add_argument("--perfil", nargs="+", default=["sqlite", "sqlite-wal"])
+    parser.add_argument("--hilos", type=int, default=8)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--escrituras", type=float, default=0.2, help="fracción de envíos de pedido")
+    parser.add_argument("--_hijo", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._hijo:
+        print(json.dumps(correr(args.hilos, args.segundos, args.escrituras)))
+        return
+
+    print(f"{'perfil':<16}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'errores':>9}")
+    for perfil in args.perfil:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DB_PERFIL=perfil)
+            if not os.getenv("DATABASE_URL"):
+                env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            salida = subprocess.run(
+                [sys.executable, __file__, "--_hijo",
+                 "--hilos", str(args.hilos), "--segundos", str(args.segundos),
+                 "--escrituras", str(args.escrituras)],
+                env=env, cwd=RAIZ, capture_output=True, text=True, check=True,
+            ).stdout
+            r = json.loads(salida.strip().splitlines()[-1])
+        print(f"{perfil:<16}{r['req_s']:>8}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['errores']:>9}")
+
+
+if __name__ == "__main__":
+    main()
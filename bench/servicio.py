@@ -0,0 +1,407 @@
+"""
+bench/servicio.py — simula un servicio del restaurante y mide la app.
+
+N meseros sondean /mesas.json (con If-None-Match, como mesas.js), toman
+pedidos en sus mesas (GET/POST /mesa/<id>) y editan líneas; un admin
+sondea /admin/pedidos.json?since= (como admin_pedidos.html) y cobra
+pedidos. Los navegadores siguen los redirects, así que aquí también.
+
+Dos modos:
+  cliente   app.test_client() en este proceso; cuenta consultas por ruta.
+  gunicorn  `gunicorn app:app` real en un puerto libre; mide RSS por worker.
+            (Las consultas quedan fuera de vista en este modo.)
+
+La BD es un SQLite temporal salvo que se pase --db (p. ej. un PostgreSQL
+local vacío: el benchmark escribe en ella). Se prepara con
+`flask --app app init-db`.
+
+Reporta p50/p95/p99 y req/s (total y por ruta), consultas por petición y
+RSS, y lo guarda en bench/resultados/<fecha>-<commit>-<modo>-<bd>.json.
+
+Uso:
+    python bench/servicio.py --modo cliente --meseros 6 --segundos 30
+    python bench/servicio.py --modo gunicorn --workers 2 --db postgresql://localhost/pos_bench
+    python bench/servicio.py --comparar bench/resultados/A.json bench/resultados/B.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+RAIZ       = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTADOS = os.path.join(RAIZ, "bench", "resultados")
+
+CLAVE_BENCH = "bench123"
+ADMIN_CLAVE = os.getenv("ADMIN_PASSWORD", "admin123")
+
+_RE_PRODUCTO = re.compile(r'name="producto_(\d+)"')
+_RE_EDITAR   = re.compile(r'action="(/pedido/\d+/detalle/\d+/editar)"')
+
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _ruta(url):
+    """Agrupa /mesa/7 y /mesa/12 bajo /mesa/<n>."""
+    return re.sub(r"\d+", "<n>", urlsplit(url).path)
+
+
+# ---------- CLIENTES ----------
+class _ClienteFlask:
+    """Mismo contrato que _ClienteHttp, sobre app.test_client()."""
+
+    def __init__(self, app):
+        self.c = app.test_client()
+
+    def pedir(self, metodo, url, datos=None, cabeceras=None):
+        r = self.c.open(url, method=metodo, data=datos, headers=cabeceras or {})
+        return r.status_code, r.get_data(), r.headers
+
+
+class _ClienteHttp:
+    """Una conexión keep-alive por cliente; guarda la cookie de sesión."""
+
+    def __init__(self, puerto):
+        self.conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=30)
+        self.cookie = None
+
+    def pedir(self, metodo, url, datos=None, cabeceras=None):
+        cab = dict(cabeceras or {})
+        cuerpo = None
+        if datos is not None:
+            cuerpo = urlencode(datos)
+            cab["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.cookie:
+            cab["Cookie"] = self.cookie
+        self.conn.request(metodo, url, body=cuerpo, headers=cab)
+        r = self.conn.getresponse()
+        data = r.read()
+        galleta = r.getheader("Set-Cookie")
+        if galleta:
+            self.cookie = galleta.split(";", 1)[0]
+        return r.status, data, r.headers
+
+
+# ---------- MEDICIÓN ----------
+class Registro:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tiempos = defaultdict(list)
+        self.consultas = defaultdict(list)
+        self.errores = defaultdict(int)
+
+
+_local = threading.local()
+
+
+def _contar_consulta(*_):
+    _local.consultas = getattr(_local, "consultas", 0) + 1
+
+
+class Sesion:
+    """Cliente + registro; sigue redirects como el navegador."""
+
+    def __init__(self, cliente, registro):
+        self.cliente = cliente
+        self.registro = registro
+
+    def pedir(self, metodo, url, datos=None, cabeceras=None, seguir=True):
+        _local.consultas = 0
+        t0 = time.perf_counter()
+        estado, cuerpo, cab = self.cliente.pedir(metodo, url, datos, cabeceras)
+        dt = time.perf_counter() - t0
+        ruta = f"{metodo} {_ruta(url)}"
+        with self.registro.lock:
+            self.registro.tiempos[ruta].append(dt)
+            self.registro.consultas[ruta].append(_local.consultas)
+            if estado >= 400:
+                self.registro.errores[ruta] += 1
+        if seguir and estado in (301, 302, 303) and cab.get("Location"):
+            return self.pedir("GET", urlsplit(cab["Location"])._replace(scheme="", netloc="").geturl())
+        return estado, cuerpo, cab
+
+    def login(self, usuario, clave):
+        estado, _, _ = self.pedir("POST", "/", {"username": usuario, "password": clave}, seguir=False)
+        if estado != 302:
+            raise RuntimeError(f"login de {usuario} falló ({estado})")
+
+
+# ---------- ESCENARIO ----------
+def _mesero(sesion, mesas, fin, pausa, rnd):
+    etag = None
+    productos = []
+    while time.monotonic() < fin:
+        cab = {"If-None-Match": etag} if etag else {}
+        _, _, r = sesion.pedir("GET", "/mesas.json", cabeceras=cab)
+        etag = r.get("ETag") or etag
+
+        if rnd.random() < 0.5:
+            mesa = rnd.choice(mesas)
+            _, html, _ = sesion.pedir("GET", f"/mesa/{mesa}")
+            productos = productos or _RE_PRODUCTO.findall(html.decode())
+            if productos:
+                datos = {f"producto_{p}": str(rnd.randint(1, 3))
+                         for p in rnd.sample(productos, rnd.randint(1, 3))}
+                _, html, _ = sesion.pedir("POST", f"/mesa/{mesa}", datos)
+                ediciones = _RE_EDITAR.findall(html.decode())
+                if ediciones and rnd.random() < 0.4:
+                    accion = rnd.choice(("sumar", "restar"))
+                    sesion.pedir("POST", rnd.choice(ediciones), {"accion": accion})
+        time.sleep(pausa)
+
+
+def _admin(sesion, fin, pausa, rnd, prob_cobro):
+    cursor = None
+    abiertos = set()
+    while time.monotonic() < fin:
+        url = "/admin/pedidos.json" + (f"?since={cursor}" if cursor is not None else "")
+        estado, cuerpo, _ = sesion.pedir("GET", url)
+        if estado == 200:
+            d = json.loads(cuerpo)
+            if d.get("completo"):
+                abiertos = {p["id"] for p in d["pedidos"]}
+            else:
+                abiertos |= {p["id"] for p in d["pedidos"]}
+                abiertos -= {e["id"] for e in d.get("eliminados", ())}
+            cursor = d.get("cursor", cursor)
+
+        if abiertos and rnd.random() < prob_cobro:
+            pid = rnd.choice(sorted(abiertos))
+            sesion.pedir("POST", f"/admin/pedido/{pid}/cobrar", {"metodo_pago": "tarjeta"})
+            abiertos.discard(pid)
+        time.sleep(pausa)
+
+
+def correr_escenario(nuevo_cliente, args):
+    registro = Registro()
+
+    admin = Sesion(nuevo_cliente(), registro)
+    admin.login("admin", ADMIN_CLAVE)
+    meseros = []
+    for i in range(args.meseros):
+        usuario = f"bench_mesero_{i}"
+        admin.pedir("POST", "/admin/usuarios/nuevo", {"username": usuario, "password": CLAVE_BENCH})
+        s = Sesion(nuevo_cliente(), registro)
+        s.login(usuario, CLAVE_BENCH)
+        meseros.append(s)
+
+    # Lo anterior es preparación: no cuenta.
+    registro.tiempos.clear()
+    registro.consultas.clear()
+    registro.errores.clear()
+
+    fin = time.monotonic() + args.segundos
+    hilos = [threading.Thread(target=_admin,
+                              args=(admin, fin, args.pausa, random.Random(0), args.cobros))]
+    for i, s in enumerate(meseros):
+        mesas = [m for m in range(1, 21) if (m - 1) % args.meseros == i] or [i % 20 + 1]
+        hilos.append(threading.Thread(target=_mesero,
+                                      args=(s, mesas, fin, args.pausa, random.Random(i + 1))))
+    inicio = time.monotonic()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return registro, time.monotonic() - inicio
+
+
+def _resumen(tiempos, duracion):
+    return {
+        "peticiones": len(tiempos),
+        "req_s":      round(len(tiempos) / duracion, 1),
+        "p50_ms":     round(_percentil(tiempos, 0.50) * 1000, 2),
+        "p95_ms":     round(_percentil(tiempos, 0.95) * 1000, 2),
+        "p99_ms":     round(_percentil(tiempos, 0.99) * 1000, 2),
+    }
+
+
+def resultados(registro, duracion, contar):
+    todas = [t for ts in registro.tiempos.values() for t in ts]
+    total = _resumen(todas, duracion)
+    total["errores"] = sum(registro.errores.values())
+    por_ruta = {}
+    for ruta in sorted(registro.tiempos):
+        r = _resumen(registro.tiempos[ruta], duracion)
+        r["errores"] = registro.errores[ruta]
+        if contar:
+            cs = registro.consultas[ruta]
+            r["consultas_promedio"] = round(sum(cs) / len(cs), 2)
+            r["consultas_max"] = max(cs)
+        por_ruta[ruta] = r
+    if contar:
+        cs = [c for v in registro.consultas.values() for c in v]
+        total["consultas_promedio"] = round(sum(cs) / max(1, len(cs)), 2)
+    return total, por_ruta
+
+
+# ---------- MEMORIA ----------
+def _rss_kb(pid):
+    datos = {}
+    with open(f"/proc/{pid}/status") as f:
+        for linea in f:
+            if linea.startswith(("VmRSS:", "VmHWM:")):
+                clave, valor = linea.split(":")
+                datos[clave] = int(valor.split()[0])
+    return {"rss_mb": round(datos.get("VmRSS", 0) / 1024, 1),
+            "pico_mb": round(datos.get("VmHWM", 0) / 1024, 1)}
+
+
+def _hijos(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+# ---------- MODOS ----------
+def _preparar_bd(env):
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "init-db"],
+                   env=env, cwd=RAIZ, check=True, stdout=subprocess.DEVNULL)
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def modo_cliente(args, env):
+    os.environ.update(env)
+    sys.path.insert(0, RAIZ)
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    import app as appmod
+
+    event.listen(Engine, "before_cursor_execute", _contar_consulta)
+    registro, duracion = correr_escenario(lambda: _ClienteFlask(appmod.app), args)
+    total, por_ruta = resultados(registro, duracion, contar=True)
+    return total, por_ruta, {"proceso": _rss_kb(os.getpid())}
+
+
+def modo_gunicorn(args, env):
+    puerto = _puerto_libre()
+    env = dict(env, PORT=str(puerto), WEB_CONCURRENCY=str(args.workers))
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "app:app"],
+                            env=env, cwd=RAIZ, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        limite = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", puerto), timeout=1).close()
+                break
+            except OSError:
+                if proc.poll() is not None or time.monotonic() > limite:
+                    raise RuntimeError("gunicorn no arrancó:\n" + proc.stderr.read().decode())
+                time.sleep(0.2)
+
+        registro, duracion = correr_escenario(lambda: _ClienteHttp(puerto), args)
+        total, por_ruta = resultados(registro, duracion, contar=False)
+        memoria = {"master": _rss_kb(proc.pid)}
+        for i, pid in enumerate(_hijos(proc.pid)):
+            memoria[f"worker_{i}"] = _rss_kb(pid)
+        return total, por_ruta, memoria
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+# ---------- COMPARAR ----------
+def comparar(ruta_a, ruta_b):
+    with open(ruta_a) as f:
+        a = json.load(f)
+    with open(ruta_b) as f:
+        b = json.load(f)
+    print(f"A: {a['commit']} {a['modo']} {a['bd']}   B: {b['commit']} {b['modo']} {b['bd']}")
+    if a["parametros"] != b["parametros"]:
+        print(f"⚠️  parámetros distintos: {a['parametros']} vs {b['parametros']}")
+    print(f"{'ruta':<36}{'p95 A':>9}{'p95 B':>9}{'Δ%':>8}{'req/s A':>10}{'req/s B':>10}")
+    filas = [("TOTAL", a["total"], b["total"])]
+    filas += [(r, a["por_ruta"][r], b["por_ruta"][r]) for r in a["por_ruta"] if r in b["por_ruta"]]
+    for ruta, ra, rb in filas:
+        delta = (rb["p95_ms"] - ra["p95_ms"]) / ra["p95_ms"] * 100 if ra["p95_ms"] else 0.0
+        print(f"{ruta:<36}{ra['p95_ms']:>9}{rb['p95_ms']:>9}{delta:>+8.1f}{ra['req_s']:>10}{rb['req_s']:>10}")
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de un servicio del restaurante.")
+    parser.add_argument("--modo", choices=("cliente", "gunicorn"), default="cliente")
+    parser.add_argument("--db", help="DATABASE_URL (por defecto un SQLite temporal)")
+    parser.add_argument("--meseros", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=2, help="solo modo gunicorn")
+    parser.add_argument("--segundos", type=float, default=30)
+    parser.add_argument("--pausa", type=float, default=0.25, help="segundos entre acciones de cada usuario")
+    parser.add_argument("--cobros", type=float, default=0.3, help="probabilidad de cobrar por sondeo del admin")
+    parser.add_argument("--salida", help="archivo JSON (por defecto bench/resultados/...)")
+    parser.add_argument("--comparar", nargs=2, metavar=("A.json", "B.json"))
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env["DATABASE_URL"] = args.db or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        env["ADMIN_PASSWORD"] = ADMIN_CLAVE
+        _preparar_bd(env)
+        if args.modo == "cliente":
+            total, por_ruta, memoria = modo_cliente(args, env)
+        else:
+            total, por_ruta, memoria = modo_gunicorn(args, env)
+
+    bd = env["DATABASE_URL"].split(":", 1)[0].split("+", 1)[0]
+    salida = {
+        "commit":     _commit(),
+        "fecha":      datetime.now().isoformat(timespec="seconds"),
+        "modo":       args.modo,
+        "bd":         bd,
+        "parametros": {k: getattr(args, k) for k in ("meseros", "workers", "segundos", "pausa", "cobros")},
+        "total":      total,
+        "por_ruta":   por_ruta,
+        "memoria":    memoria,
+    }
+
+    print(f"{'ruta':<36}{'n':>7}{'req/s':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'consultas':>11}{'err':>5}")
+    for ruta, r in [("TOTAL", total)] + list(por_ruta.items()):
+        consultas = r.get("consultas_promedio", "-")
+        print(f"{ruta:<36}{r['peticiones']:>7}{r['req_s']:>8}{r['p50_ms']:>8}"
+              f"{r['p95_ms']:>8}{r['p99_ms']:>8}{consultas:>11}{r['errores']:>5}")
+    for nombre, m in memoria.items():
+        print(f"RSS {nombre}: {m['rss_mb']} MB (pico {m['pico_mb']} MB)")
+
+    ruta = args.salida
+    if not ruta:
+        os.makedirs(RESULTADOS, exist_ok=True)
+        marca = datetime.now().strftime("%Y%m%d-%H%M%S")
+        ruta = os.path.join(RESULTADOS, f"{marca}-{salida['commit']}-{args.modo}-{bd}.json")
+    with open(ruta, "w") as f:
+        json.dump(salida, f, indent=2, ensure_ascii=False)
+    print(f"→ {ruta}")
+
+
+if __name__ == "__main__":
+    main()
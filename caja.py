@@ -0,0 +1,199 @@
+"""
+caja.py — resumen de ventas diario (tabla venta_dia).
+
+El dinero se maneja en pesos enteros (columnas INTEGER): las sumas de un
+mes o un año salen exactas, sin residuos de punto flotante.
+
+cobrar_pedido y cerrar_pedido llaman a registrar_pedido() antes del commit,
+así el acumulado se actualiza en la misma transacción que el cierre.
+/admin/caja lee totales, métodos de pago y el top de productos de aquí en
+vez de recorrer cada pedido y cada detalle.
+"""
+import math
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import select, delete, func
+
+from extensions import db
+from models import Mesa, Producto, Pedido, PedidoDetalle, VentaDia
+from zonas import dia_bogota, bogota_day_to_utc_range, to_bogota
+from db_utils import insert_upsert
+
+METODOS = ("efectivo", "transferencia", "tarjeta", "otro")
+
+
+def pesos(valor) -> int:
+    """Monto digitado o leído ("12000", "12000.0") a pesos enteros. ValueError si no es número."""
+    numero = float(valor)
+    if not math.isfinite(numero):
+        raise ValueError(valor)
+    return int(round(numero))
+
+
+def normalizar_metodo(metodo) -> str:
+    metodo = (metodo or "otro").strip().lower()
+    return metodo if metodo in METODOS else "otro"
+
+
+def _lineas_agrupadas(*filtros):
+    """(pedido_id, producto_id, nombre, cantidad, ventas) agregados en SQL."""
+    return db.session.execute(
+        select(
+            PedidoDetalle.pedido_id,
+            PedidoDetalle.producto_id,
+            Producto.nombre,
+            func.sum(PedidoDetalle.cantidad),
+            func.sum(PedidoDetalle.cantidad * PedidoDetalle.precio_unitario),
+        )
+        .join(Producto, Producto.id == PedidoDetalle.producto_id)
+        .where(*filtros)
+        .group_by(PedidoDetalle.pedido_id, PedidoDetalle.producto_id, Producto.nombre)
+    ).all()
+
+
+def _sumar(filas):
+    """Upsert que suma cantidad y ventas sobre lo que ya haya en venta_dia."""
+    if not filas:
+        return
+    stmt = insert_upsert(VentaDia).values(filas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[VentaDia.dia, VentaDia.metodo_pago, VentaDia.producto_id],
+        set_={
+            "nombre":   stmt.excluded.nombre,
+            "cantidad": VentaDia.cantidad + stmt.excluded.cantidad,
+            "ventas":   VentaDia.ventas + stmt.excluded.ventas,
+        },
+    )
+    db.session.execute(stmt)
+
+
+def registrar_pedido(pedido):
+    """Suma un pedido recién cerrado al acumulado. No hace commit."""
+    dia    = dia_bogota(pedido.fecha_cierre)
+    metodo = normalizar_metodo(pedido.metodo_pago)
+    _sumar([
+        {
+            "dia": dia,
+            "metodo_pago": metodo,
+            "producto_id": producto_id,
+            "nombre": nombre,
+            "cantidad": int(cantidad or 0),
+            "ventas": int(ventas or 0),
+        }
+        for _, producto_id, nombre, cantidad, ventas
+        in _lineas_agrupadas(PedidoDetalle.pedido_id == pedido.id)
+    ])
+
+
+def reconstruir(desde: date = None, hasta: date = None) -> int:
+    """
+    Recalcula venta_dia desde los pedidos cerrados (todo, o solo el rango de
+    días Bogotá indicado). Devuelve cuántas filas quedaron. Hace commit.
+    """
+    filtros_pedido = [Pedido.estado == "cerrado", Pedido.fecha_cierre.isnot(None)]
+    borrar = delete(VentaDia)
+    if desde:
+        filtros_pedido.append(Pedido.fecha_cierre >= bogota_day_to_utc_range(desde)[0])
+        borrar = borrar.where(VentaDia.dia >= desde)
+    if hasta:
+        filtros_pedido.append(Pedido.fecha_cierre <= bogota_day_to_utc_range(hasta)[1])
+        borrar = borrar.where(VentaDia.dia <= hasta)
+
+    cierres = {
+        pid: (dia_bogota(fc), normalizar_metodo(mp))
+        for pid, fc, mp in db.session.execute(
+            select(Pedido.id, Pedido.fecha_cierre, Pedido.metodo_pago).where(*filtros_pedido)
+        )
+    }
+
+    acumulado = defaultdict(lambda: {"cantidad": 0, "ventas": 0})
+    nombres = {}
+    if cierres:
+        subq = select(Pedido.id).where(*filtros_pedido)
+        for pid, producto_id, nombre, cantidad, ventas in _lineas_agrupadas(
+            PedidoDetalle.pedido_id.in_(subq)
+        ):
+            dia, metodo = cierres[pid]
+            fila = acumulado[(dia, metodo, producto_id)]
+            fila["cantidad"] += int(cantidad or 0)
+            fila["ventas"]   += int(ventas or 0)
+            nombres[producto_id] = nombre
+
+    db.session.execute(borrar)
+    filas = [
+        {"dia": dia, "metodo_pago": metodo, "producto_id": producto_id,
+         "nombre": nombres[producto_id], **valores}
+        for (dia, metodo, producto_id), valores in acumulado.items()
+    ]
+    for i in range(0, len(filas), 500):
+        _sumar(filas[i:i + 500])
+    db.session.commit()
+    return len(filas)
+
+
+# ---------- LECTURAS PARA /admin/caja ----------
+def dias_disponibles() -> list[date]:
+    return list(db.session.execute(
+        select(VentaDia.dia).distinct().order_by(VentaDia.dia.desc())
+    ).scalars())
+
+
+def resumen_dia(dia: date):
+    """(total_dia, por_metodo, top_lista) leídos del acumulado."""
+    por_metodo = {m: 0 for m in METODOS}
+    for metodo, ventas in db.session.execute(
+        select(VentaDia.metodo_pago, func.sum(VentaDia.ventas))
+        .where(VentaDia.dia == dia)
+        .group_by(VentaDia.metodo_pago)
+    ):
+        por_metodo[normalizar_metodo(metodo)] += int(ventas or 0)
+
+    top_lista = [
+        {"nombre": nombre, "cantidad": int(cantidad or 0), "ventas": int(ventas or 0)}
+        for _, nombre, cantidad, ventas in db.session.execute(
+            select(
+                VentaDia.producto_id,
+                func.max(VentaDia.nombre),
+                func.sum(VentaDia.cantidad),
+                func.sum(VentaDia.ventas),
+            )
+            .where(VentaDia.dia == dia)
+            .group_by(VentaDia.producto_id)
+            .order_by(func.sum(VentaDia.ventas).desc())
+            .limit(10)
+        )
+    ]
+    return sum(por_metodo.values()), por_metodo, top_lista
+
+
+def pedidos_del_dia(dia: date) -> list[dict]:
+    """Listado de pedidos cobrados del día con su total guardado."""
+    inicio_utc, fin_utc = bogota_day_to_utc_range(dia)
+    filas = db.session.execute(
+        select(
+            Pedido.id,
+            Mesa.numero,
+            Pedido.fecha_cierre,
+            Pedido.metodo_pago,
+            Pedido.total,
+        )
+        .join(Mesa, Mesa.id == Pedido.mesa_id)
+        .where(
+            Pedido.estado == "cerrado",
+            Pedido.fecha_cierre.isnot(None),
+            Pedido.fecha_cierre >= inicio_utc,
+            Pedido.fecha_cierre <= fin_utc,
+        )
+        .order_by(Pedido.fecha_cierre.desc())
+    ).all()
+    return [
+        {
+            "id":     pid,
+            "mesa":   numero,
+            "hora":   to_bogota(fecha_cierre).strftime("%H:%M") if fecha_cierre else "",
+            "metodo": (metodo or "otro"),
+            "total":  int(total or 0),
+        }
+        for pid, numero, fecha_cierre, metodo, total in filas
+    ]
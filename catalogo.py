@@ -0,0 +1,102 @@
+"""
+catalogo.py — caché del catálogo de productos por proceso.
+
+Cada worker guarda los productos activos ya agrupados y ordenados por
+categoría, etiquetados con la versión "catalogo" de version_cambio. Las
+rutas de admin de productos suben esa versión en su transacción; los demás
+workers lo notan en su siguiente petición con una sola consulta por PK y
+recargan. Mientras no cambie, el menú no consulta la tabla producto.
+"""
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+from sqlalchemy import select, true
+
+from extensions import db
+from models import Producto
+import fragmentos
+import versiones
+
+CATEGORIAS = [
+    "especialidad",
+    "desayunos",
+    "almuerzos",
+    "porciones",
+    "bebidas calientes",
+    "bebidas frías",
+]
+
+# Nombre de la carta del menú en el caché de fragmentos (fragmentos.py).
+FRAGMENTO_CARTA = "menu_productos"
+
+
+@dataclass(frozen=True, slots=True)
+class ProductoCatalogo:
+    id: int
+    nombre: str
+    precio: int
+    categoria: str
+
+
+@dataclass(frozen=True, slots=True)
+class Catalogo:
+    version: int
+    por_id: Mapping[int, ProductoCatalogo]
+    por_categoria: Mapping[str, tuple[ProductoCatalogo, ...]]
+
+
+_cache = None
+_lock = threading.Lock()
+
+
+def categoria_valida(categoria) -> str:
+    cat = (categoria or "almuerzos").strip().lower()
+    return cat if cat in CATEGORIAS else "almuerzos"
+
+
+def _cargar(version: int) -> Catalogo:
+    filas = db.session.execute(
+        select(Producto.id, Producto.nombre, Producto.precio, Producto.categoria)
+        .where(Producto.activo == true())
+        .order_by(Producto.categoria.asc(), Producto.nombre.asc())
+    ).all()
+
+    por_id = {}
+    por_categoria = {c: [] for c in CATEGORIAS}
+    for pid, nombre, precio, categoria in filas:
+        p = ProductoCatalogo(pid, nombre, int(precio), categoria_valida(categoria))
+        por_id[pid] = p
+        por_categoria[p.categoria].append(p)
+
+    return Catalogo(
+        version=version,
+        por_id=MappingProxyType(por_id),
+        por_categoria=MappingProxyType({c: tuple(l) for c, l in por_categoria.items()}),
+    )
+
+
+def obtener() -> Catalogo:
+    """Catálogo vigente; recarga solo si otro proceso subió la versión."""
+    global _cache
+    # Primero la versión y luego los datos: si algo cambia en medio, el
+    # caché queda con una versión vieja y se recarga en la próxima petición.
+    version = versiones.actual(versiones.CATALOGO)
+    cache = _cache
+    if cache is not None and cache.version == version:
+        return cache
+    with _lock:
+        if _cache is None or _cache.version != version:
+            _cache = _cargar(version)
+        return _cache
+
+
+def invalidar():
+    """
+    Marca el catálogo como cambiado. No hace commit: va con la escritura.
+    La carta renderizada de este worker se descarta ya; los demás la
+    rehacen al ver la versión nueva.
+    """
+    versiones.subir(versiones.CATALOGO)
+    fragmentos.descartar(FRAGMENTO_CARTA)
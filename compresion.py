@@ -0,0 +1,46 @@
+"""
+compresion.py — gzip al vuelo para las respuestas HTML y JSON.
+
+Los CSS/JS ya salen precomprimidos de /assets (estaticos.py); aquí solo
+se comprimen las páginas y los JSON de polling, que cambian en cada
+petición. Se salta lo que no vale la pena o no se puede: respuestas
+pequeñas, 304, streams (SSE de /events), archivos servidos con
+send_file y clientes que no aceptan gzip.
+"""
+import gzip
+
+from flask import request
+
+MINIMO = 512        # bytes: por debajo el encabezado gzip no compensa
+NIVEL  = 6          # buen equilibrio CPU/tamaño para HTML
+TIPOS  = {"text/html", "application/json"}
+
+
+def _comprimir(resp):
+    if resp.mimetype not in TIPOS:
+        return resp
+    resp.vary.add("Accept-Encoding")
+    if (resp.status_code != 200 or resp.is_streamed or resp.direct_passthrough
+            or "Content-Encoding" in resp.headers
+            or not request.accept_encodings["gzip"]):
+        return resp
+    datos = resp.get_data()
+    if len(datos) < MINIMO:
+        return resp
+
+    resp.set_data(gzip.compress(datos, compresslevel=NIVEL))
+    resp.headers["Content-Encoding"] = "gzip"
+    # Mismo contenido, otros bytes: el ETag pasa a débil (versiones.py
+    # compara If-None-Match en débil, así el 304 sigue funcionando).
+    etag, debil = resp.get_etag()
+    if etag and not debil:
+        resp.set_etag(etag, weak=True)
+    return resp
+
+
+def instalar(app):
+    """
+    Registrar DESPUÉS de metricas: Flask corre los after_request al revés,
+    así que este comprime primero y metricas cuenta los bytes reales.
+    """
+    app.after_request(_comprimir)
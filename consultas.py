@@ -0,0 +1,239 @@
+"""
+consultas.py — modelo de lectura de pedidos.
+
+Carga un pedido (o todos los abiertos) con sus líneas, productos, mesa y
+mesero en UNA sola consulta (JOIN) y devuelve registros inmutables. Así
+las vistas no disparan consultas perezosas por cada detalle (N+1).
+Precios y totales salen de lo guardado en el pedido (precio_unitario,
+total), no del precio actual del producto.
+
+historial() pagina los pedidos terminados por (fecha_cierre, id) con
+keyset: cada página sigue desde la última fila de la anterior, así la
+página 500 cuesta lo mismo que la primera.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import or_, select, tuple_
+
+from extensions import db
+from models import User, Mesa, Producto, Pedido, PedidoDetalle
+from zonas import bogota_day_to_utc_range
+
+
+@dataclass(frozen=True, slots=True)
+class LineaPedido:
+    id: int
+    producto_id: int
+    nombre: str
+    cantidad: int
+    precio: int
+
+    @property
+    def subtotal(self) -> int:
+        return self.precio * self.cantidad
+
+
+@dataclass(frozen=True, slots=True)
+class PedidoLectura:
+    id: int
+    mesa_id: int
+    mesa_numero: int
+    mesero_id: int
+    mesero: str
+    estado: str
+    fecha: Optional[datetime]
+    fecha_cierre: Optional[datetime]
+    metodo_pago: Optional[str]
+    monto_recibido: Optional[int]
+    cambio: Optional[int]
+    total: int
+    items: int
+    version: int
+    lineas: tuple[LineaPedido, ...]
+
+
+_COLUMNAS = (
+    Pedido.id,
+    Pedido.mesa_id,
+    Mesa.numero,
+    Pedido.mesero_id,
+    User.username,
+    Pedido.estado,
+    Pedido.fecha,
+    Pedido.fecha_cierre,
+    Pedido.metodo_pago,
+    Pedido.monto_recibido,
+    Pedido.cambio,
+    Pedido.total,
+    Pedido.items,
+    Pedido.version,
+    PedidoDetalle.id,
+    PedidoDetalle.producto_id,
+    Producto.nombre,
+    PedidoDetalle.precio_unitario,
+    PedidoDetalle.cantidad,
+)
+_N_CABECERA = 14
+
+
+def _consulta():
+    return (
+        select(*_COLUMNAS)
+        .select_from(Pedido)
+        .join(Mesa, Mesa.id == Pedido.mesa_id)
+        .join(User, User.id == Pedido.mesero_id)
+        .outerjoin(PedidoDetalle, PedidoDetalle.pedido_id == Pedido.id)
+        .outerjoin(Producto, Producto.id == PedidoDetalle.producto_id)
+    )
+
+
+def _armar(filas) -> list[PedidoLectura]:
+    """Agrupa las filas planas del JOIN en registros, respetando el orden."""
+    cabeceras = {}
+    lineas = {}
+    for f in filas:
+        pid = f[0]
+        if pid not in cabeceras:
+            cabeceras[pid] = f[:_N_CABECERA]
+            lineas[pid] = []
+        det_id, producto_id, nombre, precio, cantidad = f[_N_CABECERA:]
+        if det_id is not None:
+            lineas[pid].append(LineaPedido(
+                id=det_id,
+                producto_id=producto_id,
+                nombre=nombre,
+                cantidad=int(cantidad or 0),
+                precio=int(precio or 0),
+            ))
+
+    return [
+        PedidoLectura(*cab, lineas=tuple(lineas[pid]))
+        for pid, cab in cabeceras.items()
+    ]
+
+
+def cargar_pedido(pedido_id: int) -> Optional[PedidoLectura]:
+    q = (
+        _consulta()
+        .where(Pedido.id == pedido_id)
+        .order_by(PedidoDetalle.id.asc())
+    )
+    pedidos = _armar(db.session.execute(q))
+    return pedidos[0] if pedidos else None
+
+
+def dueno_y_version(pedido_id: int) -> Optional[tuple[int, int]]:
+    """(mesero_id, version) del pedido sin cargar sus líneas, o None."""
+    fila = db.session.execute(
+        select(Pedido.mesero_id, Pedido.version).where(Pedido.id == pedido_id)
+    ).first()
+    return tuple(fila) if fila is not None else None
+
+
+def cargar_pedido_abierto(mesa_id: int) -> Optional[PedidoLectura]:
+    """Pedido abierto más reciente de la mesa (o None)."""
+    q = (
+        _consulta()
+        .where(Pedido.mesa_id == mesa_id, Pedido.estado == "abierto")
+        .order_by(Pedido.fecha.desc(), Pedido.id.desc(), PedidoDetalle.id.asc())
+    )
+    pedidos = _armar(db.session.execute(q))
+    return pedidos[0] if pedidos else None
+
+
+def cargar_pedidos_abiertos(mesa_ids=None) -> list[PedidoLectura]:
+    """Todos los pedidos abiertos, o solo los de esas mesas."""
+    q = _consulta().where(Pedido.estado == "abierto")
+    if mesa_ids is not None:
+        q = q.where(Pedido.mesa_id.in_(list(mesa_ids)))
+    q = q.order_by(Pedido.fecha.desc(), Pedido.id.desc(), PedidoDetalle.id.asc())
+    return _armar(db.session.execute(q))
+
+
+def cargar_pedidos(ids) -> list[PedidoLectura]:
+    """Pedidos por id, en cualquier estado (para las respuestas delta)."""
+    ids = list(ids)
+    if not ids:
+        return []
+    q = (
+        _consulta()
+        .where(Pedido.id.in_(ids))
+        .order_by(Pedido.fecha.desc(), Pedido.id.desc(), PedidoDetalle.id.asc())
+    )
+    return _armar(db.session.execute(q))
+
+
+# ---------- HISTORIAL (keyset) ----------
+ESTADOS_TERMINADOS = ("cerrado", "cancelado")
+METODOS_CONOCIDOS  = ("efectivo", "transferencia", "tarjeta")
+POR_PAGINA         = 50
+
+
+def cursor_de(p: PedidoLectura) -> str:
+    return f"{p.fecha_cierre.isoformat()}_{p.id}"
+
+
+def _leer_cursor(cursor: str) -> tuple[datetime, int]:
+    """ValueError si el cursor no es de cursor_de()."""
+    fecha, _, pid = cursor.rpartition("_")
+    return datetime.fromisoformat(fecha), int(pid)
+
+
+def historial(
+    *,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    mesa: Optional[int] = None,
+    mesero_id: Optional[int] = None,
+    metodo: Optional[str] = None,
+    estado: Optional[str] = None,
+    despues: Optional[str] = None,
+    limite: int = POR_PAGINA,
+) -> tuple[list[PedidoLectura], Optional[str]]:
+    """
+    Pedidos cerrados y cancelados, del más reciente al más viejo, sin sus
+    líneas. Devuelve (página, cursor de la siguiente o None).
+
+    Orden y filtro de página van sobre (fecha_cierre, id), que es el índice
+    ix_pedido_cierre_id (o ix_pedido_estado_fecha_cierre si se filtra por
+    estado): nada de OFFSET. metodo "otro" incluye los pedidos cerrados sin
+    cobrar, como en caja.
+    """
+    q = (
+        select(*_COLUMNAS[:_N_CABECERA])
+        .select_from(Pedido)
+        .join(Mesa, Mesa.id == Pedido.mesa_id)
+        .join(User, User.id == Pedido.mesero_id)
+    )
+
+    if estado:
+        q = q.where(Pedido.estado == estado)
+    else:
+        # "!= abierto" y no "IN (cerrado, cancelado)": con IN el planner
+        # recorre dos rangos del índice por estado y ordena aparte.
+        q = q.where(Pedido.estado != "abierto")
+    q = q.where(Pedido.fecha_cierre.isnot(None))
+
+    if desde:
+        q = q.where(Pedido.fecha_cierre >= bogota_day_to_utc_range(desde)[0])
+    if hasta:
+        q = q.where(Pedido.fecha_cierre <= bogota_day_to_utc_range(hasta)[1])
+    if mesa is not None:
+        q = q.where(Mesa.numero == mesa)
+    if mesero_id is not None:
+        q = q.where(Pedido.mesero_id == mesero_id)
+    if metodo == "otro":
+        q = q.where(or_(Pedido.metodo_pago.is_(None), Pedido.metodo_pago.notin_(METODOS_CONOCIDOS)))
+    elif metodo:
+        q = q.where(Pedido.metodo_pago == metodo)
+    if despues:
+        q = q.where(tuple_(Pedido.fecha_cierre, Pedido.id) < tuple_(*_leer_cursor(despues)))
+
+    filas = db.session.execute(
+        q.order_by(Pedido.fecha_cierre.desc(), Pedido.id.desc()).limit(limite + 1)
+    ).all()
+    pagina = [PedidoLectura(*f, lineas=()) for f in filas[:limite]]
+    siguiente = cursor_de(pagina[-1]) if len(filas) > limite else None
+    return pagina, siguiente
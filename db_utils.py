@@ -0,0 +1,62 @@
+"""
+db_utils.py — utilidades SQL que dependen del motor (SQLite / PostgreSQL).
+"""
+import random
+import time
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from extensions import db
+
+REINTENTOS = 3
+
+
+def insert_upsert(modelo):
+    """
+    INSERT con soporte de ON CONFLICT (.on_conflict_do_update /
+    .on_conflict_do_nothing) para el motor en uso.
+    """
+    dialecto = db.engine.dialect.name
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialecto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upsert no soportado para {dialecto}")
+    return insert(modelo)
+
+
+def bloquear(modelo, id_):
+    """
+    Toma el candado de escritura ANTES de leer y decidir, hasta el commit.
+    PostgreSQL: SELECT ... FOR UPDATE de esa fila; solo espera quien toque
+    la misma fila. SQLite: BEGIN IMMEDIATE. SQLite admite un escritor a la
+    vez de todos modos; así el candado se toma antes de la lectura y no en
+    el primer INSERT (en WAL las lecturas siguen sin esperar).
+    """
+    conn = db.session.connection()
+    if conn.dialect.name == "postgresql":
+        db.session.execute(select(modelo.id).where(modelo.id == id_).with_for_update())
+    elif conn.dialect.name == "sqlite":
+        # pysqlite no abre transacción para los SELECT previos: si ya hay
+        # una abierta (hubo escrituras) no se puede promover y basta con el
+        # índice único + reintentar().
+        if not conn.connection.dbapi_connection.in_transaction:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def reintentar(fn, intentos: int = REINTENTOS):
+    """
+    Corre fn(), que debe terminar en commit. Si choca con otra escritura
+    (índice único, "database is locked", deadlock) hace rollback y repite
+    con una espera corta y aleatoria, hasta `intentos` veces.
+    """
+    for intento in range(1, intentos + 1):
+        try:
+            return fn()
+        except (IntegrityError, OperationalError):
+            db.session.rollback()
+            if intento == intentos:
+                raise
+            time.sleep(random.uniform(0, 0.02 * 2 ** intento))
@@ -0,0 +1,168 @@
+"""
+estaticos.py — CSS/JS con huella de contenido, precomprimidos.
+
+`flask --app app estaticos` (y el master de gunicorn al arrancar) copia
+cada archivo de static/css y static/js a static/dist/ con el hash de su
+contenido en el nombre (js/menu.3f2a9c1d07.js), más su .gz y, si está
+instalado el paquete brotli, su .br, y escribe static/dist/manifest.json.
+
+Las plantillas piden los archivos con estatico("js/menu.js"). Con
+manifiesto resuelve a /assets/js/menu.3f2a9c1d07.js: se sirve con
+Cache-Control immutable por un año (si el contenido cambia, cambia el
+nombre) y en la variante comprimida que acepte el navegador, sin
+comprimir nada por petición. Sin manifiesto (desarrollo) apunta al
+archivo de /static tal cual.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:             # opcional: sin él solo se genera .gz
+    brotli = None
+
+ORIGENES   = ("css", "js")
+DESTINO    = "dist"
+MANIFIESTO = "manifest.json"
+# La generación anterior: sus archivos se conservan una construcción más.
+ANTERIOR   = "manifest.anterior.json"
+# El Service Worker necesita una URL fija (/sw.js la sirve aparte).
+EXCLUIDOS  = {"js/sw.js"}
+UN_ANIO    = 365 * 24 * 3600
+
+_manifiesto: dict[str, str] = {}
+
+
+def _directorio(app) -> str:
+    return os.path.join(app.static_folder, DESTINO)
+
+
+# ---------- CONSTRUCCIÓN ----------
+def _escribir(ruta, datos: bytes):
+    if os.path.exists(ruta):
+        return
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
+
+
+def construir(app) -> dict[str, str]:
+    """
+    Genera static/dist/ y su manifiesto {"js/menu.js": "js/menu.<hash>.js"}.
+    Idempotente: un archivo sin cambios conserva su nombre y no se
+    reescribe.
+
+    Borra solo lo que no está ni en este manifiesto ni en el anterior
+    distinto: durante un reinicio escalonado los workers viejos siguen
+    sirviendo HTML con las URLs de la generación previa, y esas deben
+    seguir respondiendo hasta el siguiente despliegue.
+    """
+    destino = _directorio(app)
+    manifiesto = {}
+    for origen in ORIGENES:
+        carpeta = os.path.join(app.static_folder, origen)
+        if not os.path.isdir(carpeta):
+            continue
+        for nombre in sorted(os.listdir(carpeta)):
+            relativo = f"{origen}/{nombre}"
+            if relativo in EXCLUIDOS or not nombre.endswith((".css", ".js")):
+                continue
+            with open(os.path.join(carpeta, nombre), "rb") as f:
+                datos = f.read()
+            base, ext = os.path.splitext(nombre)
+            huella = hashlib.sha256(datos).hexdigest()[:10]
+            final = f"{origen}/{base}.{huella}{ext}"
+            ruta = os.path.join(destino, final)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+            _escribir(ruta, datos)
+            # mtime=0: el .gz sale igual byte a byte en cada construcción.
+            _escribir(ruta + ".gz", gzip.compress(datos, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _escribir(ruta + ".br", brotli.compress(datos, quality=11))
+            manifiesto[relativo] = final
+
+    os.makedirs(destino, exist_ok=True)
+    ruta_manifiesto = os.path.join(destino, MANIFIESTO)
+    ruta_anterior   = os.path.join(destino, ANTERIOR)
+    previo = _leer_manifiesto(ruta_manifiesto)
+    if previo and previo != manifiesto:
+        _escribir_manifiesto(ruta_anterior, previo)
+        anterior = previo
+    else:
+        anterior = _leer_manifiesto(ruta_anterior)
+
+    vigentes = set(manifiesto.values()) | set(anterior.values())
+    for raiz, _, archivos in os.walk(destino):
+        for archivo in archivos:
+            relativo = os.path.relpath(os.path.join(raiz, archivo), destino).replace(os.sep, "/")
+            if relativo in (MANIFIESTO, ANTERIOR):
+                continue
+            if relativo.removesuffix(".gz").removesuffix(".br") not in vigentes:
+                os.remove(os.path.join(raiz, archivo))
+
+    _escribir_manifiesto(ruta_manifiesto, manifiesto)
+    _manifiesto.clear()
+    _manifiesto.update(manifiesto)
+    return manifiesto
+
+
+def _leer_manifiesto(ruta) -> dict[str, str]:
+    if not os.path.isfile(ruta):
+        return {}
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _escribir_manifiesto(ruta, manifiesto):
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, indent=2, sort_keys=True)
+    os.replace(temporal, ruta)
+
+
+def cargar(app):
+    """Lee el manifiesto si existe (al crear la app)."""
+    _manifiesto.clear()
+    _manifiesto.update(_leer_manifiesto(os.path.join(_directorio(app), MANIFIESTO)))
+
+
+# ---------- PLANTILLAS ----------
+def url(nombre: str) -> str:
+    """URL de un archivo de static/: la versión con huella si existe."""
+    final = _manifiesto.get(nombre)
+    if final is None:
+        return url_for("static", filename=nombre)
+    return url_for("servir_estatico", nombre=final)
+
+
+# ---------- SERVIR ----------
+def servir(app, nombre: str):
+    """
+    /assets/<nombre>: el archivo con huella, precomprimido según
+    Accept-Encoding (br > gzip > sin comprimir), cacheable por un año.
+    """
+    ruta = safe_join(_directorio(app), nombre)
+    if ruta is None or nombre.endswith((".gz", ".br", ".tmp")) or not os.path.isfile(ruta):
+        abort(404)
+    tipo = mimetypes.guess_type(nombre)[0] or "application/octet-stream"
+
+    codificacion = None
+    for cod, ext in (("br", ".br"), ("gzip", ".gz")):
+        if request.accept_encodings[cod] and os.path.isfile(ruta + ext):
+            ruta, codificacion = ruta + ext, cod
+            break
+
+    resp = send_file(ruta, mimetype=tipo, conditional=True, max_age=UN_ANIO)
+    if codificacion:
+        resp.headers["Content-Encoding"] = codificacion
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = f"public, max-age={UN_ANIO}, immutable"
+    return resp
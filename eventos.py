@@ -0,0 +1,282 @@
+"""
+eventos.py — eventos en vivo para /events (Server-Sent Events).
+
+Las escrituras insertan una fila en la tabla evento dentro de su propia
+transacción, así que todos los workers de gunicorn ven los mismos eventos
+en el mismo orden (el id de la fila es el Last-Event-ID del cliente). El
+id se asigna al confirmar y en orden de commit (ver
+_insertar_al_confirmar): un id menor nunca aparece después de uno mayor.
+
+Para no leer la tabla en vano, un hilo por worker (_Vigia) vigila y
+despierta a los streams de ese proceso:
+  - PostgreSQL: NOTIFY al publicar y una conexión LISTEN por worker
+    (despierta al instante).
+  - SQLite (local), o PgBouncer sin URL directa (LISTEN no sobrevive al
+    pooling por transacción): MAX(id) cada segundo, una consulta por
+    worker (no por stream).
+
+Cada conexión dura como máximo STREAM_SEGUNDOS; el navegador se reconecta
+solo con Last-Event-ID y retoma donde iba. Con el worker gthread
+(gunicorn.conf.py) un stream ocupa un hilo, no un worker completo.
+"""
+import json
+import select as _select
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, insert, select, text, update
+
+from extensions import db
+from models import Evento, VersionCambio
+import versiones
+
+CANAL = "pos_eventos"
+# Fila de version_cambio que numera los eventos en orden de commit.
+SECUENCIA  = "eventos"
+_PENDIENTES = "eventos_pendientes"      # clave en session.info
+
+STREAM_SEGUNDOS  = 55    # luego el cliente se reconecta con Last-Event-ID
+PING_SEGUNDOS    = 15    # comentario para que proxies no corten la conexión
+SQLITE_INTERVALO = 1.0
+RETENCION        = timedelta(days=1)
+LOTE             = 200
+PURGA_CADA       = 500   # ids entre purgas de la tabla
+
+
+# ---------- PUBLICAR ----------
+def publicar(tipo: str, **datos):
+    """
+    Registra un evento. No hace commit ni inserta todavía: la fila entra
+    en _insertar_al_confirmar, justo antes del COMMIT de la escritura.
+    """
+    db.session.info.setdefault(_PENDIENTES, []).append(
+        (tipo, json.dumps(datos, ensure_ascii=False))
+    )
+
+
+def _insertar_al_confirmar(session):
+    """
+    Los ids salen de la fila SECUENCIA de version_cambio, que queda tomada
+    hasta el COMMIT: quien publique después espera a que este commit se
+    vea. Así los ids se hacen visibles en orden y un cursor "id > último"
+    no salta nunca un evento (con un SERIAL, el id N puede confirmarse
+    después de que alguien ya leyó N+1).
+    """
+    pendientes = session.info.pop(_PENDIENTES, None)
+    if not pendientes:
+        return
+    session.flush()
+    n = len(pendientes)
+    ultimo = session.execute(
+        update(VersionCambio)
+        .where(VersionCambio.clave == SECUENCIA)
+        .values(valor=VersionCambio.valor + n)
+        .returning(VersionCambio.valor)
+    ).scalar()
+    if ultimo is None:
+        # BD sin la fila (init-db la crea con asegurar()).
+        ultimo = (session.execute(select(func.max(Evento.id))).scalar() or 0) + n
+        session.add(VersionCambio(clave=SECUENCIA, valor=ultimo))
+    primero = ultimo - n + 1
+    ahora = datetime.utcnow()
+    session.execute(insert(Evento), [
+        {"id": primero + i, "tipo": tipo, "datos": datos, "fecha": ahora}
+        for i, (tipo, datos) in enumerate(pendientes)
+    ])
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text("SELECT pg_notify(:canal, '')"), {"canal": CANAL})
+    if primero // PURGA_CADA != ultimo // PURGA_CADA:
+        session.execute(delete(Evento).where(Evento.fecha < ahora - RETENCION))
+
+
+def _descartar(session):
+    session.info.pop(_PENDIENTES, None)
+
+
+# Después del listener de versiones.py (importado arriba): toda transacción
+# toma primero los contadores, en orden, y al final la fila SECUENCIA.
+event.listen(db.session, "before_commit", _insertar_al_confirmar)
+event.listen(db.session, "after_rollback", _descartar)
+
+
+def asegurar():
+    """Crea la fila SECUENCIA desde el último id existente (init-db)."""
+    if db.session.get(VersionCambio, SECUENCIA) is None:
+        ultimo = db.session.execute(select(func.max(Evento.id))).scalar() or 0
+        db.session.add(VersionCambio(clave=SECUENCIA, valor=ultimo))
+        db.session.commit()
+
+
+def mesa_cambiada(mesa):
+    versiones.subir(versiones.MESAS)
+    publicar("mesa", id=mesa.id, numero=mesa.numero, estado=mesa.estado)
+
+
+def pedido_cambiado(pedido_id: int, accion: str):
+    """accion: "creado" | "actualizado" | "cerrado" | "cancelado"."""
+    versiones.subir(versiones.PEDIDOS)
+    versiones.subir_pedido(pedido_id)
+    publicar("pedido", id=pedido_id, accion=accion)
+
+
+def ultimo_id() -> int:
+    return db.session.execute(select(func.max(Evento.id))).scalar() or 0
+
+
+def pedidos_cambiados(desde_id: int, hasta_id: int):
+    """
+    Ids de pedidos con eventos en (desde_id, hasta_id], o None si parte de
+    ese rango ya se purgó (el cliente debe pedir la lista completa).
+    """
+    primero = db.session.execute(select(func.min(Evento.id))).scalar()
+    if primero is not None and desde_id < primero - 1:
+        return None
+
+    filas = db.session.execute(
+        select(Evento.datos)
+        .where(Evento.id > desde_id, Evento.id <= hasta_id, Evento.tipo == "pedido")
+    ).scalars()
+    return {json.loads(d)["id"] for d in filas}
+
+
+# ---------- STREAM ----------
+class _EsperaSondeo:
+    def esperar(self, timeout):
+        time.sleep(min(timeout, SQLITE_INTERVALO))
+        return True
+
+    def cerrar(self):
+        pass
+
+
+class _EsperaPostgres:
+    """Conexión propia (fuera del pool) en LISTEN sobre CANAL."""
+
+    def __init__(self, url):
+        import psycopg2
+
+        url = url.set(drivername="postgresql")
+        self.conn = psycopg2.connect(url.render_as_string(hide_password=False))
+        self.conn.autocommit = True
+        with self.conn.cursor() as cur:
+            cur.execute(f"LISTEN {CANAL}")
+
+    def esperar(self, timeout):
+        if _select.select([self.conn], [], [], timeout) == ([], [], []):
+            return False
+        self.conn.poll()
+        self.conn.notifies.clear()
+        return True
+
+    def cerrar(self):
+        self.conn.close()
+
+
+class _Vigia:
+    """
+    Un hilo por worker que espera eventos nuevos (LISTEN o sondeo de
+    MAX(id) cada SQLITE_INTERVALO) y despierta a todos los streams del
+    proceso con una Condition. Con N tabletas conectadas son una conexión
+    LISTEN y una consulta por segundo por worker, no N de cada una.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.ultimo = 0
+        self.hilo = None
+
+    def arrancar(self, engine, url_listen):
+        with self.cond:
+            # Tras el fork de gunicorn el hilo del padre no existe aquí.
+            if self.hilo is not None and self.hilo.is_alive():
+                return
+            self.ultimo = self._maximo(engine)
+            self.hilo = threading.Thread(
+                target=self._correr, args=(engine, url_listen), name="eventos", daemon=True
+            )
+            self.hilo.start()
+
+    @staticmethod
+    def _maximo(engine) -> int:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(Evento.id))).scalar() or 0
+
+    def _correr(self, engine, url_listen):
+        while True:
+            espera = None
+            try:
+                espera = _EsperaPostgres(url_listen) if url_listen is not None else _EsperaSondeo()
+                while True:
+                    espera.esperar(PING_SEGUNDOS)
+                    self._avisar(self._maximo(engine))
+            except Exception:
+                # BD caída o conexión LISTEN cortada: se reintenta sin tumbar el worker.
+                time.sleep(SQLITE_INTERVALO)
+            finally:
+                if espera is not None:
+                    try:
+                        espera.cerrar()
+                    except Exception:
+                        pass
+
+    def _avisar(self, maximo):
+        with self.cond:
+            if maximo > self.ultimo:
+                self.ultimo = maximo
+                self.cond.notify_all()
+
+    def actual(self) -> int:
+        with self.cond:
+            return self.ultimo
+
+    def esperar(self, visto: int, timeout: float):
+        """Bloquea hasta que haya un id mayor que `visto` o pase el timeout."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.ultimo > visto, timeout)
+
+
+_vigia = _Vigia()
+
+
+def _leer(engine, desde_id, tipos):
+    tabla = Evento.__table__
+    q = (
+        select(tabla.c.id, tabla.c.tipo, tabla.c.datos)
+        .where(tabla.c.id > desde_id, tabla.c.tipo.in_(tipos))
+        .order_by(tabla.c.id.asc())
+        .limit(LOTE)
+    )
+    with engine.connect() as conn:
+        return conn.execute(q).all()
+
+
+def stream(engine, desde_id: int, tipos, url_listen=None):
+    """
+    Generador SSE. Recibe el engine (no la sesión) porque corre fuera del
+    contexto de la petición; cada lectura toma y devuelve una conexión del
+    pool, y solo cuando el vigía del worker avisa que hay ids nuevos.
+    url_listen: URL de PostgreSQL donde hacer LISTEN (None = sondear la tabla).
+    """
+    _vigia.arrancar(engine, url_listen)
+
+    ultimo = desde_id
+    fin = time.monotonic() + STREAM_SEGUNDOS
+    proximo_ping = time.monotonic() + PING_SEGUNDOS
+    yield "retry: 3000\n\n"
+    while time.monotonic() < fin:
+        # La marca se toma ANTES de leer: lo que llegue después la supera
+        # y despierta la espera aunque la lectura ya lo haya incluido.
+        visto = _vigia.actual()
+        filas = _leer(engine, ultimo, tipos)
+        for f in filas:
+            ultimo = f.id
+            yield f"id: {f.id}\nevent: {f.tipo}\ndata: {f.datos}\n\n"
+        if len(filas) == LOTE:
+            continue
+
+        if time.monotonic() >= proximo_ping:
+            yield ": ping\n\n"
+            proximo_ping = time.monotonic() + PING_SEGUNDOS
+
+        _vigia.esperar(visto, max(0.0, min(proximo_ping, fin) - time.monotonic()))
@@ -0,0 +1,88 @@
+"""
+exportar.py — exportación CSV de pedidos cobrados para contabilidad.
+
+Una fila por línea de pedido (con los datos del pedido repetidos), para
+un rango de días de Bogotá. Se genera en streaming: la consulta corre con
+cursor del lado del servidor (stream_results + yield_per) y cada lote se
+escribe y se envía en cuanto llega, así que un año de pedidos ocupa la
+misma memoria que un día y el primer byte sale de inmediato.
+"""
+import csv
+import io
+from datetime import date
+
+from sqlalchemy import select
+
+from models import User, Mesa, Producto, Pedido, PedidoDetalle
+from zonas import bogota_day_to_utc_range, to_bogota
+
+LOTE = 500
+
+COLUMNAS = (
+    "pedido_id", "fecha_cierre", "dia", "mesa", "mesero", "metodo_pago",
+    "total_pedido", "monto_recibido", "cambio",
+    "producto_id", "producto", "cantidad", "precio_unitario", "subtotal",
+)
+
+
+def _pesos(valor):
+    return "" if valor is None else int(valor)
+
+
+def _consulta(desde: date, hasta: date):
+    inicio, _ = bogota_day_to_utc_range(desde)
+    _, fin = bogota_day_to_utc_range(hasta)
+    return (
+        select(
+            Pedido.id, Pedido.fecha_cierre, Mesa.numero, User.username, Pedido.metodo_pago,
+            Pedido.total, Pedido.monto_recibido, Pedido.cambio,
+            PedidoDetalle.producto_id, Producto.nombre, PedidoDetalle.cantidad,
+            PedidoDetalle.precio_unitario,
+        )
+        .select_from(Pedido)
+        .join(Mesa, Mesa.id == Pedido.mesa_id)
+        .join(User, User.id == Pedido.mesero_id)
+        .outerjoin(PedidoDetalle, PedidoDetalle.pedido_id == Pedido.id)
+        .outerjoin(Producto, Producto.id == PedidoDetalle.producto_id)
+        .where(
+            Pedido.estado == "cerrado",
+            Pedido.fecha_cierre >= inicio,
+            Pedido.fecha_cierre <= fin,
+        )
+        .order_by(Pedido.fecha_cierre.asc(), Pedido.id.asc(), PedidoDetalle.id.asc())
+    )
+
+
+def _fila(f):
+    cierre = to_bogota(f.fecha_cierre)
+    cantidad = f.cantidad or 0
+    precio = f.precio_unitario or 0
+    return (
+        f.id, cierre.strftime("%Y-%m-%d %H:%M:%S"), cierre.date().isoformat(),
+        f.numero, f.username, f.metodo_pago or "",
+        _pesos(f.total), _pesos(f.monto_recibido), _pesos(f.cambio),
+        f.producto_id or "", f.nombre or "", cantidad,
+        _pesos(precio), _pesos(cantidad * precio),
+    )
+
+
+def csv_pedidos(engine, desde: date, hasta: date):
+    """
+    Generador de trozos CSV (str). Recibe el engine, como eventos.stream:
+    corre después de que la vista retorna y usa su propia conexión.
+    """
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    buf.write("\ufeff")          # BOM: Excel abre el UTF-8 con tildes bien
+    w.writerow(COLUMNAS)
+    yield buf.getvalue()
+
+    with engine.connect() as conn:
+        resultado = conn.execution_options(stream_results=True, yield_per=LOTE).execute(
+            _consulta(desde, hasta)
+        )
+        for lote in resultado.partitions():
+            buf.seek(0)
+            buf.truncate()
+            w.writerows(_fila(f) for f in lote)
+            yield buf.getvalue()
@@ -0,0 +1,45 @@
+"""
+fragmentos.py — caché de fragmentos HTML ya renderizados, por proceso.
+
+Para partes de una página que son iguales para todos los usuarios (la
+carta del menú): cada fragmento se guarda con la versión de la que salió
+y se reutiliza mientras esa versión siga vigente; otro worker que sube la
+versión (catalogo.invalidar) hace que aquí se renderice de nuevo en la
+siguiente petición. Acotado a MAXIMO fragmentos (LRU); una versión nueva
+reemplaza a la vieja del mismo fragmento.
+"""
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+MAXIMO = 16
+
+_cache: "OrderedDict[str, tuple[int, Markup]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def obtener(nombre: str, version: int, construir) -> Markup:
+    """
+    HTML del fragmento para esa versión; si no está, lo arma construir()
+    (fuera del candado: dos hilos pueden renderizarlo a la vez, y gana
+    cualquiera de los dos, que son iguales).
+    """
+    with _lock:
+        guardado = _cache.get(nombre)
+        if guardado is not None and guardado[0] == version:
+            _cache.move_to_end(nombre)
+            return guardado[1]
+
+    html = Markup(construir())
+    with _lock:
+        _cache[nombre] = (version, html)
+        _cache.move_to_end(nombre)
+        while len(_cache) > MAXIMO:
+            _cache.popitem(last=False)
+    return html
+
+
+def descartar(nombre: str):
+    with _lock:
+        _cache.pop(nombre, None)
@@ -0,0 +1,36 @@
+# Configuración de gunicorn (se carga sola: `gunicorn app:app`).
+# gthread: cada stream SSE de /events ocupa un hilo, no un worker completo.
+# preload_app: la app se importa una vez en el master y los workers la
+# heredan por fork (copy-on-write), plantillas Jinja ya compiladas incluidas.
+# El master tarda más en escuchar y el primer worker responde casi en
+# cuanto nace (bench/arranque.py).
+# El esquema y el seed van aparte: `flask --app app init-db`.
+import os
+
+bind         = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers      = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads      = int(os.getenv("GUNICORN_THREADS", "16"))
+timeout      = 120
+preload_app  = True
+
+
+def when_ready(server):
+    # Master, con la app ya cargada y antes de crear los workers.
+    import estaticos
+    from app import app, precompilar_templates
+    precompilar_templates(app)
+    # CSS/JS con huella y precomprimidos; los workers heredan el manifiesto.
+    estaticos.construir(app)
+
+
+def post_fork(server, worker):
+    # Las conexiones del pool no se comparten entre procesos: cada worker
+    # abre las suyas (close=False deja las del master intactas).
+    from app import app
+    from extensions import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+    # Los hilos no pasan el fork: cada worker arranca su hilo impresor.
+    import impresion
+    impresion.arrancar(app)
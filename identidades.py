@@ -0,0 +1,114 @@
+"""
+identidades.py — usuario autenticado sin consultar la tabla user en cada petición.
+
+Flask-Login llama a user_loader en cada petición, y el polling de
+/mesas.json y /admin/pedidos.json corre cada 2.5 s por pantalla. Aquí cada
+worker guarda la identidad (id, usuario, rol, activo) en un LRU acotado con
+TTL corto; las rutas leen current_user de ese registro, no de la sesión ORM.
+
+Las rutas que desactivan o borran un usuario llaman invalidar() antes del
+commit: además de sacarlo del LRU local sube el contador "usuarios" de
+version_cambio. Cada worker relee ese contador como mucho una vez cada
+USUARIOS_SELLO segundos (una sola consulta para todos los usuarios) y,
+si cambió, vacía su LRU. Un usuario desactivado pierde el acceso en todos
+los workers en ese plazo; el TTL (USUARIOS_TTL) queda como tope si el
+contador no se pudiera leer.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select
+
+from extensions import db
+from models import User
+import versiones
+
+TTL_SEGUNDOS   = float(os.getenv("USUARIOS_TTL", "10"))
+SELLO_SEGUNDOS = float(os.getenv("USUARIOS_SELLO", "1"))
+MAXIMO         = 512
+
+
+@dataclass(frozen=True, slots=True)
+class Identidad:
+    """Lo que Flask-Login necesita de current_user, más rol y estado."""
+    id: int
+    username: str
+    role: str
+    activo: bool
+
+    is_authenticated = True
+    is_anonymous     = False
+
+    @property
+    def is_active(self) -> bool:
+        return self.activo
+
+    def get_id(self) -> str:
+        return str(self.id)
+
+
+_cache: "OrderedDict[int, tuple[float, Optional[Identidad]]]" = OrderedDict()
+_lock = threading.Lock()
+# Último valor visto del contador "usuarios" y cuándo volver a leerlo.
+_sello = {"valor": None, "proxima": 0.0}
+
+
+def _identidad(u) -> Identidad:
+    """u: instancia de User o fila con las mismas columnas."""
+    return Identidad(u.id, u.username, (u.role or "").lower(), u.activo is not False)
+
+
+def _guardar(user_id: int, ident: Optional[Identidad]):
+    with _lock:
+        _cache[user_id] = (time.monotonic() + TTL_SEGUNDOS, ident)
+        _cache.move_to_end(user_id)
+        while len(_cache) > MAXIMO:
+            _cache.popitem(last=False)
+
+
+def _revisar_sello():
+    """Vacía el LRU si otro worker cambió algún usuario desde la última vez."""
+    if time.monotonic() < _sello["proxima"]:
+        return
+    valor = versiones.actual(versiones.USUARIOS)
+    with _lock:
+        if valor != _sello["valor"]:
+            _cache.clear()
+            _sello["valor"] = valor
+        _sello["proxima"] = time.monotonic() + SELLO_SEGUNDOS
+
+
+def cargar(user_id: int) -> Optional[Identidad]:
+    """Identidad activa del usuario, o None (no existe o está desactivado)."""
+    _revisar_sello()
+    with _lock:
+        entrada = _cache.get(user_id)
+        if entrada is not None and entrada[0] > time.monotonic():
+            _cache.move_to_end(user_id)
+            ident = entrada[1]
+            return ident if ident is not None and ident.activo else None
+
+    fila = db.session.execute(
+        select(User.id, User.username, User.role, User.activo).where(User.id == user_id)
+    ).first()
+    ident = _identidad(fila) if fila is not None else None
+    _guardar(user_id, ident)
+    return ident if ident is not None and ident.activo else None
+
+
+def recordar(u: User) -> Identidad:
+    """Al iniciar sesión: guarda la identidad ya leída y la devuelve."""
+    ident = _identidad(u)
+    _guardar(u.id, ident)
+    return ident
+
+
+def invalidar(user_id: int):
+    """Llamar antes del commit que cambia o borra al usuario."""
+    versiones.subir(versiones.USUARIOS)
+    with _lock:
+        _cache.pop(user_id, None)
@@ -0,0 +1,435 @@
+"""
+impresion.py — cola de impresión: facturas al cobrar y comandas de cocina.
+
+cobrar_pedido y los envíos del mesero (/mesa/<id>, /sync) solo insertan
+una fila en trabajo_impresion, en la misma transacción que la escritura,
+con el ticket ya armado en JSON. Un hilo por proceso (arrancar(), desde
+post_fork de gunicorn) o un proceso aparte (`flask --app app impresora`)
+toma los pendientes, los convierte a ESC/POS o texto plano y los manda a
+la impresora. Así cobrar responde al instante aunque la impresora tarde o
+esté apagada.
+
+Impresoras (variable IMPRESORAS, "nombre=destino" separadas por ";"):
+    caja=tcp://192.168.1.50:9100        impresora térmica en red (RAW 9100)
+    cocina=archivo:instance/cocina.prn  se agrega a un archivo (pruebas)
+Un tipo de ticket sin impresora configurada no se encola: sin "caja" la
+factura sigue imprimiéndose desde el navegador, como antes.
+
+Varios workers pueden imprimir a la vez: cada trabajo se reclama con un
+UPDATE condicional y solo uno gana. Si la impresora falla, el trabajo se
+reintenta con espera creciente hasta MAX_INTENTOS y queda en "error"
+(se puede reintentar desde /admin/impresion/<id>/reintentar). Un trabajo
+que quedó "imprimiendo" porque su worker murió se retoma tras RECLAMO; en
+ese caso raro el ticket puede salir dos veces, nunca ninguna.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, delete, event, or_, select, update
+
+from extensions import db
+from models import TrabajoImpresion
+from zonas import to_bogota
+
+FACTURA = "factura"
+COCINA  = "cocina"
+# Tipo de ticket -> impresora que lo recibe.
+DESTINOS = {FACTURA: "caja", COCINA: "cocina"}
+
+FORMATOS = ("escpos", "texto")
+
+INTERVALO     = 2.0                    # s entre vueltas si nadie avisa
+LOTE          = 20
+MAX_INTENTOS  = 8
+ESPERA_MAXIMA = 300                    # s entre reintentos (tope)
+RECLAMO       = timedelta(minutes=2)   # "imprimiendo" más que esto = worker caído
+TIMEOUT_TCP   = 5.0
+RETENCION     = timedelta(days=7)
+PUERTO_RAW    = 9100
+
+ENCABEZADO = ("RANCHO 27", "NIT: 000000000", "Dirección: Kilometro 27", "Tel: 3225935689")
+
+_despertar = threading.Event()
+_hilo = None
+
+
+# ---------- CONFIGURACIÓN ----------
+def _leer_impresoras(texto: str) -> dict[str, str]:
+    impresoras = {}
+    for parte in texto.split(";"):
+        if not parte.strip():
+            continue
+        nombre, _, destino = parte.partition("=")
+        nombre, destino = nombre.strip(), destino.strip()
+        if not nombre or not destino.startswith(("tcp://", "archivo:")):
+            raise ValueError(f"IMPRESORAS: '{parte.strip()}' no es nombre=tcp://host:puerto ni nombre=archivo:ruta")
+        impresoras[nombre] = destino
+    return impresoras
+
+
+def instalar(app):
+    """Lee la configuración de impresoras del entorno."""
+    app.config["IMPRESORAS"] = _leer_impresoras(os.getenv("IMPRESORAS", ""))
+    formato = os.getenv("IMPRESION_FORMATO", "escpos").strip().lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"IMPRESION_FORMATO desconocido: {formato} (opciones: {', '.join(FORMATOS)})")
+    app.config["IMPRESION_FORMATO"] = formato
+    app.config["IMPRESORA_COLUMNAS"] = int(os.getenv("IMPRESORA_COLUMNAS", "42"))
+
+
+def _tras_commit(session):
+    # Solo despierta al hilo de este proceso; los demás lo ven en su vuelta.
+    if session.info.pop("impresion_nueva", False):
+        _despertar.set()
+
+
+def _tras_rollback(session):
+    session.info.pop("impresion_nueva", None)
+
+
+# Una sola vez por proceso, sobre la sesión global (no por create_app):
+# avisa al hilo impresor en cada commit que encoló algo.
+event.listen(db.session, "after_commit", _tras_commit)
+event.listen(db.session, "after_rollback", _tras_rollback)
+
+
+def configurada(tipo: str) -> bool:
+    return DESTINOS[tipo] in current_app.config["IMPRESORAS"]
+
+
+# ---------- ENCOLAR ----------
+def _encolar(tipo: str, pedido_id: int, datos: dict):
+    """Inserta el trabajo y devuelve su id (None sin impresora). No hace commit."""
+    if not configurada(tipo):
+        return None
+    trabajo = TrabajoImpresion(
+        tipo=tipo,
+        destino=DESTINOS[tipo],
+        pedido_id=pedido_id,
+        datos=json.dumps(datos, ensure_ascii=False),
+    )
+    db.session.add(trabajo)
+    db.session.flush()
+    db.session.info["impresion_nueva"] = True
+    return trabajo.id
+
+
+def encolar_factura(pedido):
+    """pedido: PedidoLectura ya con los datos del cobro (método, cambio...)."""
+    return _encolar(FACTURA, pedido.id, {
+        "pedido":   pedido.id,
+        "mesa":     pedido.mesa_numero,
+        "mesero":   pedido.mesero,
+        "fecha":    (pedido.fecha_cierre or pedido.fecha or datetime.utcnow()).isoformat(),
+        "lineas":   [[l.cantidad, l.nombre, l.precio] for l in pedido.lineas],
+        "total":    pedido.total,
+        "metodo":   pedido.metodo_pago,
+        "recibido": pedido.monto_recibido,
+        "cambio":   pedido.cambio,
+    })
+
+
+def encolar_cocina(pedido_id: int, mesa_numero: int, mesero: str, items: dict, carta, nuevo: bool):
+    """Comanda con lo que se acaba de enviar (items: producto_id -> cantidad)."""
+    return _encolar(COCINA, pedido_id, {
+        "pedido": pedido_id,
+        "mesa":   mesa_numero,
+        "mesero": mesero,
+        "nuevo":  nuevo,
+        "fecha":  datetime.utcnow().isoformat(),
+        "lineas": [[cantidad, carta.por_id[pid].nombre] for pid, cantidad in items.items()],
+    })
+
+
+# ---------- RENDER ----------
+ESC = b"\x1b"
+GS  = b"\x1d"
+CODIFICACION = "cp850"      # ESC t 2: tildes y ñ en la mayoría de térmicas
+
+
+class _Ticket:
+    """Líneas de texto con estilo; salen como ESC/POS o como texto plano."""
+
+    def __init__(self, columnas: int, escpos: bool):
+        self.columnas = columnas
+        self.escpos = escpos
+        self.salida = bytearray()
+        if escpos:
+            self.salida += ESC + b"@" + ESC + b"t\x02"
+
+    def _ancho(self, grande: bool) -> int:
+        # Doble ancho en la térmica = la mitad de columnas; en texto no cambia.
+        return self.columnas // 2 if grande and self.escpos else self.columnas
+
+    def linea(self, texto="", *, centro=False, negrita=False, grande=False, alto=False):
+        """grande: doble alto y ancho (títulos); alto: solo doble alto."""
+        texto = texto[:self._ancho(grande)]
+        if self.escpos:
+            modo = (0x08 if negrita else 0) | (0x30 if grande else 0) | (0x10 if alto else 0)
+            self.salida += ESC + b"a" + (b"\x01" if centro else b"\x00")
+            self.salida += ESC + b"!" + bytes([modo])
+            self.salida += texto.encode(CODIFICACION, "replace") + b"\n"
+        else:
+            if centro:
+                texto = texto.center(self.columnas).rstrip()
+            self.salida += texto.encode("utf-8") + b"\n"
+
+    def par(self, izquierda: str, derecha: str, **estilo):
+        """Texto a la izquierda y valor alineado a la derecha."""
+        ancho = self._ancho(estilo.get("grande", False))
+        izquierda = izquierda[:max(0, ancho - len(derecha) - 1)]
+        self.linea(izquierda + " " * (ancho - len(izquierda) - len(derecha)) + derecha, **estilo)
+
+    def separador(self):
+        self.linea("-" * self.columnas)
+
+    def terminar(self) -> bytes:
+        if self.escpos:
+            # Estilo normal, avanza 4 líneas y corte parcial.
+            self.salida += ESC + b"!\x00" + ESC + b"a\x00" + ESC + b"d\x04" + GS + b"V\x42\x00"
+        else:
+            self.salida += b"\n" + b"=" * self.columnas + b"\n\n"
+        return bytes(self.salida)
+
+
+def _pesos(valor) -> str:
+    return "$" + f"{int(valor or 0):,}".replace(",", ".")
+
+
+def _hora(iso: str, formato="%d/%m/%Y %H:%M") -> str:
+    return to_bogota(datetime.fromisoformat(iso)).strftime(formato)
+
+
+def _factura(t: _Ticket, d: dict):
+    t.linea(ENCABEZADO[0], centro=True, negrita=True, grande=True)
+    for texto in ENCABEZADO[1:]:
+        t.linea(texto, centro=True)
+    t.separador()
+    t.par(f"Factura: #{d['pedido']}", f"Mesa: {d['mesa']}")
+    t.linea(f"Mesero: {d['mesero']}")
+    t.linea(f"Hora: {_hora(d['fecha'])}")
+    t.separador()
+    for cantidad, nombre, precio in d["lineas"]:
+        t.par(f"{cantidad}x {nombre}", _pesos(cantidad * precio))
+        t.linea(f"   ({_pesos(precio)} c/u)")
+    t.separador()
+    t.par("TOTAL", _pesos(d["total"]), negrita=True, grande=True)
+    if d.get("metodo"):
+        t.par("Pago", d["metodo"])
+    if d.get("metodo") == "efectivo":
+        t.par("Recibido", _pesos(d["recibido"]))
+        t.par("Cambio", _pesos(d["cambio"]))
+    t.separador()
+    t.linea("¡Gracias por tu visita!", centro=True, negrita=True)
+    t.linea("Vuelve pronto", centro=True)
+
+
+def _cocina(t: _Ticket, d: dict):
+    t.linea("COCINA", centro=True, negrita=True)
+    t.linea(f"MESA {d['mesa']}", centro=True, negrita=True, grande=True)
+    t.par(f"Pedido #{d['pedido']}", "NUEVO" if d["nuevo"] else "ADICIÓN", negrita=True)
+    t.par(f"Mesero: {d['mesero']}", _hora(d["fecha"], "%H:%M"))
+    t.separador()
+    for cantidad, nombre in d["lineas"]:
+        t.linea(f"{cantidad:>2} {nombre}", negrita=True, alto=True)
+    t.separador()
+
+
+_PLANTILLAS = {FACTURA: _factura, COCINA: _cocina}
+
+
+def renderizar(tipo: str, datos: dict, formato: str = "escpos", columnas: int = 42) -> bytes:
+    t = _Ticket(columnas, escpos=(formato == "escpos"))
+    _PLANTILLAS[tipo](t, datos)
+    return t.terminar()
+
+
+# ---------- ENVÍO ----------
+def mandar(destino: str, datos: bytes):
+    """Entrega los bytes a la impresora. Lanza OSError/ValueError si falla."""
+    if destino.startswith("tcp://"):
+        host, _, puerto = destino[len("tcp://"):].rstrip("/").rpartition(":")
+        if not host:
+            host, puerto = puerto, PUERTO_RAW
+        with socket.create_connection((host, int(puerto)), timeout=TIMEOUT_TCP) as s:
+            s.sendall(datos)
+    elif destino.startswith("archivo:"):
+        ruta = destino[len("archivo:"):]
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        with open(ruta, "ab") as f:
+            f.write(datos)
+    else:
+        raise ValueError(f"destino desconocido: {destino}")
+
+
+# ---------- HILO IMPRESOR ----------
+def _pendientes(ahora):
+    vencido = ahora - RECLAMO
+    return or_(
+        and_(TrabajoImpresion.estado == "pendiente", TrabajoImpresion.proximo_intento <= ahora),
+        and_(TrabajoImpresion.estado == "imprimiendo", TrabajoImpresion.reclamado < vencido),
+    )
+
+
+def _reclamar(trabajo_id: int):
+    """(tipo, destino, datos, intentos) si este proceso se quedó con el trabajo; None si no."""
+    ahora = datetime.utcnow()
+    res = db.session.execute(
+        update(TrabajoImpresion)
+        .where(TrabajoImpresion.id == trabajo_id, _pendientes(ahora))
+        .values(estado="imprimiendo", reclamado=ahora)
+        .execution_options(synchronize_session=False)
+    )
+    if res.rowcount != 1:
+        db.session.commit()
+        return None
+    fila = db.session.execute(
+        select(TrabajoImpresion.tipo, TrabajoImpresion.destino,
+               TrabajoImpresion.datos, TrabajoImpresion.intentos)
+        .where(TrabajoImpresion.id == trabajo_id)
+    ).one()
+    # Commit antes de hablar con la impresora: no se deja una transacción
+    # abierta (ni la BD de SQLite tomada) mientras la red responde.
+    db.session.commit()
+    return fila
+
+
+def _espera(intentos: int) -> timedelta:
+    return timedelta(seconds=min(ESPERA_MAXIMA, 5 * 2 ** (intentos - 1)))
+
+
+def procesar(config) -> int:
+    """Una vuelta: imprime los trabajos vencidos. Devuelve cuántos intentó."""
+    ids = db.session.execute(
+        select(TrabajoImpresion.id)
+        .where(_pendientes(datetime.utcnow()))
+        .order_by(TrabajoImpresion.id.asc())
+        .limit(LOTE)
+    ).scalars().all()
+    db.session.commit()
+
+    impresoras = config["IMPRESORAS"]
+    caidas = set()          # impresora que falló en esta vuelta: no insistir
+    intentados = 0
+    for trabajo_id in ids:
+        reclamo = _reclamar(trabajo_id)
+        if reclamo is None:
+            continue
+        tipo, destino, datos, intentos = reclamo
+        if destino in caidas:
+            # Se devuelve tal cual: la impresora ya falló en esta vuelta.
+            db.session.execute(
+                update(TrabajoImpresion).where(TrabajoImpresion.id == trabajo_id)
+                .values(estado="pendiente", reclamado=None)
+            )
+            db.session.commit()
+            continue
+
+        intentados += 1
+        try:
+            if destino not in impresoras:
+                raise ValueError(f"impresora '{destino}' no configurada")
+            mandar(impresoras[destino], renderizar(
+                tipo, json.loads(datos), config["IMPRESION_FORMATO"], config["IMPRESORA_COLUMNAS"]
+            ))
+        except (OSError, ValueError, KeyError) as e:
+            caidas.add(destino)
+            intentos += 1
+            final = intentos >= MAX_INTENTOS
+            db.session.execute(
+                update(TrabajoImpresion).where(TrabajoImpresion.id == trabajo_id)
+                .values(
+                    estado="error" if final else "pendiente",
+                    intentos=intentos,
+                    error=f"{type(e).__name__}: {e}"[:200],
+                    proximo_intento=datetime.utcnow() + _espera(intentos),
+                    reclamado=None,
+                )
+            )
+        else:
+            db.session.execute(
+                update(TrabajoImpresion).where(TrabajoImpresion.id == trabajo_id)
+                .values(estado="impreso", intentos=intentos + 1, error=None, impreso=datetime.utcnow())
+            )
+        db.session.commit()
+    return intentados
+
+
+def _purgar():
+    db.session.execute(
+        delete(TrabajoImpresion)
+        .where(TrabajoImpresion.estado == "impreso",
+               TrabajoImpresion.impreso < datetime.utcnow() - RETENCION)
+    )
+    db.session.commit()
+
+
+def trabajar(app, parar=None):
+    """Bucle del impresor hasta que se active `parar` (o para siempre)."""
+    parar = parar or threading.Event()
+    proxima_purga = 0.0
+    while not parar.is_set():
+        _despertar.clear()
+        with app.app_context():
+            try:
+                procesar(app.config)
+                if time.monotonic() >= proxima_purga:
+                    _purgar()
+                    proxima_purga = time.monotonic() + 3600
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("impresión: falló la vuelta del impresor")
+        _despertar.wait(INTERVALO)
+
+
+def arrancar(app):
+    """
+    Hilo impresor de este proceso (gunicorn post_fork, `python app.py`).
+    Nada que hacer sin impresoras o con IMPRESION_HILO=0 (cuando corre
+    `flask --app app impresora` aparte).
+    """
+    global _hilo
+    if not app.config["IMPRESORAS"] or os.getenv("IMPRESION_HILO", "1") == "0":
+        return
+    if _hilo is None or not _hilo.is_alive():
+        _hilo = threading.Thread(target=trabajar, args=(app,), name="impresion", daemon=True)
+        _hilo.start()
+
+
+# ---------- ESTADO ----------
+def trabajo_json(t: TrabajoImpresion) -> dict:
+    return {
+        "id":        t.id,
+        "tipo":      t.tipo,
+        "destino":   t.destino,
+        "pedido_id": t.pedido_id,
+        "estado":    t.estado,
+        "intentos":  t.intentos,
+        "error":     t.error,
+        "fecha":     t.fecha.isoformat() if t.fecha else None,
+        "impreso":   t.impreso.isoformat() if t.impreso else None,
+    }
+
+
+def recientes(limite: int = 50) -> list[TrabajoImpresion]:
+    return db.session.execute(
+        select(TrabajoImpresion).order_by(TrabajoImpresion.id.desc()).limit(limite)
+    ).scalars().all()
+
+
+def reintentar(trabajo_id: int):
+    """Vuelve a poner en cola un trabajo en error (o impreso: reimpresión). No hace commit."""
+    trabajo = db.session.get(TrabajoImpresion, trabajo_id)
+    if trabajo is None or trabajo.estado == "imprimiendo":
+        return trabajo
+    trabajo.estado = "pendiente"
+    trabajo.intentos = 0
+    trabajo.error = None
+    trabajo.proximo_intento = datetime.utcnow()
+    db.session.info["impresion_nueva"] = True
+    return trabajo
@@ -1,47 +1,28 @@
 """
-ini_db.py  — seed completo para Render
-Render lo ejecuta con: python ini_db.py && gunicorn app:app
+ini_db.py  — esquema + seed completo, una vez por despliegue
+Render lo ejecuta con: flask --app app init-db && gunicorn app:app
+(equivale a: python ini_db.py && gunicorn app:app)
 """
-from app import app
+import os
+
 from extensions import db
-from models import User, Mesa, Producto
-from sqlalchemy import text
-
-# Debe coincidir EXACTAMENTE con CATEGORIAS en app.py
-CATEGORIAS = [
-    "especialidad",
-    "desayunos",
-    "almuerzos",
-    "porciones",
-    "bebidas calientes",
-    "bebidas frías",
-]
-
-with app.app_context():
-
-    # ─── MIGRACIONES MANUALES ────────────────────────────────────
-    migraciones = [
-        "ALTER TABLE producto ADD COLUMN IF NOT EXISTS categoria VARCHAR(30) NOT NULL DEFAULT 'almuerzos'",
-        "ALTER TABLE pedido   ADD COLUMN IF NOT EXISTS metodo_pago     VARCHAR(20)",
-        "ALTER TABLE pedido   ADD COLUMN IF NOT EXISTS monto_recibido  FLOAT",
-        "ALTER TABLE pedido   ADD COLUMN IF NOT EXISTS cambio          FLOAT",
-        "ALTER TABLE pedido   ADD COLUMN IF NOT EXISTS fecha_cierre    TIMESTAMP",
-        'ALTER TABLE "user"   ADD COLUMN IF NOT EXISTS activo          BOOLEAN DEFAULT TRUE',
-    ]
+from models import User, Mesa, Producto, VentaDia
+import caja
+import eventos
+import migraciones
+import versiones
+from catalogo import CATEGORIAS
 
-    for sql in migraciones:
-        try:
-            db.session.execute(text(sql))
-            print(f"✅ Migración: {sql[:65]}...")
-        except Exception as e:
-            print(f"⚠️  Omitida: {e}")
-
-    db.session.commit()
-    print("✅ Migraciones completas")
 
+def inicializar():
+    """Idempotente. Requiere contexto de aplicación."""
+    # ─── ESQUEMA ─────────────────────────────────────────────────
     db.create_all()
     print("✅ Tablas verificadas")
 
+    n = migraciones.aplicar()
+    print(f"✅ Migraciones: {n} aplicadas | versión {migraciones.version_actual()}")
+
     # ─── CORREGIR CATEGORÍAS MAL ASIGNADAS (DEFAULT 'almuerzos') ─
     # Productos que quedaron con categoria='almuerzos' por el DEFAULT
     # pero pertenecen a otra categoría.
@@ -85,7 +66,7 @@ with app.app_context():
     # ─── USUARIOS ────────────────────────────────────────────────
     if not User.query.filter_by(username="admin").first():
         admin = User(username="admin", role="admin", activo=True)
-        admin.set_password("admin123")
+        admin.set_password(os.getenv("ADMIN_PASSWORD", "admin123"))
         db.session.add(admin)
         print("✅ Admin creado")
     else:
@@ -93,7 +74,7 @@ with app.app_context():
 
     if not User.query.filter_by(username="mesero").first():
         mesero = User(username="mesero", role="mesero", activo=True)
-        mesero.set_password("mesero123")
+        mesero.set_password(os.getenv("MESERO_PASSWORD", "mesero123"))
         db.session.add(mesero)
         print("✅ Mesero creado")
     else:
@@ -168,6 +149,15 @@ with app.app_context():
     db.session.commit()
     print(f"✅ Productos: {productos_nuevos} nuevos | Total: {Producto.query.count()}")
 
+    # ─── RESUMEN DE CAJA (backfill la primera vez) ───────────────
+    if not VentaDia.query.first():
+        filas = caja.reconstruir()
+        print(f"✅ Resumen de caja reconstruido: {filas} filas")
+
+    # ─── CONTADORES DE VERSIÓN (ETag / caché del catálogo) ───────
+    versiones.asegurar()
+    eventos.asegurar()
+
     # ─── RESUMEN FINAL ───────────────────────────────────────────
     print("─" * 45)
     print(f"👤 Usuarios : {User.query.count()}")
@@ -176,4 +166,11 @@ with app.app_context():
     for cat in CATEGORIAS:
         count = Producto.query.filter_by(categoria=cat, activo=True).count()
         print(f"   {cat:22s}: {count} productos")
-    print("✅ DB lista + usuarios + mesas creadas OK")
\ No newline at end of file
+    print("✅ DB lista + usuarios + mesas creadas OK")
+
+
+if __name__ == "__main__":
+    from app import app
+
+    with app.app_context():
+        inicializar()
@@ -0,0 +1,181 @@
+"""
+metricas.py — métricas por ruta en formato Prometheus (/admin/metrics).
+
+Por cada endpoint de Flask: peticiones (por método y estado), histograma de
+latencia, sentencias SQL por petición, tiempo total en la BD y bytes de
+respuesta. Las sentencias y su tiempo salen de los eventos del engine de
+SQLAlchemy, contadas en el g de la petición en curso (el stream SSE corre
+fuera de la petición y no suma).
+
+Cada worker de gunicorn lleva sus propios contadores: las series llevan la
+etiqueta pid y en Prometheus se suman por endpoint.
+
+Si una petición pasa de METRICAS_MAX_CONSULTAS sentencias o de
+METRICAS_MAX_MS milisegundos se escribe una línea de log (así un N+1 en
+caja_dia se ve en el primer request).
+"""
+import os
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+MAX_CONSULTAS = int(os.getenv("METRICAS_MAX_CONSULTAS", "15"))
+MAX_MS        = float(os.getenv("METRICAS_MAX_MS", "500"))
+
+BUCKETS_LATENCIA  = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BUCKETS_CONSULTAS = (1, 2, 3, 5, 8, 13, 21, 34)
+
+
+class _Histograma:
+    __slots__ = ("limites", "cuentas", "suma", "n")
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.cuentas = [0] * len(limites)
+        self.suma = 0.0
+        self.n = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.cuentas[i] += 1
+                break
+        self.suma += valor
+        self.n += 1
+
+
+class _Ruta:
+    __slots__ = ("peticiones", "latencia", "consultas", "bd_segundos", "bytes")
+
+    def __init__(self):
+        self.peticiones = {}                 # (método, estado) -> n
+        self.latencia = _Histograma(BUCKETS_LATENCIA)
+        self.consultas = _Histograma(BUCKETS_CONSULTAS)
+        self.bd_segundos = 0.0
+        self.bytes = 0
+
+
+_rutas: dict[str, _Ruta] = {}
+_lock = threading.Lock()
+
+
+# ---------- SQL ----------
+# El inicio va en el contexto de ejecución de cada sentencia (no en una
+# pila por conexión): si una sentencia falla, after_cursor_execute no
+# corre y no queda nada colgado que descuadre las siguientes.
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    context._metricas_t0 = time.perf_counter()
+
+
+def _contar(context):
+    inicio = getattr(context, "_metricas_t0", None)
+    if inicio is not None and has_request_context() and "metricas_t0" in g:
+        g.metricas_consultas += 1
+        g.metricas_bd += time.perf_counter() - inicio
+
+
+def _despues_sql(conn, cursor, statement, parameters, context, executemany):
+    _contar(context)
+
+
+def _error_sql(contexto_error):
+    # Una sentencia que falla (p. ej. "database is locked" antes de un
+    # reintento) también ocupó la BD.
+    if contexto_error.execution_context is not None:
+        _contar(contexto_error.execution_context)
+
+
+# ---------- PETICIÓN ----------
+def _inicio():
+    g.metricas_t0 = time.perf_counter()
+    g.metricas_consultas = 0
+    g.metricas_bd = 0.0
+
+
+def _fin(resp):
+    if "metricas_t0" not in g:
+        return resp
+    duracion = time.perf_counter() - g.metricas_t0
+    endpoint = request.endpoint or "desconocido"
+    tamano = 0 if resp.is_streamed else (resp.content_length or 0)
+
+    with _lock:
+        ruta = _rutas.get(endpoint)
+        if ruta is None:
+            ruta = _rutas[endpoint] = _Ruta()
+        clave = (request.method, resp.status_code)
+        ruta.peticiones[clave] = ruta.peticiones.get(clave, 0) + 1
+        ruta.latencia.observar(duracion)
+        ruta.consultas.observar(g.metricas_consultas)
+        ruta.bd_segundos += g.metricas_bd
+        ruta.bytes += tamano
+
+    ms = duracion * 1000
+    if g.metricas_consultas > MAX_CONSULTAS or ms > MAX_MS:
+        current_app.logger.warning(
+            "presupuesto excedido: %s %s (%s) → %d consultas, %.0f ms (%.0f ms en BD)",
+            request.method, request.path, endpoint, g.metricas_consultas, ms, g.metricas_bd * 1000,
+        )
+    return resp
+
+
+def instalar(app, engine):
+    app.before_request(_inicio)
+    app.after_request(_fin)
+    event.listen(engine, "before_cursor_execute", _antes_sql)
+    event.listen(engine, "after_cursor_execute", _despues_sql)
+    event.listen(engine, "handle_error", _error_sql)
+
+
+# ---------- EXPOSICIÓN ----------
+def _etiquetas(**kw):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in kw.items()) + "}"
+
+
+def _histograma(lineas, nombre, pid, endpoint, h):
+    acumulado = 0
+    for limite, n in zip(h.limites, h.cuentas):
+        acumulado += n
+        lineas.append(f"{nombre}_bucket{_etiquetas(pid=pid, endpoint=endpoint, le=limite)} {acumulado}")
+    lineas.append(f"{nombre}_bucket{_etiquetas(pid=pid, endpoint=endpoint, le='+Inf')} {h.n}")
+    lineas.append(f"{nombre}_sum{_etiquetas(pid=pid, endpoint=endpoint)} {h.suma}")
+    lineas.append(f"{nombre}_count{_etiquetas(pid=pid, endpoint=endpoint)} {h.n}")
+
+
+def texto_prometheus() -> str:
+    # Con preload_app el módulo se importa en el master: el pid se lee aquí.
+    pid = os.getpid()
+    lineas = []
+    with _lock:
+        rutas = sorted(_rutas.items())
+
+        lineas += ["# HELP pos_http_requests_total Peticiones atendidas.",
+                   "# TYPE pos_http_requests_total counter"]
+        for endpoint, r in rutas:
+            for (metodo, estado), n in sorted(r.peticiones.items()):
+                et = _etiquetas(pid=pid, endpoint=endpoint, method=metodo, status=estado)
+                lineas.append(f"pos_http_requests_total{et} {n}")
+
+        lineas += ["# HELP pos_http_request_duration_seconds Latencia de la petición.",
+                   "# TYPE pos_http_request_duration_seconds histogram"]
+        for endpoint, r in rutas:
+            _histograma(lineas, "pos_http_request_duration_seconds", pid, endpoint, r.latencia)
+
+        lineas += ["# HELP pos_sql_statements_per_request Sentencias SQL por petición.",
+                   "# TYPE pos_sql_statements_per_request histogram"]
+        for endpoint, r in rutas:
+            _histograma(lineas, "pos_sql_statements_per_request", pid, endpoint, r.consultas)
+
+        lineas += ["# HELP pos_sql_duration_seconds_total Tiempo en la BD.",
+                   "# TYPE pos_sql_duration_seconds_total counter"]
+        for endpoint, r in rutas:
+            lineas.append(f"pos_sql_duration_seconds_total{_etiquetas(pid=pid, endpoint=endpoint)} {r.bd_segundos}")
+
+        lineas += ["# HELP pos_http_response_bytes_total Bytes de respuesta (sin streams).",
+                   "# TYPE pos_http_response_bytes_total counter"]
+        for endpoint, r in rutas:
+            lineas.append(f"pos_http_response_bytes_total{_etiquetas(pid=pid, endpoint=endpoint)} {r.bytes}")
+
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,449 @@
+"""
+migraciones.py — migraciones de esquema versionadas (SQLite y PostgreSQL).
+
+Cada migración tiene un número; las aplicadas quedan en la tabla
+schema_version. db.create_all() crea las tablas nuevas con el esquema
+actual, y aquí se llevan las BD existentes al mismo punto. Por eso cada
+migración es idempotente (revisa columnas / usa IF NOT EXISTS).
+
+Uso:
+    python migraciones.py              # aplica las pendientes
+    python migraciones.py --estado     # versión actual y pendientes
+    python migraciones.py --explain    # revisa que las consultas calientes usen índices
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, ForeignKey, Integer, MetaData, String, Table,
+    func, inspect, select, text, true, tuple_,
+)
+from sqlalchemy.schema import CreateTable
+
+from extensions import db
+from models import SchemaVersion, Producto, Pedido, PedidoDetalle
+
+
+# ---------- HELPERS ----------
+def _columnas(conn, tabla):
+    return {c["name"] for c in inspect(conn).get_columns(tabla)}
+
+
+def _agregar_columna(conn, tabla, columna, tipo_sqlite, tipo_pg):
+    if columna in _columnas(conn, tabla):
+        return
+    tipo = tipo_pg if conn.dialect.name == "postgresql" else tipo_sqlite
+    conn.execute(text(f'ALTER TABLE "{tabla}" ADD COLUMN {columna} {tipo}'))
+    print(f"  ➕ {tabla}.{columna}")
+
+
+def _crear_indice(conn, nombre, tabla, columnas, unico=False, donde=None):
+    unique = "UNIQUE " if unico else ""
+    where = f" WHERE {donde}" if donde else ""
+    conn.execute(text(
+        f'CREATE {unique}INDEX IF NOT EXISTS {nombre} ON "{tabla}" ({", ".join(columnas)}){where}'
+    ))
+
+
+def _es_entero(conn, tabla, columna) -> bool:
+    for c in inspect(conn).get_columns(tabla):
+        if c["name"] == columna:
+            return isinstance(c["type"], Integer)
+    return True
+
+
+def _reconstruir_tabla_sqlite(conn, nombre, esquema, redondear):
+    """
+    SQLite no cambia el tipo de una columna: se crea la tabla nueva con el
+    esquema CONGELADO de la migración (esquema(temporal) devuelve la Table;
+    nunca las columnas vivas de models.py, que siguen cambiando), se copian
+    los datos redondeando las columnas indicadas, se borra la vieja, se
+    renombra la nueva y se rehacen sus índices. Corre dentro de la
+    transacción de la migración.
+    """
+    temporal = f"_nuevo_{nombre}"
+    nueva, indices = esquema(temporal)
+
+    origen, valores = [], {}
+    for c in nueva.columns:
+        expr = f'"{c.name}"'
+        if c.name in redondear:
+            expr = f"CAST(ROUND({expr}) AS INTEGER)"
+        # Filas viejas pueden traer NULL donde el esquema ya exige valor.
+        if not c.nullable and c.default is not None and c.default.is_scalar:
+            expr = f"COALESCE({expr}, :d_{c.name})"
+            valores[f"d_{c.name}"] = c.default.arg
+        origen.append(expr)
+
+    conn.execute(text(f'DROP TABLE IF EXISTS "{temporal}"'))
+    conn.execute(CreateTable(nueva))
+    destino = ", ".join(f'"{c.name}"' for c in nueva.columns)
+    conn.execute(text(
+        f'INSERT INTO "{temporal}" ({destino}) SELECT {", ".join(origen)} FROM "{nombre}"'
+    ), valores)
+    conn.execute(text(f'DROP TABLE "{nombre}"'))
+    conn.execute(text(f'ALTER TABLE "{temporal}" RENAME TO "{nombre}"'))
+    for indice, columnas, unico in indices:
+        _crear_indice(conn, indice, nombre, columnas, unico=unico)
+    print(f"  🔁 {nombre} ({', '.join(redondear)} → INTEGER)")
+
+
+# ---------- ESQUEMAS CONGELADOS ----------
+# Una migración que reconstruye tablas lleva su propia copia del esquema tal
+# como era en ese punto. Si usara models.py, una columna agregada después
+# (con su propia migración) rompería la reconstrucción de una BD vieja.
+def _esquema_004(tabla):
+    """
+    Tablas con dinero tal como quedan al terminar la migración 004 (las de
+    001-003 más el dinero en INTEGER). Devuelve esquema(temporal) ->
+    (Table, [(índice, columnas, único)]) para _reconstruir_tabla_sqlite.
+    """
+    def columnas():
+        if tabla == "producto":
+            return [
+                Column("id", Integer, primary_key=True),
+                Column("nombre", String(100), nullable=False),
+                Column("precio", Integer, nullable=False),
+                Column("activo", Boolean, default=True),
+                Column("categoria", String(30), nullable=False, default="almuerzos"),
+            ], [("ix_producto_activo_categoria_nombre", ["activo", "categoria", "nombre"], False)]
+        if tabla == "pedido":
+            return [
+                Column("id", Integer, primary_key=True),
+                Column("mesa_id", Integer, ForeignKey("mesa.id"), nullable=False),
+                Column("mesero_id", Integer, ForeignKey("user.id"), nullable=False),
+                Column("estado", String(20), default="abierto"),
+                Column("fecha", DateTime),
+                Column("metodo_pago", String(20), nullable=True),
+                Column("monto_recibido", Integer, nullable=True),
+                Column("cambio", Integer, nullable=True),
+                Column("fecha_cierre", DateTime, nullable=True),
+                Column("total", Integer, nullable=False, default=0),
+                Column("items", Integer, nullable=False, default=0),
+            ], [("ix_pedido_estado_fecha_cierre", ["estado", "fecha_cierre"], False),
+                ("ix_pedido_mesa_estado", ["mesa_id", "estado"], False)]
+        if tabla == "pedido_detalle":
+            return [
+                Column("id", Integer, primary_key=True),
+                Column("pedido_id", Integer, ForeignKey("pedido.id"), nullable=False),
+                Column("producto_id", Integer, ForeignKey("producto.id"), nullable=False),
+                Column("cantidad", Integer, default=1),
+                Column("precio_unitario", Integer, nullable=False, default=0),
+            ], [("uq_pedido_detalle_pedido_producto", ["pedido_id", "producto_id"], True),
+                ("ix_pedido_detalle_producto", ["producto_id"], False)]
+        if tabla == "venta_dia":
+            return [
+                Column("dia", Date, primary_key=True),
+                Column("metodo_pago", String(20), primary_key=True),
+                Column("producto_id", Integer, primary_key=True, autoincrement=False),
+                Column("nombre", String(100), nullable=False),
+                Column("cantidad", Integer, nullable=False, default=0),
+                Column("ventas", Integer, nullable=False, default=0),
+            ], []
+        raise ValueError(tabla)
+
+    def esquema(temporal):
+        md = MetaData()
+        # Solo la PK de las tablas referidas, para que las FK resuelvan.
+        for referida in ("user", "mesa", "producto", "pedido"):
+            Table(referida, md, Column("id", Integer, primary_key=True))
+        cols, indices = columnas()
+        return Table(temporal, md, *cols), indices
+
+    return esquema
+
+
+# ---------- MIGRACIONES ----------
+def _m001_columnas_historicas(conn):
+    """Lo que antes hacían ini_db.py, migrar_pago.py y migrar_user_activo.py."""
+    _agregar_columna(conn, "producto", "categoria",
+                     "VARCHAR(30) NOT NULL DEFAULT 'almuerzos'",
+                     "VARCHAR(30) NOT NULL DEFAULT 'almuerzos'")
+    _agregar_columna(conn, "pedido", "metodo_pago", "VARCHAR(20)", "VARCHAR(20)")
+    _agregar_columna(conn, "pedido", "monto_recibido", "FLOAT", "FLOAT")
+    _agregar_columna(conn, "pedido", "cambio", "FLOAT", "FLOAT")
+    _agregar_columna(conn, "pedido", "fecha_cierre", "DATETIME", "TIMESTAMP")
+    _agregar_columna(conn, "user", "activo", "BOOLEAN DEFAULT 1", "BOOLEAN DEFAULT TRUE")
+    conn.execute(text('UPDATE "user" SET activo = :v WHERE activo IS NULL'), {"v": True})
+
+
+def _m002_indices_consultas_calientes(conn):
+    # Antes del índice único: fusionar líneas repetidas del mismo producto.
+    conn.execute(text("""
+        UPDATE pedido_detalle
+        SET cantidad = (
+            SELECT SUM(d2.cantidad) FROM pedido_detalle d2
+            WHERE d2.pedido_id = pedido_detalle.pedido_id
+              AND d2.producto_id = pedido_detalle.producto_id
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM pedido_detalle
+            GROUP BY pedido_id, producto_id HAVING COUNT(*) > 1
+        )
+    """))
+    conn.execute(text("""
+        DELETE FROM pedido_detalle
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM pedido_detalle GROUP BY pedido_id, producto_id
+        )
+    """))
+
+    _crear_indice(conn, "ix_pedido_estado_fecha_cierre", "pedido", ["estado", "fecha_cierre"])
+    _crear_indice(conn, "ix_pedido_mesa_estado", "pedido", ["mesa_id", "estado"])
+    _crear_indice(conn, "uq_pedido_detalle_pedido_producto", "pedido_detalle",
+                  ["pedido_id", "producto_id"], unico=True)
+    _crear_indice(conn, "ix_pedido_detalle_producto", "pedido_detalle", ["producto_id"])
+    _crear_indice(conn, "ix_producto_activo_categoria_nombre", "producto",
+                  ["activo", "categoria", "nombre"])
+
+
+def _m003_totales_y_precio_unitario(conn):
+    _agregar_columna(conn, "pedido_detalle", "precio_unitario",
+                     "FLOAT NOT NULL DEFAULT 0", "FLOAT NOT NULL DEFAULT 0")
+    _agregar_columna(conn, "pedido", "total", "FLOAT NOT NULL DEFAULT 0", "FLOAT NOT NULL DEFAULT 0")
+    _agregar_columna(conn, "pedido", "items", "INTEGER NOT NULL DEFAULT 0", "INTEGER NOT NULL DEFAULT 0")
+
+    # Para lo ya existente, el mejor dato disponible es el precio actual.
+    conn.execute(text("""
+        UPDATE pedido_detalle
+        SET precio_unitario = (
+            SELECT producto.precio FROM producto WHERE producto.id = pedido_detalle.producto_id
+        )
+        WHERE precio_unitario = 0
+    """))
+    conn.execute(text("""
+        UPDATE pedido
+        SET total = COALESCE((
+                SELECT SUM(d.cantidad * d.precio_unitario) FROM pedido_detalle d
+                WHERE d.pedido_id = pedido.id
+            ), 0),
+            items = COALESCE((
+                SELECT SUM(d.cantidad) FROM pedido_detalle d
+                WHERE d.pedido_id = pedido.id
+            ), 0)
+    """))
+
+
+_DINERO = {
+    "producto":       ["precio"],
+    "pedido":         ["monto_recibido", "cambio", "total"],
+    "pedido_detalle": ["precio_unitario"],
+    "venta_dia":      ["ventas"],
+}
+
+
+def _m004_dinero_en_pesos_enteros(conn):
+    """Columnas de dinero de FLOAT a INTEGER (pesos), redondeando lo guardado."""
+    if conn.dialect.name == "postgresql":
+        for tabla, columnas in _DINERO.items():
+            for col in columnas:
+                if not _es_entero(conn, tabla, col):
+                    conn.execute(text(
+                        f'ALTER TABLE "{tabla}" ALTER COLUMN {col} '
+                        f'TYPE INTEGER USING ROUND({col})::integer'
+                    ))
+        return
+
+    # pysqlite no abre transacción antes de un DDL: se abre aquí para que la
+    # reconstrucción de las cuatro tablas sea todo o nada.
+    if not conn.connection.dbapi_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN")
+    for tabla, columnas in _DINERO.items():
+        pendientes = [c for c in columnas if not _es_entero(conn, tabla, c)]
+        if pendientes:
+            _reconstruir_tabla_sqlite(conn, tabla, _esquema_004(tabla), pendientes)
+
+
+def _m005_historial_keyset(conn):
+    # Los cancelados no tenían fecha_cierre y quedarían fuera del historial.
+    conn.execute(text(
+        "UPDATE pedido SET fecha_cierre = fecha WHERE estado = 'cancelado' AND fecha_cierre IS NULL"
+    ))
+    if conn.dialect.name == "sqlite":
+        # SQLite compara fechas como texto; el cursor siempre lleva
+        # microsegundos, así que las filas guardadas sin ellos se igualan.
+        conn.execute(text(
+            "UPDATE pedido SET fecha_cierre = fecha_cierre || '.000000' "
+            "WHERE length(fecha_cierre) = 19"
+        ))
+    _crear_indice(conn, "ix_pedido_cierre_id", "pedido", ["fecha_cierre", "id"])
+
+
+def _m006_version_pedido(conn):
+    _agregar_columna(conn, "pedido", "version",
+                     "INTEGER NOT NULL DEFAULT 0", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _m007_un_pedido_abierto_por_mesa(conn):
+    # Antes del índice: si una mesa quedó con varios pedidos abiertos, las
+    # líneas de los viejos pasan al más reciente y los viejos se cancelan.
+    duplicados = conn.execute(text("""
+        SELECT mesa_id, MAX(id) FROM pedido WHERE estado = 'abierto'
+        GROUP BY mesa_id HAVING COUNT(*) > 1
+    """)).all()
+    for mesa_id, conservar in duplicados:
+        viejos = conn.execute(text(
+            "SELECT id FROM pedido WHERE estado = 'abierto' AND mesa_id = :m AND id <> :c"
+        ), {"m": mesa_id, "c": conservar}).scalars().all()
+        for viejo in viejos:
+            p = {"v": viejo, "c": conservar}
+            conn.execute(text("""
+                UPDATE pedido_detalle
+                SET cantidad = cantidad + (
+                    SELECT d.cantidad FROM pedido_detalle d
+                    WHERE d.pedido_id = :v AND d.producto_id = pedido_detalle.producto_id
+                )
+                WHERE pedido_id = :c
+                  AND producto_id IN (SELECT producto_id FROM pedido_detalle WHERE pedido_id = :v)
+            """), p)
+            conn.execute(text("""
+                DELETE FROM pedido_detalle
+                WHERE pedido_id = :v
+                  AND producto_id IN (SELECT producto_id FROM pedido_detalle WHERE pedido_id = :c)
+            """), p)
+            conn.execute(text("UPDATE pedido_detalle SET pedido_id = :c WHERE pedido_id = :v"), p)
+            conn.execute(text("""
+                UPDATE pedido SET estado = 'cancelado', fecha_cierre = fecha, total = 0, items = 0
+                WHERE id = :v
+            """), p)
+        conn.execute(text("""
+            UPDATE pedido
+            SET total = COALESCE((SELECT SUM(d.cantidad * d.precio_unitario)
+                                  FROM pedido_detalle d WHERE d.pedido_id = pedido.id), 0),
+                items = COALESCE((SELECT SUM(d.cantidad)
+                                  FROM pedido_detalle d WHERE d.pedido_id = pedido.id), 0)
+            WHERE id = :c
+        """), {"c": conservar})
+        print(f"  🔀 mesa {mesa_id}: pedidos {sorted(viejos)} fusionados en #{conservar}")
+
+    _crear_indice(conn, "uq_pedido_abierto_por_mesa", "pedido", ["mesa_id"],
+                  unico=True, donde="estado = 'abierto'")
+
+
+MIGRACIONES = [
+    (1, "Columnas históricas (categoría, pago, fecha_cierre, activo)", _m001_columnas_historicas),
+    (2, "Índices compuestos para las consultas calientes", _m002_indices_consultas_calientes),
+    (3, "Precio unitario en la línea y total/items en el pedido", _m003_totales_y_precio_unitario),
+    (4, "Dinero en pesos enteros (INTEGER)", _m004_dinero_en_pesos_enteros),
+    (5, "Historial por keyset: fecha_cierre en cancelados e índice (fecha_cierre, id)", _m005_historial_keyset),
+    (6, "Versión por pedido (ETag de la comanda)", _m006_version_pedido),
+    (7, "Un solo pedido abierto por mesa (índice único parcial)", _m007_un_pedido_abierto_por_mesa),
+]
+
+
+# ---------- RUNNER ----------
+def version_actual() -> int:
+    SchemaVersion.__table__.create(db.engine, checkfirst=True)
+    return db.session.execute(
+        select(func.max(SchemaVersion.version))
+    ).scalar() or 0
+
+
+def pendientes():
+    actual = version_actual()
+    return [m for m in MIGRACIONES if m[0] > actual]
+
+
+def aplicar(hasta: int = None) -> int:
+    """
+    Aplica en orden las migraciones pendientes (hasta la versión `hasta`,
+    si se da). Devuelve cuántas aplicó.
+    """
+    aplicadas = 0
+    for version, descripcion, fn in pendientes():
+        if hasta is not None and version > hasta:
+            break
+        print(f"🔧 Migración {version:03d}: {descripcion}")
+        # Una transacción por migración: o queda completa o no queda.
+        with db.engine.begin() as conn:
+            fn(conn)
+            conn.execute(
+                SchemaVersion.__table__.insert().values(
+                    version=version, descripcion=descripcion, aplicada=datetime.utcnow()
+                )
+            )
+        aplicadas += 1
+    db.session.commit()
+    return aplicadas
+
+
+# ---------- VERIFICACIÓN CON EXPLAIN ----------
+def _consultas_calientes():
+    """(ruta, consulta, índice esperado) — mismas condiciones que usan las vistas."""
+    ahora = datetime.utcnow()
+    return [
+        ("menu_mesa: pedido abierto de la mesa",
+         select(Pedido.id).where(Pedido.mesa_id == 1, Pedido.estado == "abierto"),
+         "ix_pedido_mesa_estado"),
+        ("menu_mesa: catálogo activo",
+         select(Producto.id, Producto.nombre)
+         .where(Producto.activo == true())
+         .order_by(Producto.categoria.asc(), Producto.nombre.asc()),
+         "ix_producto_activo_categoria_nombre"),
+        ("menu_mesa: línea del producto en el pedido",
+         select(PedidoDetalle.id).where(PedidoDetalle.pedido_id == 1, PedidoDetalle.producto_id == 1),
+         "uq_pedido_detalle_pedido_producto"),
+        ("caja_dia: pedidos cobrados del día",
+         select(Pedido.id).where(
+             Pedido.estado == "cerrado",
+             Pedido.fecha_cierre >= ahora - timedelta(days=1),
+             Pedido.fecha_cierre <= ahora,
+         ),
+         "ix_pedido_estado_fecha_cierre"),
+        ("admin_historial: página siguiente",
+         select(Pedido.id).where(
+             Pedido.estado != "abierto",
+             Pedido.fecha_cierre.isnot(None),
+             tuple_(Pedido.fecha_cierre, Pedido.id) < tuple_(ahora, 1),
+         ).order_by(Pedido.fecha_cierre.desc(), Pedido.id.desc()).limit(50),
+         "ix_pedido_cierre_id"),
+        ("admin_pedidos_json: pedidos abiertos",
+         select(Pedido.id).where(Pedido.estado == "abierto"),
+         "ix_pedido_estado_fecha_cierre"),
+    ]
+
+
+def verificar_planes() -> bool:
+    """Corre EXPLAIN sobre cada consulta caliente y revisa el índice usado."""
+    ok = True
+    with db.engine.connect() as conn:
+        pg = conn.dialect.name == "postgresql"
+        if pg:
+            # Con tablas pequeñas el planner prefiere seq scan; lo que interesa
+            # aquí es que el índice sea utilizable.
+            conn.execute(text("SET enable_seqscan = off"))
+        for nombre, consulta, indice in _consultas_calientes():
+            sql = str(consulta.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+            prefijo = "EXPLAIN " if pg else "EXPLAIN QUERY PLAN "
+            plan = "\n".join(str(f[-1]) for f in conn.exec_driver_sql(prefijo + sql))
+            usa = indice in plan
+            ok = ok and usa
+            print(f"{'✅' if usa else '❌'} {nombre} → {indice}")
+            if not usa:
+                print("   " + plan.replace("\n", "\n   "))
+        conn.rollback()
+    return ok
+
+
+def main():
+    from app import app
+
+    parser = argparse.ArgumentParser(description="Migraciones de esquema.")
+    parser.add_argument("--estado", action="store_true", help="muestra versión y pendientes")
+    parser.add_argument("--explain", action="store_true", help="verifica índices con EXPLAIN")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.estado:
+            print(f"Versión actual: {version_actual()}")
+            for version, descripcion, _ in pendientes():
+                print(f"  pendiente {version:03d}: {descripcion}")
+        elif args.explain:
+            raise SystemExit(0 if verificar_planes() else 1)
+        else:
+            n = aplicar()
+            print(f"✅ Esquema en versión {version_actual()} ({n} migraciones aplicadas)")
+
+
+if __name__ == "__main__":
+    main()
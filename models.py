@@ -28,9 +28,13 @@ class Mesa(db.Model):
 
 
 class Producto(db.Model):
+    __table_args__ = (
+        db.Index("ix_producto_activo_categoria_nombre", "activo", "categoria", "nombre"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
-    precio = db.Column(db.Float, nullable=False)
+    precio = db.Column(db.Integer, nullable=False)          # pesos
     activo = db.Column(db.Boolean, default=True)
     categoria = db.Column(db.String(30), nullable=False, default="almuerzos")
 
@@ -39,6 +43,17 @@ class Producto(db.Model):
 
 
 class Pedido(db.Model):
+    __table_args__ = (
+        db.Index("ix_pedido_estado_fecha_cierre", "estado", "fecha_cierre"),
+        db.Index("ix_pedido_mesa_estado", "mesa_id", "estado"),
+        # Historial paginado por (fecha_cierre, id) sin filtrar estado.
+        db.Index("ix_pedido_cierre_id", "fecha_cierre", "id"),
+        # Un solo pedido abierto por mesa, aunque dos envíos lleguen a la vez.
+        db.Index("uq_pedido_abierto_por_mesa", "mesa_id", unique=True,
+                 sqlite_where=db.text("estado = 'abierto'"),
+                 postgresql_where=db.text("estado = 'abierto'")),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     mesa_id = db.Column(db.Integer, db.ForeignKey("mesa.id"), nullable=False)
     mesero_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -48,20 +63,104 @@ class Pedido(db.Model):
     # ✅ SIEMPRE guardar en UTC para que to_bogota() convierta correctamente
     fecha = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Dinero en pesos enteros (COP no usa centavos): sumas exactas.
     metodo_pago = db.Column(db.String(20), nullable=True)
-    monto_recibido = db.Column(db.Float, nullable=True)
-    cambio = db.Column(db.Float, nullable=True)
+    monto_recibido = db.Column(db.Integer, nullable=True)
+    cambio = db.Column(db.Integer, nullable=True)
     fecha_cierre = db.Column(db.DateTime, nullable=True)
 
+    # Acumulados de las líneas; se actualizan en la misma transacción que
+    # cada cambio de línea (ver pedidos.py). Evitan recalcular con JOINs.
+    total = db.Column(db.Integer, nullable=False, default=0)
+    items = db.Column(db.Integer, nullable=False, default=0)
+
+    # Sube con cada cambio del pedido (versiones.subir_pedido); es el ETag
+    # de su comanda.
+    version = db.Column(db.Integer, nullable=False, default=0)
+
     mesa = db.relationship("Mesa")
     mesero = db.relationship("User")
 
 
 class PedidoDetalle(db.Model):
+    __table_args__ = (
+        # Una sola línea por producto dentro de un pedido (permite el upsert).
+        db.Index("uq_pedido_detalle_pedido_producto", "pedido_id", "producto_id", unique=True),
+        db.Index("ix_pedido_detalle_producto", "producto_id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     pedido_id = db.Column(db.Integer, db.ForeignKey("pedido.id"), nullable=False)
     producto_id = db.Column(db.Integer, db.ForeignKey("producto.id"), nullable=False)
     cantidad = db.Column(db.Integer, default=1)
+    # Precio del producto al momento de pedirlo: editar el precio después
+    # no cambia pedidos ni facturas ya hechos.
+    precio_unitario = db.Column(db.Integer, nullable=False, default=0)
 
     pedido = db.relationship("Pedido", backref="detalles")
-    producto = db.relationship("Producto")
\ No newline at end of file
+    producto = db.relationship("Producto")
+
+class SchemaVersion(db.Model):
+    # Migraciones aplicadas (ver migraciones.py).
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    descripcion = db.Column(db.String(200), nullable=False)
+    aplicada = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class VersionCambio(db.Model):
+    # Contador monotónico por tema ("mesas", "pedidos"...). Se sube en la misma
+    # transacción que la escritura; los endpoints de polling lo usan como ETag.
+    clave = db.Column(db.String(30), primary_key=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Evento(db.Model):
+    # Bitácora de cambios para el stream /events. El id es el Last-Event-ID.
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)    # "mesa" | "pedido"
+    datos = db.Column(db.Text, nullable=False)         # JSON
+    fecha = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class VentaDia(db.Model):
+    # Acumulado de ventas por día de negocio (Bogotá), método de pago y
+    # producto. Lo mantienen cobrar/cerrar pedido; se reconstruye con
+    # reconstruir_caja.py. /admin/caja lee de aquí.
+    dia = db.Column(db.Date, primary_key=True)
+    metodo_pago = db.Column(db.String(20), primary_key=True)
+    producto_id = db.Column(db.Integer, primary_key=True)
+    nombre = db.Column(db.String(100), nullable=False)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    ventas = db.Column(db.Integer, nullable=False, default=0)
+
+
+class MutacionAplicada(db.Model):
+    # Mutaciones de la cola offline del mesero ya aplicadas por /sync. El id
+    # lo genera el navegador; un lote reenviado no se aplica dos veces.
+    __table_args__ = (
+        db.Index("ix_mutacion_aplicada_fecha", "fecha"),
+    )
+    id = db.Column(db.String(40), primary_key=True)
+    mesero_id = db.Column(db.Integer, nullable=False)
+    fecha = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class TrabajoImpresion(db.Model):
+    # Cola de impresión (ver impresion.py): facturas al cobrar y comandas de
+    # cocina al enviar. El ticket se guarda ya armado en datos (JSON) al
+    # encolar; el hilo impresor lo convierte a bytes y lo manda.
+    __table_args__ = (
+        db.Index("ix_trabajo_impresion_estado_proximo", "estado", "proximo_intento"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)        # "factura" | "cocina"
+    destino = db.Column(db.String(30), nullable=False)     # impresora (IMPRESORAS)
+    pedido_id = db.Column(db.Integer, nullable=True)
+    datos = db.Column(db.Text, nullable=False)             # JSON
+    estado = db.Column(db.String(20), nullable=False, default="pendiente")
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(200), nullable=True)
+    fecha = db.Column(db.DateTime, default=datetime.utcnow)
+    proximo_intento = db.Column(db.DateTime, default=datetime.utcnow)
+    reclamado = db.Column(db.DateTime, nullable=True)
+    impreso = db.Column(db.DateTime, nullable=True)
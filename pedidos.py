@@ -0,0 +1,230 @@
+"""
+pedidos.py — escrituras sobre pedidos abiertos.
+
+Contraparte de consultas.py (lectura). Las funciones no hacen commit: la
+ruta confirma todo junto con la versión/evento correspondiente.
+
+Cada línea guarda su precio_unitario al momento de pedirse y el pedido lleva
+total/items acumulados; aquí se mantienen de forma incremental. Usa
+RETURNING (PostgreSQL, SQLite >= 3.35).
+"""
+from datetime import datetime
+
+from sqlalchemy import delete, select, update
+
+from extensions import db
+from models import Mesa, Pedido, PedidoDetalle
+from db_utils import bloquear, insert_upsert
+
+
+def ajustar_totales(pedido_id: int, items: int, importe: int) -> tuple[int, int]:
+    """Suma (o resta) a items/total del pedido. Devuelve (items, total) resultantes."""
+    return tuple(db.session.execute(
+        update(Pedido)
+        .where(Pedido.id == pedido_id)
+        .values(total=Pedido.total + importe, items=Pedido.items + items)
+        .returning(Pedido.items, Pedido.total)
+        .execution_options(synchronize_session=False)
+    ).one())
+
+
+def agregar_lineas(pedido_id: int, items: dict[int, int], carta):
+    """
+    Suma cantidades {producto_id: cantidad} al pedido en UNA sentencia:
+    INSERT ... ON CONFLICT (pedido_id, producto_id)
+    DO UPDATE SET cantidad = cantidad + excluded.cantidad.
+    Las líneas nuevas toman el precio del catálogo; las existentes conservan
+    el suyo, y con ese precio se suma al total del pedido.
+    """
+    if not items:
+        return
+    stmt = insert_upsert(PedidoDetalle).values([
+        {
+            "pedido_id": pedido_id,
+            "producto_id": producto_id,
+            "cantidad": cantidad,
+            "precio_unitario": carta.por_id[producto_id].precio,
+        }
+        for producto_id, cantidad in items.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PedidoDetalle.pedido_id, PedidoDetalle.producto_id],
+        set_={"cantidad": PedidoDetalle.cantidad + stmt.excluded.cantidad},
+    ).returning(PedidoDetalle.producto_id, PedidoDetalle.precio_unitario)
+
+    importe = 0
+    for producto_id, precio in db.session.execute(stmt):
+        importe += items[producto_id] * int(precio)
+    ajustar_totales(pedido_id, sum(items.values()), importe)
+
+
+def enviar(mesa_id: int, mesero_id: int, items: dict[int, int], carta) -> tuple[int, bool]:
+    """
+    Suma items al pedido abierto de la mesa, o lo crea. Devuelve
+    (pedido_id, creado). No hace commit; va dentro de db_utils.reintentar.
+
+    La mesa queda bloqueada desde antes de buscar su pedido hasta el
+    commit: dos envíos a la misma mesa se ordenan y el segundo ve el pedido
+    del primero; mesas distintas no se esperan (en PostgreSQL). Si aun así
+    se cruzan, uq_pedido_abierto_por_mesa rechaza el segundo pedido.
+    """
+    bloquear(Mesa, mesa_id)
+    pedido_id = db.session.execute(
+        select(Pedido.id).where(Pedido.mesa_id == mesa_id, Pedido.estado == "abierto")
+    ).scalar()
+    creado = pedido_id is None
+    if creado:
+        pedido = Pedido(mesa_id=mesa_id, mesero_id=mesero_id, estado="abierto")
+        db.session.add(pedido)
+        db.session.flush()
+        pedido_id = pedido.id
+    agregar_lineas(pedido_id, items, carta)
+    return pedido_id, creado
+
+
+# Acciones de los botones de línea (formulario y cola offline) como delta
+# para ajustar_lineas(); None = eliminar la línea.
+ACCIONES = {"sumar": 1, "restar": -1, "eliminar": None}
+
+
+def editar_linea(pedido_id: int, detalle_id: int, accion: str):
+    """
+    accion: "sumar" | "restar" | "eliminar" sobre una línea; restar la
+    última unidad la elimina. Devuelve los items que le quedan al pedido,
+    o None si la línea no es de ese pedido (o ya no existe).
+    """
+    cantidades, items, _ = ajustar_lineas(pedido_id, {detalle_id: ACCIONES[accion]})
+    return items if cantidades else None
+
+
+def leer_cambios(lista) -> dict:
+    """
+    [{"detalle_id": 5, "delta": -1}, {"detalle_id": 7, "eliminar": true}]
+    -> {5: -1, 7: None}, sumando los repetidos (None = eliminar gana).
+    ValueError si algún cambio no sirve.
+    """
+    if not isinstance(lista, list):
+        raise ValueError("cambios inválidos")
+    cambios = {}
+    for c in lista:
+        try:
+            detalle_id = int(c["detalle_id"])
+            delta = None if c.get("eliminar") else int(c.get("delta", 0))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError("cambio inválido")
+        if delta is None or cambios.get(detalle_id, 0) is None:
+            cambios[detalle_id] = None
+        elif delta:
+            cambios[detalle_id] = cambios.get(detalle_id, 0) + delta
+    return cambios
+
+
+def estado_lineas(pedido_id: int, detalle_ids) -> tuple[str, dict[int, int], int, int]:
+    """
+    (estado, {detalle_id: cantidad (0 = ya no está)}, items, total) tal
+    como están ahora: la respuesta a un cambio que ya se había aplicado.
+    """
+    ids = list(detalle_ids)
+    actuales = dict(db.session.execute(
+        select(PedidoDetalle.id, PedidoDetalle.cantidad)
+        .where(PedidoDetalle.pedido_id == pedido_id, PedidoDetalle.id.in_(ids))
+    ).all())
+    fila = db.session.execute(
+        select(Pedido.estado, Pedido.items, Pedido.total).where(Pedido.id == pedido_id)
+    ).one()
+    return fila.estado, {i: int(actuales.get(i, 0)) for i in ids}, int(fila.items), int(fila.total)
+
+
+def ajustar_lineas(pedido_id: int, cambios: dict) -> tuple[dict[int, int], int, int]:
+    """
+    Aplica {detalle_id: delta} a las líneas del pedido (delta None =
+    eliminar la línea). Cada línea es un UPDATE ... RETURNING relativo, y
+    los totales del pedido se ajustan una sola vez al final. La que llega
+    a 0 se borra. Ids ajenos al pedido se ignoran.
+
+    Devuelve ({detalle_id: cantidad nueva (0 = borrada)}, items, total).
+    """
+    cantidades = {}
+    items = importe = 0
+    for detalle_id, delta in cambios.items():
+        if delta is None:
+            fila = db.session.execute(
+                delete(PedidoDetalle)
+                .where(PedidoDetalle.id == detalle_id, PedidoDetalle.pedido_id == pedido_id)
+                .returning(PedidoDetalle.cantidad, PedidoDetalle.precio_unitario)
+                .execution_options(synchronize_session=False)
+            ).first()
+            if fila is None:
+                continue
+            cambio, nueva = -int(fila.cantidad), 0
+        else:
+            fila = db.session.execute(
+                update(PedidoDetalle)
+                .where(PedidoDetalle.id == detalle_id, PedidoDetalle.pedido_id == pedido_id)
+                .values(cantidad=PedidoDetalle.cantidad + delta)
+                .returning(PedidoDetalle.cantidad, PedidoDetalle.precio_unitario)
+                .execution_options(synchronize_session=False)
+            ).first()
+            if fila is None:
+                continue
+            nueva, cambio = int(fila.cantidad), delta
+            if nueva <= 0:
+                db.session.execute(
+                    delete(PedidoDetalle)
+                    .where(PedidoDetalle.id == detalle_id)
+                    .execution_options(synchronize_session=False)
+                )
+                cambio, nueva = delta - nueva, 0
+        cantidades[detalle_id] = nueva
+        items   += cambio
+        importe += cambio * int(fila.precio_unitario)
+
+    if not cantidades:
+        fila = db.session.execute(
+            select(Pedido.items, Pedido.total).where(Pedido.id == pedido_id)
+        ).one()
+        return cantidades, int(fila.items), int(fila.total)
+    items, total = ajustar_totales(pedido_id, items, importe)
+    return cantidades, items, total
+
+
+def editar_producto(pedido_id: int, producto_id: int, accion: str):
+    """
+    editar_linea() sobre la línea del producto en el pedido (la cola
+    offline no conoce ids de línea). None si el pedido no tiene esa línea.
+    """
+    detalle_id = db.session.execute(
+        select(PedidoDetalle.id).where(
+            PedidoDetalle.pedido_id == pedido_id,
+            PedidoDetalle.producto_id == producto_id,
+        )
+    ).scalar()
+    if detalle_id is None:
+        return None
+    return editar_linea(pedido_id, detalle_id, accion)
+
+
+def cancelar_vacio(pedido_id: int):
+    """Cancela un pedido que se quedó sin líneas. La mesa la libera la ruta."""
+    db.session.execute(
+        update(Pedido)
+        .where(Pedido.id == pedido_id)
+        .values(estado="cancelado", fecha_cierre=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def cerrar(pedido_id: int, **valores) -> bool:
+    """
+    Marca el pedido como cerrado (más los campos de pago dados) solo si
+    sigue abierto. False si ya no lo está: otra petición lo cerró o el
+    mesero lo dejó cancelado (y la mesa quizá ya tiene otro pedido). La
+    ruta no debe sumarlo a la caja ni liberar la mesa.
+    """
+    resultado = db.session.execute(
+        update(Pedido)
+        .where(Pedido.id == pedido_id, Pedido.estado == "abierto")
+        .values(estado="cerrado", fecha_cierre=datetime.utcnow(), **valores)
+        .execution_options(synchronize_session=False)
+    )
+    return resultado.rowcount == 1
@@ -0,0 +1,223 @@
+"""
+perfilado.py — perfilar una petición real bajo demanda.
+
+Se activa por petición, solo para admin:
+  - ?_perfil=1 con sesión de admin, o
+  - cabecera X-Perfil con un token firmado (`flask --app app token-perfil`),
+    para perfilar sin sesión (curl, scripts).
+
+Esa petición corre bajo cProfile y se guarda cada sentencia SQL con su
+tiempo y parámetros, más el EXPLAIN de las más lentas. Queda en
+instance/profiles/:
+  <nombre>.prof   volcado de cProfile (pstats, snakeviz)
+  <nombre>.txt    reporte: funciones más costosas, SQL, planes
+  <nombre>.json   resumen para el listado de /admin/perfiles
+
+Sin la bandera el costo es mirar un parámetro y una cabecera por petición
+y un `in g` por sentencia SQL.
+
+cProfile no admite dos perfiles activos a la vez en un proceso: con el
+worker gthread se perfila una petición por worker y las que lleguen
+mientras tanto corren sin perfil (cabecera X-Perfil-Omitido: ocupado).
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, g, has_request_context, request
+from flask_login import current_user
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event
+
+from extensions import db
+
+CABECERA        = "X-Perfil"
+PARAMETRO       = "_perfil"
+TOKEN_VIGENCIA  = 3600          # segundos
+EXPLAIN_LENTAS  = 3
+MAXIMO_PERFILES = 50
+
+_ocupado = threading.Lock()     # una petición perfilada por proceso
+
+
+def directorio(app=None) -> str:
+    return os.path.join((app or current_app).instance_path, "profiles")
+
+
+# ---------- ACTIVACIÓN ----------
+def _firmador(app=None):
+    return URLSafeTimedSerializer((app or current_app).config["SECRET_KEY"], salt="perfil")
+
+
+def token(app) -> str:
+    return _firmador(app).dumps("perfil")
+
+
+def _token_valido(valor) -> bool:
+    try:
+        return _firmador().loads(valor, max_age=TOKEN_VIGENCIA) == "perfil"
+    except BadSignature:
+        return False
+
+
+def _solicitado() -> bool:
+    valor = request.headers.get(CABECERA)
+    if valor is not None:
+        return _token_valido(valor)
+    if request.args.get(PARAMETRO) == "1":
+        return current_user.is_authenticated and current_user.role == "admin"
+    return False
+
+
+# ---------- SQL ----------
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "perfil" in g:
+        context._perfil_t0 = time.perf_counter()
+
+
+def _despues_sql(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "perfil" in g:
+        ms = (time.perf_counter() - context._perfil_t0) * 1000
+        g.perfil["sql"].append((ms, statement, parameters))
+
+
+# ---------- PETICIÓN ----------
+def _inicio():
+    if request.args.get(PARAMETRO) is None and CABECERA not in request.headers:
+        return
+    if not _solicitado():
+        return
+    if not _ocupado.acquire(blocking=False):
+        g.perfil_omitido = True
+        return
+    perfil = cProfile.Profile()
+    g.perfil = {"profile": perfil, "sql": [], "t0": time.perf_counter()}
+    perfil.enable()
+
+
+def _soltar(perfil):
+    perfil["profile"].disable()
+    _ocupado.release()
+
+
+def _fin(resp):
+    if g.pop("perfil_omitido", False):
+        resp.headers[CABECERA + "-Omitido"] = "ocupado"
+        return resp
+    perfil = g.pop("perfil", None)
+    if perfil is None:
+        return resp
+    _soltar(perfil)
+    perfil["ms"] = (time.perf_counter() - perfil["t0"]) * 1000
+    nombre = _guardar(perfil, resp.status_code)
+    resp.headers[CABECERA + "-Nombre"] = nombre
+    return resp
+
+
+def _cierre(_error=None):
+    # Si la petición terminó en excepción no hubo after_request: aquí se
+    # suelta el perfil para no dejar el candado tomado.
+    perfil = g.pop("perfil", None)
+    if perfil is not None:
+        _soltar(perfil)
+
+
+def instalar(app, engine):
+    app.before_request(_inicio)
+    app.after_request(_fin)
+    app.teardown_request(_cierre)
+    event.listen(engine, "before_cursor_execute", _antes_sql)
+    event.listen(engine, "after_cursor_execute", _despues_sql)
+
+
+# ---------- REPORTE ----------
+def _explicar(statement, parameters):
+    with db.engine.connect() as conn:
+        prefijo = "EXPLAIN " if conn.dialect.name == "postgresql" else "EXPLAIN QUERY PLAN "
+        try:
+            filas = conn.exec_driver_sql(prefijo + statement, parameters).all()
+        except Exception as e:          # el reporte no debe tumbar la petición
+            return f"(sin plan: {e})"
+        finally:
+            conn.rollback()
+    return "\n".join(str(f[-1]) for f in filas)
+
+
+def _guardar(perfil, estado) -> str:
+    carpeta = directorio()
+    os.makedirs(carpeta, exist_ok=True)
+    endpoint = request.endpoint or "desconocido"
+    nombre = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{re.sub(r'[^a-z0-9_]', '_', endpoint.lower())}"
+    base = os.path.join(carpeta, nombre)
+
+    perfil["profile"].dump_stats(base + ".prof")
+
+    sql = perfil["sql"]
+    ms_bd = sum(s[0] for s in sql)
+    salida = io.StringIO()
+    salida.write(f"{request.method} {request.full_path.rstrip('?')} → {estado}\n")
+    salida.write(f"total {perfil['ms']:.1f} ms | {len(sql)} sentencias SQL, {ms_bd:.1f} ms en BD\n\n")
+
+    salida.write("── FUNCIONES (acumulado) " + "─" * 40 + "\n")
+    pstats.Stats(perfil["profile"], stream=salida).sort_stats("cumulative").print_stats(30)
+
+    salida.write("── SQL (en orden) " + "─" * 47 + "\n")
+    for i, (ms, statement, parameters) in enumerate(sql, 1):
+        salida.write(f"[{i}] {ms:.2f} ms  params={parameters!r}\n{statement.strip()}\n\n")
+
+    lentas = sorted(
+        (s for s in sql if s[1].lstrip().upper().startswith(("SELECT", "WITH"))),
+        key=lambda s: s[0], reverse=True,
+    )[:EXPLAIN_LENTAS]
+    if lentas:
+        salida.write("── EXPLAIN (las más lentas) " + "─" * 37 + "\n")
+        for ms, statement, parameters in lentas:
+            salida.write(f"{ms:.2f} ms\n{statement.strip()}\n{_explicar(statement, parameters)}\n\n")
+
+    with open(base + ".txt", "w", encoding="utf-8") as f:
+        f.write(salida.getvalue())
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({
+            "nombre": nombre,
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "metodo": request.method,
+            "ruta": request.full_path.rstrip("?"),
+            "endpoint": endpoint,
+            "estado": estado,
+            "ms": round(perfil["ms"], 1),
+            "consultas": len(sql),
+            "ms_bd": round(ms_bd, 1),
+        }, f, ensure_ascii=False)
+
+    _podar(carpeta)
+    return nombre
+
+
+def _podar(carpeta):
+    resumenes = sorted(n for n in os.listdir(carpeta) if n.endswith(".json"))
+    for viejo in resumenes[:-MAXIMO_PERFILES]:
+        base = viejo[:-len(".json")]
+        for ext in (".json", ".txt", ".prof"):
+            try:
+                os.remove(os.path.join(carpeta, base + ext))
+            except FileNotFoundError:
+                pass
+
+
+def listar(app=None) -> list[dict]:
+    """Resúmenes guardados, del más reciente al más viejo."""
+    carpeta = directorio(app)
+    if not os.path.isdir(carpeta):
+        return []
+    perfiles = []
+    for n in sorted(os.listdir(carpeta), reverse=True):
+        if n.endswith(".json"):
+            with open(os.path.join(carpeta, n), encoding="utf-8") as f:
+                perfiles.append(json.load(f))
+    return perfiles
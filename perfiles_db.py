@@ -0,0 +1,127 @@
+"""
+perfiles_db.py — perfiles del engine de SQLAlchemy.
+
+Se elige con DB_PERFIL (si no, según DATABASE_URL):
+
+  postgres-pooled  Pool por worker del tamaño de lo que lo usa a la vez
+                   (GUNICORN_THREADS hilos de petición, SSE incluidos, más
+                   los hilos vigía de eventos e impresor), con tope en la
+                   parte de DB_MAX_CONEXIONES que le toca a cada uno de
+                   los WEB_CONCURRENCY workers (menos su conexión LISTEN).
+                   pool_recycle y pool_pre_ping (Render corta conexiones
+                   inactivas). Por defecto con PostgreSQL.
+  pgbouncer        NullPool: PgBouncer hace el pooling. Sin prepared
+                   statements del lado del servidor (psycopg 3:
+                   prepare_threshold=None; psycopg2 no los usa). LISTEN no
+                   sirve en modo transacción: /events escucha en
+                   DATABASE_URL_DIRECTA si existe, si no consulta la tabla.
+  sqlite-wal       WAL + busy_timeout + synchronous=NORMAL + mmap en cada
+                   conexión: los lectores (polling) no esperan a los
+                   escritores. Por defecto con SQLite.
+  sqlite           SQLite tal cual (rollback journal).
+
+Medido con bench/perfiles.py (SQLite en disco, 8 hilos, 10 s, 1 CPU,
+sin errores en ningún caso):
+
+  perfil        20% escrituras       60% escrituras
+  sqlite        140-165 req/s        91 req/s  (p95 153 ms)
+  sqlite-wal    140-153 req/s       114 req/s  (p95 129 ms)
+
+Con pocas escrituras la diferencia queda dentro del ruido (manda la CPU);
+WAL gana cuando hay más envíos de pedido compitiendo con las lecturas.
+Los perfiles de PostgreSQL (postgres-pooled, pgbouncer) NO están medidos:
+falta correr bench/perfiles.py --perfil postgres-pooled pgbouncer con
+DATABASE_URL apuntando a un servidor (y a un PgBouncer) de verdad.
+"""
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+PERFILES = ("postgres-pooled", "pgbouncer", "sqlite-wal", "sqlite")
+
+
+def elegir(db_url: str) -> str:
+    perfil = (os.getenv("DB_PERFIL") or "").strip().lower()
+    if perfil:
+        if perfil not in PERFILES:
+            raise ValueError(f"DB_PERFIL desconocido: {perfil} (opciones: {', '.join(PERFILES)})")
+        return perfil
+    return "sqlite-wal" if db_url.startswith("sqlite") else "postgres-pooled"
+
+
+def _entero(nombre, defecto):
+    return int(os.getenv(nombre, str(defecto)))
+
+
+# Hilos de cada worker que toman conexiones del pool además de los de
+# gunicorn: el vigía de eventos y el impresor.
+HILOS_PROPIOS = 2
+
+
+def conexiones_por_worker() -> tuple[int, int]:
+    """
+    (las que puede pedir a la vez, las que le caben) en un worker con
+    postgres-pooled. Si caben menos, los hilos de sobra esperan hasta
+    DB_POOL_TIMEOUT: subir DB_MAX_CONEXIONES o bajar GUNICORN_THREADS.
+    """
+    workers   = max(1, _entero("WEB_CONCURRENCY", 2))
+    hilos     = max(1, _entero("GUNICORN_THREADS", 16))
+    # La conexión LISTEN de /events va fuera del pool, una por worker.
+    tope      = _entero("DB_MAX_CONEXIONES", 20) // workers - 1
+    return hilos + HILOS_PROPIOS, max(2, tope)
+
+
+def opciones_engine(perfil: str, db_url: str) -> dict:
+    """Valor para SQLALCHEMY_ENGINE_OPTIONS."""
+    if perfil == "postgres-pooled":
+        necesarias, tope = conexiones_por_worker()
+        por_worker  = min(necesarias, tope)
+        overflow    = por_worker // 4
+        return {
+            "pool_size":     por_worker - overflow,
+            "max_overflow":  overflow,
+            "pool_timeout":  _entero("DB_POOL_TIMEOUT", 10),
+            "pool_recycle":  _entero("DB_POOL_RECYCLE", 280),
+            "pool_pre_ping": True,
+        }
+
+    if perfil == "pgbouncer":
+        opciones = {"poolclass": NullPool}
+        if db_url.startswith("postgresql+psycopg:"):
+            opciones["connect_args"] = {"prepare_threshold": None}
+        return opciones
+
+    if perfil == "sqlite-wal":
+        # Varios hilos (gthread) comparten el pool.
+        return {"connect_args": {"check_same_thread": False, "timeout": 5}}
+
+    return {}
+
+
+def _pragmas_wal(dbapi_conn, _registro):
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute(f"PRAGMA busy_timeout={_entero('SQLITE_BUSY_TIMEOUT_MS', 5000)}")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute(f"PRAGMA mmap_size={_entero('SQLITE_MMAP_BYTES', 256 * 1024 * 1024)}")
+    cur.close()
+
+
+def instalar(perfil: str, engine):
+    """Listeners que dependen del perfil (se llama una vez creado el engine)."""
+    if perfil == "sqlite-wal":
+        event.listen(engine, "connect", _pragmas_wal)
+
+
+def url_listen(perfil: str, engine):
+    """URL para el LISTEN de /events, o None si hay que sondear la tabla."""
+    if engine.dialect.name != "postgresql":
+        return None
+    if perfil == "pgbouncer":
+        directa = os.getenv("DATABASE_URL_DIRECTA")
+        if not directa:
+            return None
+        return make_url(directa.replace("postgres://", "postgresql://", 1))
+    return engine.url
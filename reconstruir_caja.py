@@ -0,0 +1,32 @@
+"""
+reconstruir_caja.py — recalcula la tabla venta_dia desde los pedidos cerrados.
+
+Uso:
+    python reconstruir_caja.py                       # todo el histórico
+    python reconstruir_caja.py --desde 2025-01-01    # desde un día (Bogotá)
+    python reconstruir_caja.py --desde 2025-01-01 --hasta 2025-01-31
+"""
+import argparse
+from datetime import datetime
+
+from app import app
+import caja
+
+
+def _fecha(s):
+    return datetime.strptime(s, "%Y-%m-%d").date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye el resumen de caja (venta_dia).")
+    parser.add_argument("--desde", type=_fecha, default=None)
+    parser.add_argument("--hasta", type=_fecha, default=None)
+    args = parser.parse_args()
+
+    with app.app_context():
+        filas = caja.reconstruir(args.desde, args.hasta)
+    print(f"✅ venta_dia reconstruida: {filas} filas")
+
+
+if __name__ == "__main__":
+    main()
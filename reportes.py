@@ -0,0 +1,166 @@
+"""
+reportes.py — ventas por rango de días: por día, producto, categoría,
+método de pago y mesero.
+
+Todo se agrega en SQL (GROUP BY) y llega ya sumado; no se recorren pedidos
+en Python. Lo que es por pedido (día, método, mesero, ticket) sale de la
+tabla pedido por el índice (estado, fecha_cierre); lo que es por producto
+sale del acumulado venta_dia, que ya viene agrupado por día. El dinero son
+pesos enteros: los totales de un año cuadran al peso.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import Date, cast, func, select
+
+from extensions import db
+from models import User, Producto, Pedido, VentaDia
+from caja import METODOS, normalizar_metodo
+from zonas import bogota_day_to_utc_range, bogota_now
+
+# Colombia no tiene horario de verano: el día de Bogotá es UTC - 5 h fijo.
+DESFASE_BOGOTA = timedelta(hours=5)
+MAXIMO_DIAS    = 366 * 3
+
+RANGOS = {
+    "hoy":          "Hoy",
+    "semana":       "Últimos 7 días",
+    "mes":          "Este mes",
+    "mes_anterior": "Mes anterior",
+    "anio":         "Este año",
+}
+
+
+def rango(nombre: str = "", desde: str = "", hasta: str = "", hoy: date = None):
+    """
+    (desde, hasta, nombre) a partir de un rango con nombre o de fechas
+    ISO (desde/hasta mandan si vienen). ValueError si no se entienden.
+    """
+    hoy = hoy or bogota_now().date()
+    if desde or hasta:
+        d = date.fromisoformat(desde or hasta)
+        h = date.fromisoformat(hasta or desde)
+        if h < d:
+            d, h = h, d
+        if (h - d).days >= MAXIMO_DIAS:
+            raise ValueError("rango demasiado largo")
+        return d, h, "personalizado"
+
+    nombre = nombre or "semana"
+    if nombre == "hoy":
+        return hoy, hoy, nombre
+    if nombre == "semana":
+        return hoy - timedelta(days=6), hoy, nombre
+    if nombre == "mes":
+        return hoy.replace(day=1), hoy, nombre
+    if nombre == "mes_anterior":
+        fin = hoy.replace(day=1) - timedelta(days=1)
+        return fin.replace(day=1), fin, nombre
+    if nombre == "anio":
+        return hoy.replace(month=1, day=1), hoy, nombre
+    raise ValueError(nombre)
+
+
+def _dia_bogota_sql(columna):
+    """Día de Bogotá de una fecha UTC, calculado en la BD."""
+    if db.engine.dialect.name == "postgresql":
+        return cast(columna - DESFASE_BOGOTA, Date)
+    return func.date(columna, "-5 hours")
+
+
+def _filtros_cobrados(desde: date, hasta: date):
+    inicio, _ = bogota_day_to_utc_range(desde)
+    _, fin = bogota_day_to_utc_range(hasta)
+    return (
+        Pedido.estado == "cerrado",
+        Pedido.fecha_cierre >= inicio,
+        Pedido.fecha_cierre <= fin,
+    )
+
+
+# ---------- POR PEDIDO ----------
+def por_pedido(desde: date, hasta: date):
+    """
+    (por_dia, por_metodo, por_mesero) en UNA pasada por el índice: se
+    agrupa por (día, método, mesero) en SQL y esas pocas filas (días ×
+    métodos × meseros) se reparten aquí en las tres vistas.
+    """
+    dia = _dia_bogota_sql(Pedido.fecha_cierre).label("dia")
+    dias    = {}
+    metodos = {m: {"metodo": m, "pedidos": 0, "ventas": 0} for m in METODOS}
+    meseros = {}
+    for d, metodo, mesero_id, mesero, n, ventas in db.session.execute(
+        select(dia, Pedido.metodo_pago, Pedido.mesero_id, User.username,
+               func.count(Pedido.id), func.sum(Pedido.total))
+        .join(User, User.id == Pedido.mesero_id)
+        .where(*_filtros_cobrados(desde, hasta))
+        .group_by(dia, Pedido.metodo_pago, Pedido.mesero_id, User.username)
+    ):
+        n, ventas = int(n), int(ventas or 0)
+        for fila in (
+            dias.setdefault(str(d), {"dia": str(d), "pedidos": 0, "ventas": 0}),
+            metodos[normalizar_metodo(metodo)],
+            meseros.setdefault(mesero_id, {"mesero_id": mesero_id, "mesero": mesero,
+                                           "pedidos": 0, "ventas": 0}),
+        ):
+            fila["pedidos"] += n
+            fila["ventas"]  += ventas
+    return (
+        sorted(dias.values(), key=lambda f: f["dia"]),
+        list(metodos.values()),
+        sorted(meseros.values(), key=lambda f: f["ventas"], reverse=True),
+    )
+
+
+# ---------- POR PRODUCTO (venta_dia) ----------
+def por_producto(desde: date, hasta: date):
+    """(por_producto, por_categoria) agrupando venta_dia por producto y categoría."""
+    categoria = func.coalesce(Producto.categoria, "sin categoría")
+    productos = [
+        {"producto_id": pid, "nombre": nombre, "categoria": cat,
+         "cantidad": int(cantidad or 0), "ventas": int(ventas or 0)}
+        for pid, nombre, cat, cantidad, ventas in db.session.execute(
+            select(
+                VentaDia.producto_id,
+                func.max(VentaDia.nombre),
+                categoria,
+                func.sum(VentaDia.cantidad),
+                func.sum(VentaDia.ventas),
+            )
+            .outerjoin(Producto, Producto.id == VentaDia.producto_id)
+            .where(VentaDia.dia >= desde, VentaDia.dia <= hasta)
+            .group_by(VentaDia.producto_id, categoria)
+        )
+    ]
+    productos.sort(key=lambda f: f["ventas"], reverse=True)
+
+    categorias = {}
+    for p in productos:
+        fila = categorias.setdefault(p["categoria"], {"categoria": p["categoria"], "cantidad": 0, "ventas": 0})
+        fila["cantidad"] += p["cantidad"]
+        fila["ventas"]   += p["ventas"]
+    return productos, sorted(categorias.values(), key=lambda f: f["ventas"], reverse=True)
+
+
+# ---------- REPORTE COMPLETO ----------
+def generar(desde: date, hasta: date) -> dict:
+    """Todas las agrupaciones del rango (dos consultas), lista para la plantilla o el JSON."""
+    dias, metodos, meseros = por_pedido(desde, hasta)
+    productos, categorias  = por_producto(desde, hasta)
+    pedidos = sum(d["pedidos"] for d in dias)
+    ventas  = sum(d["ventas"] for d in dias)
+    return {
+        "desde": str(desde),
+        "hasta": str(hasta),
+        "totales": {
+            "ventas":          ventas,
+            "pedidos":         pedidos,
+            "ticket_promedio": ventas // pedidos if pedidos else 0,
+            "unidades":        sum(p["cantidad"] for p in productos),
+            "dias_con_ventas": len(dias),
+        },
+        "por_dia":       dias,
+        "por_metodo":    metodos,
+        "por_mesero":    meseros,
+        "por_producto":  productos,
+        "por_categoria": categorias,
+    }
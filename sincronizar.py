@@ -0,0 +1,215 @@
+"""
+sincronizar.py — lotes de mutaciones de la cola offline del mesero (/sync).
+
+El navegador guarda cada envío en una cola en IndexedDB
+(static/js/cola.js), cada mutación con un id propio, y la manda por lotes
+cuando hay red. Aquí el lote se aplica completo, en orden y en UNA
+transacción, y la ruta devuelve el estado nuevo de las mesas tocadas.
+
+Mutaciones:
+  {"id": ..., "tipo": "agregar", "mesa_id": 3, "items": {"12": 2}}
+  {"id": ..., "tipo": "linea",   "mesa_id": 3, "producto_id": 12,
+   "accion": "sumar" | "restar" | "eliminar"}
+  {"id": ..., "tipo": "lineas",  "mesa_id": 3, "pedido_id": 8,
+   "cambios": [{"detalle_id": 5, "delta": -1}]}   (ver /pedido/<id>/lineas)
+
+Es idempotente: los ids aplicados quedan en mutacion_aplicada en la misma
+transacción, así que reenviar un lote cuya respuesta se perdió no duplica
+nada. Una mutación inválida (producto fuera de la carta, mesa que no
+existe, pedido de otro mesero) se rechaza sola y el resto sigue.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from extensions import db
+from models import Mesa, Pedido, MutacionAplicada
+from db_utils import bloquear
+import eventos
+import impresion
+import pedidos
+
+MAXIMO_LOTE = 100
+RETENCION   = timedelta(days=7)
+ACCIONES    = ("sumar", "restar", "eliminar")
+
+
+def _entero(valor) -> int:
+    # bool es int en Python: un true en el JSON no es una cantidad.
+    if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+        raise ValueError
+    return int(valor)
+
+
+def _leer(m, carta) -> dict:
+    """Mutación normalizada; ValueError con el motivo si no sirve."""
+    tipo = m.get("tipo")
+    try:
+        mesa_id = _entero(m.get("mesa_id"))
+    except ValueError:
+        raise ValueError("mesa inválida")
+
+    if tipo == "agregar":
+        if not isinstance(m.get("items"), dict):
+            raise ValueError("sin productos")
+        items = {}
+        for producto, cantidad in m["items"].items():
+            try:
+                producto_id, cantidad = _entero(producto), _entero(cantidad)
+            except ValueError:
+                raise ValueError("cantidad inválida")
+            if cantidad <= 0:
+                continue
+            if producto_id not in carta.por_id:
+                raise ValueError(f"producto {producto_id} fuera de la carta")
+            items[producto_id] = items.get(producto_id, 0) + cantidad
+        if not items:
+            raise ValueError("sin productos")
+        return {"tipo": tipo, "mesa_id": mesa_id, "items": items}
+
+    if tipo == "linea":
+        try:
+            producto_id = _entero(m.get("producto_id"))
+        except ValueError:
+            raise ValueError("producto inválido")
+        if m.get("accion") not in ACCIONES:
+            raise ValueError("acción inválida")
+        return {"tipo": tipo, "mesa_id": mesa_id, "producto_id": producto_id, "accion": m["accion"]}
+
+    if tipo == "lineas":
+        try:
+            pedido_id = _entero(m.get("pedido_id"))
+        except ValueError:
+            raise ValueError("pedido inválido")
+        cambios = pedidos.leer_cambios(m.get("cambios"))
+        if not cambios:
+            raise ValueError("sin cambios")
+        return {"tipo": tipo, "mesa_id": mesa_id, "pedido_id": pedido_id, "cambios": cambios}
+
+    raise ValueError("tipo desconocido")
+
+
+def aplicar(mutaciones: list, mesero_id: int, mesero: str, carta) -> dict:
+    """
+    Aplica el lote. Devuelve {"aplicadas": [ids], "rechazadas": [{id,
+    error}], "mesas": [mesa_ids tocadas]}. Las ya aplicadas antes cuentan
+    como aplicadas. Cada envío agrupado deja su comanda de cocina en la
+    cola de impresión. No hace commit; va dentro de db_utils.reintentar.
+    """
+    ids = [m.get("id") for m in mutaciones if isinstance(m, dict) and isinstance(m.get("id"), str)]
+    ya_aplicadas = set(db.session.execute(
+        select(MutacionAplicada.id).where(MutacionAplicada.id.in_(ids))
+    ).scalars()) if ids else set()
+
+    aplicadas, rechazadas, validas = [], [], []
+    vistas, tocadas = set(), set()
+    for m in mutaciones:
+        mid = m.get("id") if isinstance(m, dict) else None
+        if not isinstance(mid, str) or not mid or len(mid) > 40:
+            rechazadas.append({"id": mid, "error": "id inválido"})
+            continue
+        if mid in vistas:               # repetida dentro del mismo lote
+            continue
+        vistas.add(mid)
+        if mid in ya_aplicadas:
+            aplicadas.append(mid)
+            if isinstance(m.get("mesa_id"), int):
+                tocadas.add(m["mesa_id"])
+            continue
+        try:
+            validas.append((mid, _leer(m, carta)))
+        except ValueError as e:
+            rechazadas.append({"id": mid, "error": str(e)})
+
+    # Envíos seguidos a la misma mesa van en un solo upsert.
+    grupos = []
+    for mid, v in validas:
+        previo = grupos[-1][1] if grupos else None
+        if (previo and v["tipo"] == previo["tipo"] == "agregar"
+                and v["mesa_id"] == previo["mesa_id"]):
+            grupos[-1][0].append(mid)
+            for producto_id, cantidad in v["items"].items():
+                previo["items"][producto_id] = previo["items"].get(producto_id, 0) + cantidad
+        else:
+            grupos.append(([mid], v))
+
+    # Candados en orden de id, antes de leer las mesas: dos lotes que tocan
+    # las mismas mesas no se bloquean en cruz (PostgreSQL). En SQLite el
+    # primero toma la BD.
+    mesa_ids = sorted({v["mesa_id"] for _, v in validas})
+    for mesa_id in mesa_ids:
+        bloquear(Mesa, mesa_id)
+    mesas = {
+        mesa.id: mesa
+        for mesa in db.session.execute(select(Mesa).where(Mesa.id.in_(mesa_ids))).scalars()
+    }
+
+    cambios_pedido = {}          # pedido_id -> acción del evento
+    estado_inicial = {mesa_id: mesa.estado for mesa_id, mesa in mesas.items()}
+    nuevas = []
+    for ids_grupo, v in grupos:
+        mesa = mesas.get(v["mesa_id"])
+        if mesa is None:
+            rechazadas += [{"id": mid, "error": "mesa inexistente"} for mid in ids_grupo]
+            continue
+
+        if v["tipo"] == "agregar":
+            pedido_id, creado = pedidos.enviar(mesa.id, mesero_id, v["items"], carta)
+            impresion.encolar_cocina(pedido_id, mesa.numero, mesero, v["items"], carta, creado)
+            cambios_pedido[pedido_id] = "creado" if creado else cambios_pedido.get(pedido_id, "actualizado")
+            mesa.estado = "ocupada"
+        elif v["tipo"] == "lineas":
+            # Edición de /pedido/<id>/lineas que no llegó: mismo id, así
+            # que si en realidad sí se aplicó ya está en ya_aplicadas.
+            mid = ids_grupo[0]
+            pedido = db.session.execute(
+                select(Pedido.mesa_id, Pedido.mesero_id, Pedido.estado)
+                .where(Pedido.id == v["pedido_id"])
+            ).first()
+            if (pedido is None or pedido.mesa_id != mesa.id or pedido.mesero_id != mesero_id
+                    or pedido.estado != "abierto"):
+                rechazadas.append({"id": mid, "error": "la mesa no tiene un pedido tuyo abierto"})
+                continue
+            cantidades, items, _ = pedidos.ajustar_lineas(v["pedido_id"], v["cambios"])
+            if items == 0:
+                pedidos.cancelar_vacio(v["pedido_id"])
+                cambios_pedido[v["pedido_id"]] = "cancelado"
+                mesa.estado = "libre"
+            elif cantidades:
+                cambios_pedido[v["pedido_id"]] = cambios_pedido.get(v["pedido_id"], "actualizado")
+        else:
+            mid = ids_grupo[0]
+            abierto = db.session.execute(
+                select(Pedido.id, Pedido.mesero_id)
+                .where(Pedido.mesa_id == mesa.id, Pedido.estado == "abierto")
+            ).first()
+            if abierto is None or abierto.mesero_id != mesero_id:
+                rechazadas.append({"id": mid, "error": "la mesa no tiene un pedido tuyo abierto"})
+                continue
+            restantes = pedidos.editar_producto(abierto.id, v["producto_id"], v["accion"])
+            if restantes is None:
+                rechazadas.append({"id": mid, "error": "el producto no está en el pedido"})
+                continue
+            if restantes == 0:
+                pedidos.cancelar_vacio(abierto.id)
+                cambios_pedido[abierto.id] = "cancelado"
+                mesa.estado = "libre"
+            else:
+                cambios_pedido[abierto.id] = cambios_pedido.get(abierto.id, "actualizado")
+        nuevas += ids_grupo
+
+    db.session.add_all([MutacionAplicada(id=mid, mesero_id=mesero_id) for mid in nuevas])
+    aplicadas += nuevas
+
+    # Un evento por pedido y por mesa cambiada, no uno por mutación.
+    for pedido_id, accion in cambios_pedido.items():
+        eventos.pedido_cambiado(pedido_id, accion)
+    for mesa_id, mesa in mesas.items():
+        if mesa.estado != estado_inicial[mesa_id]:
+            eventos.mesa_cambiada(mesa)
+
+    if validas:
+        db.session.execute(
+            delete(MutacionAplicada).where(MutacionAplicada.fecha < datetime.utcnow() - RETENCION)
+        )
+    return {"aplicadas": aplicadas, "rechazadas": rechazadas, "mesas": sorted(tocadas.union(mesas))}
@@ -0,0 +1,210 @@
+let sonidoActivado  = false;
+let pedidosMostrados = new Set();
+let primeraCarga    = true;
+let cursor          = null;   // último evento aplicado (delta con ?since=)
+const tarjetas      = new Map();  // pedido_id -> elemento .pedido
+
+function beep() {
+  if (!sonidoActivado) return;
+  try {
+    const ctx = new (window.AudioContext || window.webkitAudioContext)();
+    const o = ctx.createOscillator();
+    const g = ctx.createGain();
+    o.connect(g); g.connect(ctx.destination);
+    o.type = "sine"; o.frequency.value = 880; g.gain.value = 0.05;
+    o.start();
+    setTimeout(() => { o.stop(); ctx.close(); }, 160);
+  } catch (e) {}
+}
+
+function setSoundUI(on){
+  const sw = document.getElementById("switchSound");
+  const st = document.getElementById("estadoSonido");
+  if (!sw || !st) return;
+  sw.classList.toggle("on", on);
+  sw.setAttribute("aria-checked", on ? "true" : "false");
+  st.textContent = on ? "ON" : "OFF";
+  st.style.color = on ? "rgba(34,197,94,.95)" : "rgba(232,238,252,.7)";
+}
+
+function toggleSound(){
+  sonidoActivado = !sonidoActivado;
+  setSoundUI(sonidoActivado);
+  if (sonidoActivado) beep();
+}
+
+document.getElementById("switchSound").addEventListener("click", toggleSound);
+document.getElementById("switchSound").addEventListener("keydown", (e) => {
+  if (e.key === "Enter" || e.key === " ") { e.preventDefault(); toggleSound(); }
+});
+document.getElementById("btn-refresh").addEventListener("click", () => cargarPedidos(true));
+
+function formatoDinero(n) {
+  return "$" + Math.round(n).toLocaleString("es-CO");
+}
+
+function escapeHtml(str){
+  return String(str ?? "")
+    .replaceAll("&","&amp;").replaceAll("<","&lt;")
+    .replaceAll(">","&gt;").replaceAll('"',"&quot;")
+    .replaceAll("'","&#039;");
+}
+
+function htmlPedido(p, esNuevo){
+  const itemsHtml = (p.detalles || []).map(d => `
+    <li>
+      <div>
+        <div class="iname">${escapeHtml(d.nombre)} <span class="meta2">x ${Number(d.cantidad)}</span></div>
+        <div class="meta2">${formatoDinero(Number(d.precio))} c/u</div>
+      </div>
+      <div class="isub">${formatoDinero(Number(d.subtotal))}</div>
+    </li>`).join("");
+
+  let hora = "";
+  if (p.hora) {
+    hora = escapeHtml(p.hora);
+  } else if (p.fecha) {
+    try {
+      const dt = new Date(p.fecha);
+      hora = dt.toLocaleTimeString("es-CO", { hour:"2-digit", minute:"2-digit" });
+    } catch(e) {}
+  }
+
+  return `
+    <div class="pedido ${esNuevo ? "nuevo" : ""}" data-id="${p.id}">
+      <div class="head">
+        <div class="headLeft">
+          <div class="hline">
+            <span class="pill ember">Pedido #${p.id}</span>
+            <span class="pill blue">Mesa ${escapeHtml(String(p.mesa))}</span>
+            <span class="pill">${escapeHtml(p.mesero || "")}</span>
+            ${hora ? `<span class="pill green">🕒 ${hora}</span>` : ""}
+            ${esNuevo && !primeraCarga ? `<span class="pill green">✨ Nuevo</span>` : ""}
+          </div>
+          <div class="muted">Revisa y cierra cuando esté listo para cobrar.</div>
+        </div>
+      </div>
+      <ul class="items">${itemsHtml}</ul>
+      <div class="totalRow">
+        <div class="total">TOTAL: ${formatoDinero(Number(p.total))}</div>
+        <div class="actions">
+          <form method="POST" action="/admin/pedido/${p.id}/cerrar">
+            <button class="btn red" type="submit">✅ Cerrar (liberar mesa)</button>
+          </form>
+          <a class="btn green" href="/admin/factura/${p.id}?print=1">🧾 Factura</a>
+        </div>
+      </div>
+    </div>`;
+}
+
+function crearTarjeta(p){
+  const esNuevo = !pedidosMostrados.has(p.id);
+  pedidosMostrados.add(p.id);
+  const tmp = document.createElement("div");
+  tmp.innerHTML = htmlPedido(p, esNuevo).trim();
+  const el = tmp.firstElementChild;
+  tarjetas.set(p.id, el);
+  return el;
+}
+
+function mostrarVacio(){
+  document.getElementById("pedidos-container").innerHTML = `
+    <div class="empty-state">
+      <div class="empty-icon">🍽️</div>
+      <p class="empty-title">Sin pedidos abiertos</p>
+      <p class="empty-sub">
+        Cuando un mesero envíe un pedido aparecerá aquí automáticamente.
+      </p>
+      <div class="empty-footer">
+        <div class="empty-dot"></div>
+        Actualizando en tiempo real
+      </div>
+    </div>`;
+  tarjetas.clear();
+}
+
+function obtenerGrid(){
+  const cont = document.getElementById("pedidos-container");
+  let grid = cont.querySelector(".grid");
+  if (!grid) {
+    cont.innerHTML = `<div class="grid"></div>`;
+    grid = cont.querySelector(".grid");
+  }
+  return grid;
+}
+
+// Lista completa (primera carga, botón Actualizar o cursor vencido)
+function renderPedidos(pedidos){
+  if (!pedidos || pedidos.length === 0) {
+    mostrarVacio();
+    pedidosMostrados.clear();
+    primeraCarga = false;
+    return;
+  }
+
+  // ── Detectar nuevos (sin sonar en primera carga) ──────────
+  const hayNuevo = pedidos.some(p => !pedidosMostrados.has(p.id));
+  if (!primeraCarga && hayNuevo) beep();
+
+  tarjetas.clear();
+  const grid = obtenerGrid();
+  grid.replaceChildren(...pedidos.map(crearTarjeta));
+  primeraCarga = false;
+}
+
+// Delta: solo se tocan las tarjetas afectadas
+function aplicarDelta(data){
+  for (const t of (data.eliminados || [])) {
+    const el = tarjetas.get(t.id);
+    if (el) el.remove();
+    tarjetas.delete(t.id);
+  }
+
+  let hayNuevo = false;
+  // vienen de más reciente a más antiguo: se insertan al revés para
+  // que el más reciente quede arriba
+  for (const p of [...(data.pedidos || [])].reverse()) {
+    const previo = tarjetas.get(p.id);
+    if (!pedidosMostrados.has(p.id)) hayNuevo = true;
+    const el = crearTarjeta(p);
+    if (previo) previo.replaceWith(el);
+    else obtenerGrid().prepend(el);
+  }
+  if (hayNuevo) beep();
+
+  if (tarjetas.size === 0 && !document.querySelector("#pedidos-container .empty-state")) {
+    mostrarVacio();
+  }
+}
+
+async function cargarPedidos(forzar = false) {
+  try {
+    const completo = cursor === null || forzar;
+    // La lista completa se revalida con su ETag (304 si nada cambió desde
+    // la última carga); los deltas dependen del cursor y no se cachean.
+    const res = completo
+      ? await fetch("/admin/pedidos.json", { cache: "no-cache" })
+      : await fetch(`/admin/pedidos.json?since=${cursor}`, { cache: "no-store" });
+    if (!res.ok) return;
+    const data = await res.json();
+    if (data.completo) renderPedidos(data.pedidos || []);
+    else aplicarDelta(data);
+    cursor = data.cursor;
+  } catch(e) {}
+}
+
+// ── Tiempo real: /events (SSE). El polling queda solo como respaldo ──
+let sseAbierto = false;
+
+function conectarEventos() {
+  if (!window.EventSource) return;
+  const es = new EventSource("/events");
+  es.addEventListener("pedido", () => cargarPedidos());
+  es.onopen  = () => { sseAbierto = true; cargarPedidos(); };
+  es.onerror = () => { sseAbierto = false; };  // EventSource reintenta solo
+}
+
+setSoundUI(false);
+cargarPedidos();
+conectarEventos();
+setInterval(() => { if (!sseAbierto) cargarPedidos(); }, 2500);
@@ -0,0 +1,22 @@
+function attachSearch(inputId, tableId, counterId, baseText){
+  const input   = document.getElementById(inputId);
+  const table   = document.getElementById(tableId);
+  const counter = document.getElementById(counterId);
+  if(!input || !table) return;
+
+  const rows  = Array.from(table.querySelectorAll("tbody tr"));
+  const total = rows.length;
+
+  function update(){
+    const q = (input.value || "").toLowerCase().trim();
+    let shown = 0;
+    rows.forEach(r => {
+      const ok = r.innerText.toLowerCase().includes(q);
+      r.style.display = ok ? "" : "none";
+      if(ok) shown++;
+    });
+    if(counter) counter.textContent = q ? `${shown} de ${total}` : baseText;
+  }
+
+  input.addEventListener("input", update);
+}
@@ -0,0 +1,115 @@
+// Cola offline del mesero (IndexedDB). La usan las páginas y el Service Worker.
+// Cada mutación lleva un id propio: /sync la aplica una sola vez aunque el
+// lote se reenvíe porque la respuesta se perdió con el Wi-Fi.
+
+const Cola = (() => {
+  const BD = "pos-mesero";
+  const ALMACEN = "cola";
+  const LOTE = 50;
+  const TAG_SYNC = "pos-cola";
+
+  let bd = null;
+  let enCurso = null;     // un solo envío a la vez; los demás lo esperan
+
+  function abrir() {
+    if (bd) return bd;
+    bd = new Promise((ok, falla) => {
+      const req = indexedDB.open(BD, 1);
+      req.onupgradeneeded = () => req.result.createObjectStore(ALMACEN, { keyPath: "seq", autoIncrement: true });
+      req.onsuccess = () => ok(req.result);
+      req.onerror = () => { bd = null; falla(req.error); };
+    });
+    return bd;
+  }
+
+  async function tx(modo, fn) {
+    const db = await abrir();
+    return new Promise((ok, falla) => {
+      const t = db.transaction(ALMACEN, modo);
+      const res = fn(t.objectStore(ALMACEN));
+      t.oncomplete = () => ok(res && "result" in res ? res.result : undefined);
+      t.onerror = () => falla(t.error);
+      t.onabort = () => falla(t.error);
+    });
+  }
+
+  function nuevoId() {
+    if (self.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + "-" + Math.random().toString(36).slice(2, 12);
+  }
+
+  async function agregar(mutacion) {
+    const m = Object.assign({ id: nuevoId(), creada: Date.now() }, mutacion);
+    await tx("readwrite", s => s.add(m));
+    return m;
+  }
+
+  function pendientes(limite) {
+    return tx("readonly", s => s.getAll(null, limite));
+  }
+
+  async function quitar(ids) {
+    const quitar = new Set(ids);
+    const lista = await pendientes();
+    await tx("readwrite", s => {
+      for (const m of lista) if (quitar.has(m.id)) s.delete(m.seq);
+    });
+  }
+
+  // Manda la cola por lotes hasta vaciarla. Devuelve la última respuesta
+  // de /sync (estado de mesas y pedidos) o lanza si no hubo red.
+  // ver: mesas cuyo pedido se quiere de vuelta aunque la cola esté vacía.
+  async function enviarTodo(ver) {
+    let respuesta = null;
+    let rechazadas = [];
+    for (;;) {
+      const lote = await pendientes(LOTE);
+      if (!lote.length && respuesta) break;
+      const res = await fetch("/sync", {
+        method: "POST",
+        credentials: "same-origin",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          mutaciones: lote.map(({ seq, creada, ...m }) => m),
+          ver: ver || [],
+        }),
+      });
+      if (res.redirected || res.status === 401 || res.status === 403) {
+        throw Object.assign(new Error("sesión"), { sesion: true });
+      }
+      if (!res.ok) throw new Error("sync " + res.status);
+      respuesta = await res.json();
+      rechazadas = rechazadas.concat(respuesta.rechazadas || []);
+      await quitar([...(respuesta.aplicadas || []), ...rechazadas.map(r => r.id)]);
+      if (lote.length < LOTE) break;
+    }
+    respuesta.rechazadas = rechazadas;
+    return respuesta;
+  }
+
+  function enviar(ver) {
+    if (!enCurso) {
+      enCurso = enviarTodo(ver).finally(() => { enCurso = null; });
+    }
+    return enCurso;
+  }
+
+  // Pide al navegador que vacíe la cola cuando vuelva la red, aunque la
+  // página ya no esté abierta (Background Sync; si no existe, no pasa nada).
+  async function programar() {
+    if (!self.navigator || !navigator.serviceWorker) return;
+    try {
+      const reg = await navigator.serviceWorker.ready;
+      if (reg.sync) await reg.sync.register(TAG_SYNC);
+    } catch (e) { /* sin Background Sync: reintenta la página */ }
+  }
+
+  // Solo desde las páginas: el Service Worker vive en /sw.js (alcance "/").
+  function registrar() {
+    if (self.navigator && navigator.serviceWorker) {
+      navigator.serviceWorker.register("/sw.js").catch(() => {});
+    }
+  }
+
+  return { agregar, pendientes, enviar, programar, registrar, nuevoId, TAG_SYNC };
+})();
@@ -0,0 +1,67 @@
+// Polling condicional: el servidor responde 304 (sin cuerpo) mientras la
+// versión del pedido no cambie; solo con una versión nueva se tocan las
+// filas que cambiaron.
+const tbody    = document.getElementById("lineas");
+const URL_JSON = tbody.dataset.url;
+const INTERVALO = 5000;
+let etag    = tbody.dataset.etag;
+let version = Number(tbody.dataset.version);
+let revisado = Date.now();
+
+const totalRow = tbody.querySelector(".total-row");
+const contador = document.getElementById("countdown");
+
+function cop(n){
+  return "$" + Math.round(n).toLocaleString("es-CO");
+}
+
+function fila(l){
+  const tr = document.createElement("tr");
+  tr.dataset.linea = l.id;
+  tr.innerHTML = '<td class="iname"></td><td class="right isub"></td><td class="right isub"></td>';
+  return tr;
+}
+
+function aplicar(data){
+  const vistas = new Set();
+  for (const l of data.lineas) {
+    vistas.add(String(l.id));
+    let tr = tbody.querySelector(`tr[data-linea="${l.id}"]`);
+    if (!tr) { tr = fila(l); tbody.insertBefore(tr, totalRow); }
+    const [nombre, cantidad, subtotal] = tr.children;
+    if (nombre.textContent   !== l.nombre)           nombre.textContent   = l.nombre;
+    if (cantidad.textContent !== String(l.cantidad)) cantidad.textContent = l.cantidad;
+    if (subtotal.textContent !== cop(l.subtotal))    subtotal.textContent = cop(l.subtotal);
+  }
+  for (const tr of tbody.querySelectorAll("tr[data-linea]")) {
+    if (!vistas.has(tr.dataset.linea)) tr.remove();
+  }
+  document.getElementById("total").textContent = cop(data.total);
+  if (data.estado !== "abierto") {
+    document.getElementById("tip").textContent = `🔒 Pedido ${data.estado}.`;
+  }
+  version = data.version;
+}
+
+async function revisar(){
+  try {
+    const res = await fetch(URL_JSON, { cache: "no-store", headers: { "If-None-Match": etag } });
+    if (res.status === 200) {
+      etag = res.headers.get("ETag") || etag;
+      const data = await res.json();
+      if (data.version !== version) aplicar(data);
+    }
+    if (res.ok || res.status === 304) revisado = Date.now();
+  } catch(e) {}
+}
+
+setInterval(() => {
+  if (!document.hidden) revisar();
+}, INTERVALO);
+document.addEventListener("visibilitychange", () => { if (!document.hidden) revisar(); });
+document.getElementById("actualizar").addEventListener("click", e => { e.preventDefault(); revisar(); });
+
+setInterval(() => {
+  const s = Math.round((Date.now() - revisado) / 1000);
+  contador.textContent = s < 2 ? "ahora" : `hace ${s}s`;
+}, 1000);
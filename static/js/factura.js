@@ -0,0 +1,62 @@
+const metodo = document.getElementById("metodo_pago");
+const recibido = document.getElementById("monto_recibido");
+
+if (metodo && recibido) {
+  metodo.addEventListener("change", () => {
+    if (metodo.value === "efectivo") {
+      recibido.style.display = "inline-block";
+      recibido.required = true;
+    } else {
+      recibido.style.display = "none";
+      recibido.required = false;
+      recibido.value = "";
+    }
+  });
+}
+
+// Estado de la factura en la cola de impresión (si se encoló al cobrar).
+const estadoImpresion = document.getElementById("estado-impresion");
+
+if (estadoImpresion) {
+  const TEXTOS = {
+    pendiente: "🖨️ Factura en cola de impresión…",
+    imprimiendo: "🖨️ Imprimiendo factura…",
+    impreso: "✅ Factura impresa",
+    error: "❌ No se pudo imprimir la factura",
+  };
+
+  function pintar(t) {
+    estadoImpresion.className = "msg-impresion " + t.estado;
+    let texto = TEXTOS[t.estado] || t.estado;
+    if (t.estado === "pendiente" && t.intentos > 0) texto += ` (reintento ${t.intentos}: ${t.error || ""})`;
+    estadoImpresion.textContent = texto;
+    if (t.estado === "error") {
+      const boton = document.createElement("button");
+      boton.type = "button";
+      boton.className = "btn amber";
+      boton.textContent = "Reintentar";
+      boton.addEventListener("click", reintentar);
+      estadoImpresion.appendChild(boton);
+    }
+  }
+
+  async function consultar() {
+    try {
+      const res = await fetch(estadoImpresion.dataset.url, { credentials: "same-origin" });
+      if (res.ok) {
+        const t = await res.json();
+        pintar(t);
+        if (t.estado === "impreso" || t.estado === "error") return;
+      }
+    } catch (e) { /* sin red: se vuelve a preguntar */ }
+    setTimeout(consultar, 1500);
+  }
+
+  async function reintentar() {
+    const res = await fetch(estadoImpresion.dataset.reintentar, { method: "POST", credentials: "same-origin" });
+    if (res.ok) pintar(await res.json());
+    setTimeout(consultar, 1500);
+  }
+
+  consultar();
+}
@@ -0,0 +1,18 @@
+// Mostrar/ocultar contraseña
+const toggle = document.getElementById("toggleShow");
+const pass = document.getElementById("password");
+toggle.addEventListener("click", () => {
+  const on = toggle.getAttribute("data-on") === "1";
+  toggle.setAttribute("data-on", on ? "0" : "1");
+  pass.type = on ? "password" : "text";
+});
+
+// Aviso Caps Lock
+const capsHint = document.getElementById("capsHint");
+pass.addEventListener("keyup", (e) => {
+  const caps = e.getModifierState && e.getModifierState("CapsLock");
+  capsHint.style.display = caps ? "block" : "none";
+});
+
+// Auto focus
+document.getElementById("username").focus();
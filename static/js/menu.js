@@ -79,13 +79,327 @@ document.getElementById("btn-limpiar")?.addEventListener("click", () => {
   calcular();
 });
 
-// Submit guard
-document.getElementById("pedido-form")?.addEventListener("submit", (e) => {
+// ── Envío por la cola offline (cola.js → /sync) ──────────────
+// El pedido se guarda primero en IndexedDB y luego se manda; si la red
+// falla queda en cola y se reintenta (y Background Sync lo manda aunque
+// se cierre la página). Sin IndexedDB, el form se envía como siempre.
+const formEl   = document.getElementById("pedido-form");
+const MESA_ID  = Number(formEl?.dataset.mesaId || 0);
+const colaEl   = document.getElementById("estado-cola");
+const pedidoEl = document.getElementById("pedido-actual");
+
+let esperaReintento = 0;
+let reintento = null;
+
+function esc(t) {
+  return String(t ?? "").replace(/[&<>"']/g, c => (
+    { "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;" }[c]
+  ));
+}
+
+function nombreProducto(id) {
+  const row = listaEl?.querySelector(`.item[data-id="${id}"]`);
+  return row?.querySelector(".item-name")?.textContent?.trim() || `Producto ${id}`;
+}
+
+function limpiarSeleccion() {
+  listaEl?.querySelectorAll("input.qval").forEach(i => i.value = "0");
+  calcular();
+  listaEl?.dispatchEvent(new Event("input"));   // badges de categoría
+}
+
+async function pintarPendientes(avisos) {
+  if (!colaEl) return;
+  let pendientes = [];
+  try {
+    pendientes = (await Cola.pendientes()).filter(m => m.mesa_id === MESA_ID);
+  } catch (e) { /* sin IndexedDB */ }
+
+  const partes = [];
+  if (pendientes.length) {
+    const signo = { sumar: "＋1", restar: "−1", eliminar: "🗑️" };
+    const cambio = c => c.eliminar ? "🗑️" : (c.delta > 0 ? `＋${c.delta}` : `−${-c.delta}`);
+    const lineas = pendientes.flatMap(m => m.tipo === "linea"
+      ? [`${signo[m.accion]} ${esc(nombreProducto(m.producto_id))}`]
+      : m.tipo === "lineas"
+      ? m.cambios.map(c => `${cambio(c)} ${esc(nombreProducto(c.producto_id))}`)
+      : Object.entries(m.items || {}).map(([id, q]) => `${q}× ${esc(nombreProducto(id))}`));
+    partes.push(`<b>⏳ ${pendientes.length} envío(s) en cola</b>` +
+      `<div class="note">${lineas.join(" • ")}</div>` +
+      `<div class="note">Se mandan solos cuando vuelva la conexión.</div>`);
+  }
+  for (const r of avisos || []) {
+    partes.push(`<b>⚠️ Un envío no se aplicó: ${esc(r.error)}</b>`);
+  }
+  colaEl.innerHTML = partes.join("");
+  colaEl.hidden = partes.length === 0;
+}
+
+// La tarjeta del pedido sale de los <template> de menu_pedido.html (los
+// mismos que pinta el servidor): aquí solo se clonan y se llenan.
+function filaPedido(d) {
+  const row = document.getElementById("tpl-fila").content.firstElementChild.cloneNode(true);
+  row.dataset.detalleId = d.id;
+  row.dataset.productoId = d.producto_id;
+  row.dataset.precio = d.precio;
+  row.querySelector(".item-name").textContent = d.nombre;
+  row.querySelector(".js-precio").textContent = moneyCOP(d.precio);
+  ponerCantidad(row, d.cantidad);
+  return row;
+}
+
+function tarjetaPedido(p) {
+  if (!p || !p.lineas.length) {
+    return document.getElementById("tpl-vacio").content.cloneNode(true);
+  }
+  const card = document.getElementById("tpl-pedido").content.cloneNode(true);
+  const comanda = card.querySelector(".js-comanda");
+  comanda.href = comanda.getAttribute("href").replace(/\/0$/, `/${p.id}`);
+  card.querySelector(".js-lineas").append(...p.lineas.map(filaPedido));
+  card.querySelector("#pedido-total").textContent = moneyCOP(p.total);
+  return card;
+}
+
+// La carta viene del caché de fragmentos (igual para todas las mesas):
+// lo que ya lleva el pedido se marca aquí, leyendo la tarjeta del pedido.
+function marcarEnPedido() {
+  const cantidades = new Map();
+  pedidoEl?.querySelectorAll(".detalle-row").forEach(row => {
+    cantidades.set(row.dataset.productoId, Number(row.querySelector(".ctrl-qty").textContent));
+  });
+  listaEl?.querySelectorAll(".item").forEach(row => {
+    const marca = row.querySelector(".en-pedido");
+    const n = cantidades.get(row.dataset.id);
+    if (marca) marca.textContent = n ? ` · ${n} en pedido` : "";
+  });
+}
+
+function pintarPedido(p) {
+  if (!pedidoEl) return;
+  pedidoEl.replaceChildren(tarjetaPedido(p));
+  pedidoEl.dataset.pedidoId = p ? p.id : "";
+  marcarEnPedido();
+  const titulo = document.getElementById("titulo-form");
+  if (titulo) titulo.textContent = p ? "➕ Agregar al pedido" : "➕ Nuevo pedido";
+}
+
+function aplicarEstado(estado) {
+  if (estado?.pedidos && String(MESA_ID) in estado.pedidos) {
+    pintarPedido(estado.pedidos[String(MESA_ID)]);
+  }
+  pintarPendientes((estado?.rechazadas || []).filter(r => r.id));
+}
+
+async function sincronizar() {
+  clearTimeout(reintento);
+  try {
+    aplicarEstado(await Cola.enviar([MESA_ID]));
+    esperaReintento = 0;
+  } catch (e) {
+    if (e.sesion) { location.href = "/"; return; }
+    esperaReintento = Math.min((esperaReintento || 1000) * 2, 30000);
+    reintento = setTimeout(sincronizar, esperaReintento);
+    Cola.programar();
+    pintarPendientes();
+  }
+}
+
+formEl?.addEventListener("submit", async (e) => {
+  e.preventDefault();
   const count = Number(document.getElementById("items-count")?.textContent || 0);
-  if (count <= 0) {
-    e.preventDefault();
+  if (count <= 0) return;
+
+  const items = {};
+  listaEl.querySelectorAll(".item").forEach(row => {
+    const qty = Number(row.querySelector("input.qval")?.value || 0);
+    if (qty > 0) items[row.dataset.id] = qty;
+  });
+  try {
+    await Cola.agregar({ tipo: "agregar", mesa_id: MESA_ID, items });
+  } catch (err) {
+    formEl.submit();            // sin IndexedDB: envío clásico
+    return;
   }
+  limpiarSeleccion();
+  await pintarPendientes();
+  sincronizar();
 });
 
+// ── Edición de líneas del pedido actual (JSON, sin recargar) ──
+// Cada toque ajusta la tarjeta al instante; los toques de EDICION_MS se
+// juntan en una sola petición a /pedido/<id>/lineas y la respuesta corrige
+// lo que haga falta. Sin red, el lote pasa a la cola offline con su id.
+const EDICION_MS = 300;
+let ediciones = new Map();    // detalle_id -> {delta | null (eliminar), producto_id}
+let edicionTimer = null;
+
+function filaDetalle(id) {
+  return pedidoEl?.querySelector(`.detalle-row[data-detalle-id="${id}"]`);
+}
+
+function ponerCantidad(row, cantidad) {
+  if (cantidad <= 0) { row.remove(); return; }
+  row.querySelector(".ctrl-qty").textContent = String(cantidad);
+  row.querySelector(".js-subtotal").textContent = moneyCOP(cantidad * Number(row.dataset.precio));
+}
+
+function totalLocal() {
+  let total = 0;
+  pedidoEl.querySelectorAll(".detalle-row").forEach(row => {
+    total += Number(row.dataset.precio) * Number(row.querySelector(".ctrl-qty").textContent);
+  });
+  return total;
+}
+
+function pintarTotal(total) {
+  const el = document.getElementById("pedido-total");
+  if (el) el.textContent = moneyCOP(total);
+}
+
+pedidoEl?.addEventListener("click", (e) => {
+  const boton = e.target.closest("[data-accion]");
+  const row = boton?.closest(".detalle-row");
+  if (!row) return;
+  const accion = boton.dataset.accion;
+  const nombre = row.querySelector(".item-name").textContent;
+  if (accion === "eliminar" && !confirm(`¿Eliminar ${nombre} del pedido?`)) return;
+
+  const id = Number(row.dataset.detalleId);
+  const previa = ediciones.get(id) || { delta: 0, producto_id: Number(row.dataset.productoId) };
+  const actual = Number(row.querySelector(".ctrl-qty").textContent);
+  if (accion === "eliminar" || previa.delta === null) {
+    previa.delta = null;
+    ponerCantidad(row, 0);
+  } else {
+    const d = accion === "sumar" ? 1 : -1;
+    previa.delta += d;
+    ponerCantidad(row, actual + d);
+  }
+  ediciones.set(id, previa);
+  pintarTotal(totalLocal());
+  marcarEnPedido();
+
+  clearTimeout(edicionTimer);
+  edicionTimer = setTimeout(enviarEdiciones, EDICION_MS);
+});
+
+async function enviarEdiciones() {
+  const lote = ediciones;
+  ediciones = new Map();
+  const pedidoId = pedidoEl.dataset.pedidoId;
+  if (!lote.size || !pedidoId) return;
+
+  // El mismo id viaja a /lineas y, si la petición falla, a la cola: si
+  // el servidor sí alcanzó a aplicarla, /sync la reconoce y no la repite.
+  const id = Cola.nuevoId();
+  const cambios = [...lote].map(([detalle, c]) => c.delta === null
+    ? { detalle_id: detalle, eliminar: true, producto_id: c.producto_id }
+    : { detalle_id: detalle, delta: c.delta, producto_id: c.producto_id });
+  try {
+    const res = await fetch(`/pedido/${pedidoId}/lineas`, {
+      method: "POST",
+      credentials: "same-origin",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ id, cambios }),
+    });
+    if (res.redirected || res.status === 401 || res.status === 403) { location.href = "/"; return; }
+    if (res.status === 404 || res.status === 409) { sincronizar(); return; }   // el pedido cambió: traer el real
+    if (!res.ok) throw new Error("lineas " + res.status);
+    aplicarEdicion(await res.json());
+  } catch (err) {
+    // Sin red (o sin respuesta): a la cola como una mutación "lineas" con
+    // el mismo id.
+    await Cola.agregar({ id, tipo: "lineas", mesa_id: MESA_ID, pedido_id: Number(pedidoId), cambios });
+    await pintarPendientes();
+    sincronizar();
+  }
+}
+
+function aplicarEdicion(r) {
+  if (r.estado !== "abierto") {
+    pintarPedido(null);
+    return;
+  }
+  // Las líneas con toques aún sin enviar conservan lo que ve el mesero.
+  for (const l of r.lineas) {
+    const row = filaDetalle(l.id);
+    if (row && !ediciones.has(l.id)) ponerCantidad(row, l.cantidad);
+  }
+  pintarTotal(ediciones.size ? totalLocal() : r.total);
+  marcarEnPedido();
+}
+
 // Inicializar
-calcular();
\ No newline at end of file
+calcular();
+marcarEnPedido();
+
+if (typeof Cola !== "undefined" && MESA_ID) {
+  Cola.registrar();
+  window.addEventListener("online", sincronizar);
+  navigator.serviceWorker?.addEventListener("message", (e) => {
+    if (e.data?.tipo === "sync") aplicarEstado(e.data.estado);
+  });
+  // Pendientes de antes, o página servida desde la copia del Service
+  // Worker (generada hace rato): traer el estado real de la mesa.
+  const generado = Number(formEl.dataset.generado || 0);
+  Cola.pendientes().then(lista => {
+    if (lista.length || Math.abs(Date.now() - generado) > 15000) sincronizar();
+    else pintarPendientes();
+  }).catch(() => {});
+}
+
+// ── Acordeón ──────────────────────────────────────────────
+document.querySelectorAll(".cat-header").forEach(header => {
+  header.addEventListener("click", () => {
+    const idx   = header.dataset.cat;
+    // busca el body y arrow dentro del mismo menu-card padre
+    const card  = header.closest(".menu-card");
+    const body  = card.querySelector(".cat-body");
+    const arrow = card.querySelector(".cat-arrow");
+
+    const isOpen = body.classList.contains("open");
+    body.classList.toggle("open", !isOpen);
+    arrow.classList.toggle("open", !isOpen);
+  });
+});
+
+// ── Badge por categoría: muestra cuántos items tienen qty > 0 ──
+// Se ejecuta cada vez que calcular() en menu.js actualiza los inputs
+// Sobreescribimos calcular para agregar el badge update
+document.addEventListener("DOMContentLoaded", () => {
+  // Espera a que menu.js cargue y defina calcular,
+  // luego parchamos los eventos de qty para actualizar badges
+  document.getElementById("lista-productos")
+    .addEventListener("input", actualizarBadges);
+
+  // También al hacer click en + / -
+  document.getElementById("lista-productos")
+    .addEventListener("click", () => {
+      // pequeño delay para que el input ya tenga el valor nuevo
+      setTimeout(actualizarBadges, 10);
+    });
+
+  // Al limpiar
+  document.getElementById("btn-limpiar")
+    ?.addEventListener("click", () => setTimeout(actualizarBadges, 10));
+});
+
+function actualizarBadges() {
+  document.querySelectorAll(".cat-body").forEach(body => {
+    const badgeId = body.dataset.badge;
+    const badge   = document.getElementById(badgeId);
+    if (!badge) return;
+
+    let total = 0;
+    body.querySelectorAll("input.qval").forEach(input => {
+      total += Number(input.value || 0);
+    });
+
+    if (total > 0) {
+      badge.textContent = total;
+      badge.classList.remove("hidden");
+    } else {
+      badge.classList.add("hidden");
+    }
+  });
+}
@@ -1,4 +1,5 @@
 let estadoPrevio = new Map(); // mesa_id -> estado
+let etagMesas = null;          // ETag de la última respuesta (304 = sin cambios)
 
 function showToast(msg){
   const t = document.getElementById("toast");
@@ -8,10 +9,44 @@ function showToast(msg){
   setTimeout(()=>t.classList.remove("show"), 1400);
 }
 
+function htmlMesa(m){
+  const estado = (m.estado || "libre").toLowerCase();
+  const pillClass = estado === "ocupada" ? "ocupada" : "libre";
+  const label = estado === "ocupada" ? "Ocupada" : "Libre";
+
+  return `
+    <div class="card" data-id="${m.id}" data-estado="${estado}">
+      <a href="/mesa/${m.id}">
+        <div class="num">Mesa ${m.numero}</div>
+        <div class="meta">
+          <span class="pill ${pillClass}">
+            <span class="dot"></span>
+            ${label}
+          </span>
+          <span class="small">Tap para abrir</span>
+        </div>
+      </a>
+    </div>
+  `;
+}
+
+// detectar cambios de estado y avisar
+function avisarCambio(m){
+  const prev = estadoPrevio.get(m.id);
+  const now = (m.estado || "libre").toLowerCase();
+  if(prev && prev !== now){
+    showToast(`Mesa ${m.numero}: ${prev} → ${now}`);
+  }
+  estadoPrevio.set(m.id, now);
+}
+
 async function refrescarMesas(){
   try{
-    const res = await fetch("/mesas.json", { cache: "no-store" });
+    const headers = etagMesas ? { "If-None-Match": etagMesas } : {};
+    const res = await fetch("/mesas.json", { cache: "no-store", headers });
+    if(res.status === 304) return;
     if(!res.ok) return;
+    etagMesas = res.headers.get("ETag");
 
     const data = await res.json();
     const mesas = data.mesas || [];
@@ -19,42 +54,66 @@ async function refrescarMesas(){
     const grid = document.getElementById("grid-mesas");
     if(!grid) return;
 
-    // construir HTML
-    grid.innerHTML = mesas.map(m => {
-      const estado = (m.estado || "libre").toLowerCase();
-      const pillClass = estado === "ocupada" ? "ocupada" : "libre";
-      const label = estado === "ocupada" ? "Ocupada" : "Libre";
-
-      return `
-        <div class="card" data-id="${m.id}" data-estado="${estado}">
-          <a href="/mesa/${m.id}">
-            <div class="num">Mesa ${m.numero}</div>
-            <div class="meta">
-              <span class="pill ${pillClass}">
-                <span class="dot"></span>
-                ${label}
-              </span>
-              <span class="small">Tap para abrir</span>
-            </div>
-          </a>
-        </div>
-      `;
-    }).join("");
-
-    // detectar cambios de estado y avisar
-    for(const m of mesas){
-      const prev = estadoPrevio.get(m.id);
-      const now = (m.estado || "libre").toLowerCase();
-      if(prev && prev !== now){
-        showToast(`Mesa ${m.numero}: ${prev} → ${now}`);
-      }
-      estadoPrevio.set(m.id, now);
-    }
+    grid.innerHTML = mesas.map(htmlMesa).join("");
+
+    for(const m of mesas) avisarCambio(m);
 
   }catch(e){
     console.log("Error refrescando mesas", e);
   }
 }
 
+// ── Tiempo real: /events (SSE). El polling queda solo como respaldo ──
+let sseAbierto = false;
+
+function aplicarEventoMesa(ev){
+  const m = JSON.parse(ev.data);
+  const card = document.querySelector(`#grid-mesas .card[data-id="${m.id}"]`);
+  if(!card){ refrescarMesas(); return; }
+  card.outerHTML = htmlMesa(m);
+  avisarCambio(m);
+}
+
+function conectarEventos(){
+  if(!window.EventSource) return;
+  const es = new EventSource("/events");
+  es.addEventListener("mesa", aplicarEventoMesa);
+  es.onopen  = () => { sseAbierto = true; refrescarMesas(); };
+  es.onerror = () => { sseAbierto = false; }; // EventSource reintenta solo
+}
+
+// ── Cola offline (cola.js): si quedaron envíos de una mesa, se mandan
+// desde aquí también; la respuesta trae el estado de todas las mesas ──
+let esperaCola = 0;
+
+async function vaciarCola(){
+  try{
+    if(!(await Cola.pendientes()).length) return;
+    const estado = await Cola.enviar();
+    esperaCola = 0;
+    const grid = document.getElementById("grid-mesas");
+    if(grid && estado.mesas){
+      grid.innerHTML = estado.mesas.map(htmlMesa).join("");
+      for(const m of estado.mesas) avisarCambio(m);
+    }
+    showToast("Envíos pendientes enviados ✅");
+  }catch(e){
+    if(e.sesion){ location.href = "/"; return; }
+    esperaCola = Math.min((esperaCola || 1000) * 2, 30000);
+    setTimeout(vaciarCola, esperaCola);
+    Cola.programar();
+  }
+}
+
+if(typeof Cola !== "undefined"){
+  Cola.registrar();
+  window.addEventListener("online", vaciarCola);
+  vaciarCola();
+  // Pasa por el Service Worker: guarda la carta y, si cambió su versión,
+  // descarta las copias viejas del menú.
+  fetch("/catalogo.json").catch(() => {});
+}
+
 refrescarMesas();
-setInterval(refrescarMesas, 2500);
+conectarEventos();
+setInterval(() => { if(!sseAbierto) refrescarMesas(); }, 2500);
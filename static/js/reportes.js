@@ -0,0 +1,18 @@
+(function(){
+  const input   = document.getElementById("qProductos");
+  const table   = document.getElementById("tablaProductos");
+  const counter = document.getElementById("countProductos");
+  if(!input || !table) return;
+  const rows  = Array.from(table.querySelectorAll("tbody tr"));
+  const base  = counter.textContent;
+  input.addEventListener("input", () => {
+    const q = (input.value || "").toLowerCase().trim();
+    let shown = 0;
+    rows.forEach(r => {
+      const ok = r.innerText.toLowerCase().includes(q);
+      r.style.display = ok ? "" : "none";
+      if(ok) shown++;
+    });
+    counter.textContent = q ? `${shown} de ${rows.length}` : base;
+  });
+})();
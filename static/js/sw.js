@@ -0,0 +1,98 @@
+// Service Worker del mesero: mantiene usables /mesas y /mesa/<id> cuando el
+// Wi-Fi se cae y vacía la cola offline (cola.js) al volver la red.
+//
+//   /assets/*           caché primero: el nombre lleva el hash del contenido
+//   /static/*           red primero (sin huella: pueden cambiar con el despliegue)
+//   /mesas, /mesa/<id>  red primero con tope de espera; si no llega, la copia
+//   /catalogo.json,     guardada. Las copias del menú se descartan cuando
+//   /mesas.json         cambia la versión del catálogo (precios viejos).
+
+importScripts("/static/js/cola.js");
+
+const VERSION = "pos-v2";
+const ESTATICOS = `${VERSION}-estaticos`;
+const PAGINAS = `${VERSION}-paginas`;
+const ESPERA_RED_MS = 4000;
+
+// Sin precarga: los nombres con huella solo los conocen las páginas; cada
+// archivo queda guardado la primera vez que una página lo pide.
+self.addEventListener("install", () => self.skipWaiting());
+
+self.addEventListener("activate", (e) => {
+  e.waitUntil((async () => {
+    for (const nombre of await caches.keys()) {
+      if (!nombre.startsWith(VERSION)) await caches.delete(nombre);
+    }
+    await self.clients.claim();
+  })());
+});
+
+function conTope(promesa, ms) {
+  return new Promise((ok, falla) => {
+    const t = setTimeout(() => falla(new Error("tope")), ms);
+    promesa.then(r => { clearTimeout(t); ok(r); }, e => { clearTimeout(t); falla(e); });
+  });
+}
+
+async function cacheEstatico(req) {
+  const guardada = await caches.match(req);
+  if (guardada) return guardada;
+  const res = await fetch(req);
+  if (res.ok) (await caches.open(ESTATICOS)).put(req, res.clone());
+  return res;
+}
+
+// Si cambió la versión del catálogo, las copias del menú tienen precios viejos.
+async function revisarCatalogo(res, cache) {
+  const previa = await cache.match("/catalogo.json");
+  if (!previa) return;
+  const [nueva, vieja] = await Promise.all([res.clone().json(), previa.json()]);
+  if (nueva.version === vieja.version) return;
+  for (const req of await cache.keys()) {
+    if (new URL(req.url).pathname.startsWith("/mesa/")) await cache.delete(req);
+  }
+}
+
+async function redPrimero(req, nombreCache = PAGINAS) {
+  const cache = await caches.open(nombreCache);
+  const red = fetch(req).then(async (res) => {
+    // Solo respuestas completas y de la misma URL (no el login tras una redirección).
+    if (res.status === 200 && !res.redirected) {
+      if (new URL(req.url).pathname === "/catalogo.json") await revisarCatalogo(res, cache);
+      await cache.put(req.url, res.clone());
+    }
+    return res;
+  });
+  try {
+    return await conTope(red, ESPERA_RED_MS);
+  } catch (e) {
+    const guardada = await cache.match(req.url);
+    if (guardada) return guardada;
+    return red;   // sin copia: esperar a la red es lo único que queda
+  }
+}
+
+self.addEventListener("fetch", (e) => {
+  const req = e.request;
+  if (req.method !== "GET") return;
+  const url = new URL(req.url);
+  if (url.origin !== self.location.origin) return;
+
+  if (url.pathname.startsWith("/assets/")) {
+    e.respondWith(cacheEstatico(req));
+  } else if (url.pathname.startsWith("/static/")) {
+    e.respondWith(redPrimero(req, ESTATICOS));
+  } else if (url.pathname === "/mesas" || /^\/mesa\/\d+$/.test(url.pathname)
+             || url.pathname === "/catalogo.json" || url.pathname === "/mesas.json") {
+    e.respondWith(redPrimero(req));
+  }
+});
+
+// Background Sync: la red volvió aunque la página esté cerrada o dormida.
+self.addEventListener("sync", (e) => {
+  if (e.tag !== Cola.TAG_SYNC) return;
+  e.waitUntil((async () => {
+    const estado = await Cola.enviar();
+    for (const c of await self.clients.matchAll()) c.postMessage({ tipo: "sync", estado });
+  })());
+});
@@ -0,0 +1,85 @@
+"""
+Fixtures compartidas: una BD SQLite temporal por corrida de pytest, con el
+esquema y los datos base de ini_db (admin/mesero, mesas, carta).
+
+DATABASE_URL se fija antes de importar app: el módulo arma la app (y su
+engine) al importarse con la URL del entorno.
+"""
+import os
+import tempfile
+
+import pytest
+
+DIRECTORIO = tempfile.mkdtemp(prefix="pos-tests-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(DIRECTORIO, "pos.db")
+os.environ["IMPRESORAS"] = ""          # sin impresoras: la factura va al navegador
+
+from sqlalchemy import func, select    # noqa: E402
+
+from app import app as aplicacion      # noqa: E402
+from extensions import db              # noqa: E402
+from models import Mesa, Producto      # noqa: E402
+import ini_db                          # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    aplicacion.config["TESTING"] = True
+    with aplicacion.app_context():
+        ini_db.inicializar()
+    return aplicacion
+
+
+def entrar(app, usuario, clave):
+    """Test client con la sesión ya iniciada."""
+    cliente = app.test_client()
+    r = cliente.post("/", data={"username": usuario, "password": clave})
+    assert r.status_code == 302, r.status_code
+    return cliente
+
+
+@pytest.fixture
+def mesero(app):
+    return entrar(app, "mesero", "mesero123")
+
+
+@pytest.fixture
+def admin(app):
+    return entrar(app, "admin", "admin123")
+
+
+@pytest.fixture
+def mesa(app):
+    """Una mesa nueva y libre por prueba: ninguna hereda pedidos de otra."""
+    with app.app_context():
+        numero = (db.session.execute(select(func.max(Mesa.numero))).scalar() or 0) + 1
+        m = Mesa(numero=numero, estado="libre")
+        db.session.add(m)
+        db.session.commit()
+        return m.id
+
+
+@pytest.fixture
+def productos(app):
+    """{id: precio} de tres productos activos de la carta base."""
+    with app.app_context():
+        filas = db.session.execute(
+            select(Producto.id, Producto.precio)
+            .where(Producto.activo.is_(True))
+            .order_by(Producto.id)
+            .limit(3)
+        ).all()
+    return {pid: precio for pid, precio in filas}
+
+
+def sincronizar(cliente, mesa, *mutaciones):
+    """POST /sync con el lote dado, pidiendo de vuelta el pedido de la mesa."""
+    r = cliente.post("/sync", json={"mutaciones": list(mutaciones), "ver": [mesa]})
+    assert r.status_code == 200, r.data
+    return r.json
+
+
+def agregar(mid, mesa, items):
+    """Mutación "agregar" de la cola offline: {producto_id: cantidad}."""
+    return {"id": mid, "tipo": "agregar", "mesa_id": mesa,
+            "items": {str(k): v for k, v in items.items()}}
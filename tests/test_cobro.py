@@ -0,0 +1,94 @@
+"""
+Cobros simultáneos del mismo pedido: el pedido se cierra una vez y la caja
+(venta_dia) lo suma una sola vez. Las demás peticiones, y las que llegan
+sobre un pedido que ya no está abierto, reciben 409.
+"""
+import threading
+
+from sqlalchemy import func, select
+
+from conftest import entrar
+from extensions import db
+from models import Mesa, Pedido, VentaDia
+
+HILOS = 4
+
+
+def _abrir(mesero, mesa, productos):
+    pid = next(iter(productos))
+    r = mesero.post("/sync", json={
+        "mutaciones": [{"id": f"cobro-{mesa}", "tipo": "agregar", "mesa_id": mesa, "items": {str(pid): 2}}],
+        "ver": [mesa],
+    })
+    return r.json["pedidos"][str(mesa)]
+
+
+def _ventas(app):
+    with app.app_context():
+        return db.session.execute(select(func.coalesce(func.sum(VentaDia.ventas), 0))).scalar()
+
+
+def _a_la_vez(app, url, datos=None):
+    clientes = [entrar(app, "admin", "admin123") for _ in range(HILOS)]
+    estados = []
+    hilos = [threading.Thread(target=lambda c=c: estados.append(c.post(url, data=datos).status_code))
+             for c in clientes]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return estados
+
+
+def test_cobro_concurrente_suma_una_vez(app, mesero, mesa, productos):
+    pedido = _abrir(mesero, mesa, productos)
+    antes = _ventas(app)
+
+    estados = _a_la_vez(app, f"/admin/pedido/{pedido['id']}/cobrar", {"metodo_pago": "tarjeta"})
+
+    assert sorted(estados) == [302] + [409] * (HILOS - 1)
+    assert _ventas(app) - antes == pedido["total"]
+    with app.app_context():
+        cerrado = db.session.get(Pedido, pedido["id"])
+        assert cerrado.estado == "cerrado"
+        assert cerrado.monto_recibido == pedido["total"]
+        assert db.session.get(Mesa, mesa).estado == "libre"
+
+
+def test_cerrar_concurrente_suma_una_vez(app, mesero, mesa, productos):
+    pedido = _abrir(mesero, mesa, productos)
+    antes = _ventas(app)
+
+    estados = _a_la_vez(app, f"/admin/pedido/{pedido['id']}/cerrar")
+
+    assert sorted(estados) == [302] + [409] * (HILOS - 1)
+    assert _ventas(app) - antes == pedido["total"]
+
+
+def test_pedido_cancelado_no_se_cobra(app, admin, mesero, mesa, productos):
+    pedido = _abrir(mesero, mesa, productos)
+    linea = pedido["lineas"][0]["id"]
+    r = mesero.post(f"/pedido/{pedido['id']}/lineas", json={
+        "id": f"vaciar-{mesa}", "cambios": [{"detalle_id": linea, "eliminar": True}],
+    })
+    assert r.json["estado"] == "cancelado"
+    antes = _ventas(app)
+
+    assert admin.post(f"/admin/pedido/{pedido['id']}/cobrar",
+                      data={"metodo_pago": "tarjeta"}).status_code == 409
+    assert admin.post(f"/admin/pedido/{pedido['id']}/cerrar").status_code == 409
+
+    assert _ventas(app) == antes
+    with app.app_context():
+        assert db.session.get(Pedido, pedido["id"]).estado == "cancelado"
+
+
+def test_cobro_insuficiente_no_cierra(app, admin, mesero, mesa, productos):
+    pedido = _abrir(mesero, mesa, productos)
+
+    r = admin.post(f"/admin/pedido/{pedido['id']}/cobrar",
+                   data={"metodo_pago": "efectivo", "monto_recibido": "1"})
+
+    assert "pago_insuficiente" in r.headers["Location"]
+    with app.app_context():
+        assert db.session.get(Pedido, pedido["id"]).estado == "abierto"
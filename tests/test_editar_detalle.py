@@ -0,0 +1,43 @@
+"""
+Ruta de formulario /pedido/<id>/detalle/<id>/editar: bloquea la mesa y
+solo toca pedidos abiertos.
+"""
+import threading
+
+from conftest import agregar, entrar, sincronizar
+from extensions import db
+from models import Mesa, Pedido
+
+
+def _pedido(mesero, mesa, productos):
+    pid = next(iter(productos))
+    return sincronizar(mesero, mesa, agregar(f"det-{mesa}", mesa, {pid: 2}))["pedidos"][str(mesa)]
+
+
+def test_eliminar_concurrente_cancela_una_vez(app, mesero, mesa, productos):
+    pedido = _pedido(mesero, mesa, productos)
+    url = f"/pedido/{pedido['id']}/detalle/{pedido['lineas'][0]['id']}/editar"
+    clientes = [entrar(app, "mesero", "mesero123") for _ in range(4)]
+    estados = []
+    hilos = [threading.Thread(target=lambda c=c: estados.append(
+        c.post(url, data={"accion": "eliminar"}).status_code)) for c in clientes]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert 500 not in estados
+    with app.app_context():
+        assert db.session.get(Pedido, pedido["id"]).estado == "cancelado"
+        assert db.session.get(Mesa, mesa).estado == "libre"
+
+
+def test_pedido_cobrado_da_409(app, admin, mesero, mesa, productos):
+    pedido = _pedido(mesero, mesa, productos)
+    url = f"/pedido/{pedido['id']}/detalle/{pedido['lineas'][0]['id']}/editar"
+    assert admin.post(f"/admin/pedido/{pedido['id']}/cobrar",
+                      data={"metodo_pago": "tarjeta"}).status_code == 302
+
+    assert mesero.post(url, data={"accion": "sumar"}).status_code == 409
+    with app.app_context():
+        assert db.session.get(Pedido, pedido["id"]).items == 2
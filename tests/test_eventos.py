@@ -0,0 +1,66 @@
+"""
+Cursor de eventos: los ids se asignan al confirmar, así que un lector que
+avanza con "id > último visto" nunca salta un evento confirmado tarde.
+"""
+import threading
+
+from sqlalchemy import select
+
+from extensions import db
+from models import Evento
+import eventos
+
+
+def _ids_desde(desde):
+    return db.session.execute(
+        select(Evento.id).where(Evento.id > desde).order_by(Evento.id)
+    ).scalars().all()
+
+
+def test_id_en_orden_de_commit(app):
+    with app.app_context():
+        inicio = eventos.ultimo_id()
+        # A publica primero pero confirma después que B.
+        eventos.publicar("prueba", quien="A")
+        with app.app_context():               # otra sesión (otro contexto)
+            eventos.publicar("prueba", quien="B")
+            db.session.commit()
+            id_b = eventos.ultimo_id()
+        # Un lector que ya vio B no debe perderse A.
+        db.session.commit()
+        id_a = eventos.ultimo_id()
+
+        assert id_a > id_b > inicio
+        assert _ids_desde(id_b) == [id_a]
+
+
+def test_ids_sin_huecos_con_escritores_concurrentes(app):
+    with app.app_context():
+        inicio = eventos.ultimo_id()
+
+    def publicar(n):
+        with app.app_context():
+            for i in range(n):
+                eventos.publicar("prueba", i=i)
+                db.session.commit()
+
+    hilos = [threading.Thread(target=publicar, args=(10,)) for _ in range(4)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    with app.app_context():
+        assert _ids_desde(inicio) == list(range(inicio + 1, inicio + 41))
+
+
+def test_rollback_no_consume_ids(app):
+    with app.app_context():
+        inicio = eventos.ultimo_id()
+        eventos.publicar("prueba", quien="descartado")
+        db.session.rollback()
+        eventos.publicar("prueba", quien="confirmado")
+        db.session.commit()
+
+        assert _ids_desde(inicio) == [inicio + 1]
+
@@ -0,0 +1,57 @@
+"""
+Ediciones de línea por /pedido/<id>/lineas: la misma edición (mismo id)
+se aplica una sola vez, llegue por /lineas, por /sync o por ambos.
+"""
+from conftest import agregar, sincronizar
+
+
+def _pedido(mesero, mesa, productos):
+    pid = next(iter(productos))
+    return sincronizar(mesero, mesa, agregar(f"base-{mesa}", mesa, {pid: 1}))["pedidos"][str(mesa)]
+
+
+def test_lineas_repetido_no_duplica(mesero, mesa, productos):
+    pedido = _pedido(mesero, mesa, productos)
+    detalle = pedido["lineas"][0]["id"]
+    cuerpo = {"id": f"ed-{mesa}", "cambios": [{"detalle_id": detalle, "delta": 2}]}
+
+    r1 = mesero.post(f"/pedido/{pedido['id']}/lineas", json=cuerpo)
+    r2 = mesero.post(f"/pedido/{pedido['id']}/lineas", json=cuerpo)
+
+    assert r1.status_code == r2.status_code == 200
+    assert r1.json["items"] == r2.json["items"] == 3
+    assert r2.json.get("repetida") is True
+
+
+def test_lineas_reenviada_por_sync(mesero, mesa, productos):
+    """El fetch aplicó la edición pero su respuesta se perdió: va a la cola con el mismo id."""
+    pedido = _pedido(mesero, mesa, productos)
+    cambios = [{"detalle_id": pedido["lineas"][0]["id"], "delta": 1}]
+
+    assert mesero.post(f"/pedido/{pedido['id']}/lineas",
+                       json={"id": f"ed-{mesa}", "cambios": cambios}).status_code == 200
+    repetida = {"id": f"ed-{mesa}", "tipo": "lineas", "mesa_id": mesa,
+                "pedido_id": pedido["id"], "cambios": cambios}
+    nueva = dict(repetida, id=f"ed2-{mesa}")
+
+    assert sincronizar(mesero, mesa, repetida)["pedidos"][str(mesa)]["items"] == 2
+    assert sincronizar(mesero, mesa, nueva)["pedidos"][str(mesa)]["items"] == 3
+
+
+def test_lineas_id_invalido(mesero, mesa, productos):
+    pedido = _pedido(mesero, mesa, productos)
+    cambios = [{"detalle_id": pedido["lineas"][0]["id"], "delta": 1}]
+
+    r = mesero.post(f"/pedido/{pedido['id']}/lineas", json={"id": "x" * 41, "cambios": cambios})
+    assert r.status_code == 400
+
+
+def test_menu_edita_por_lineas(app, mesero, mesa, productos):
+    """La tarjeta del pedido no postea a la ruta de formulario: menu.js usa /lineas."""
+    pedido = _pedido(mesero, mesa, productos)
+
+    html = mesero.get(f"/mesa/{mesa}").get_data(as_text=True)
+
+    assert f'data-detalle-id="{pedido["lineas"][0]["id"]}"' in html
+    assert 'id="tpl-fila"' in html
+    assert "/detalle/" not in html
@@ -0,0 +1,144 @@
+"""
+Una BD con el esquema original (antes de migraciones.py) se lleva al
+esquema actual una migración a la vez, revisando los datos en cada paso.
+"""
+import sqlite3
+
+import pytest
+from sqlalchemy import func, inspect, select, text
+
+import app as modulo_app
+from extensions import db
+import ini_db
+import migraciones
+
+# Esquema y datos de la BD de producción antes de la primera migración.
+BASE = """
+CREATE TABLE user (
+    id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, password_hash VARCHAR(200) NOT NULL,
+    role VARCHAR(20) NOT NULL, activo BOOLEAN, PRIMARY KEY (id), UNIQUE (username)
+);
+CREATE TABLE mesa (
+    id INTEGER NOT NULL, numero INTEGER NOT NULL, estado VARCHAR(20), PRIMARY KEY (id), UNIQUE (numero)
+);
+CREATE TABLE producto (
+    id INTEGER NOT NULL, nombre VARCHAR(100) NOT NULL, precio FLOAT NOT NULL, activo BOOLEAN,
+    categoria VARCHAR(50), PRIMARY KEY (id)
+);
+CREATE TABLE pedido (
+    id INTEGER NOT NULL, mesa_id INTEGER NOT NULL, mesero_id INTEGER NOT NULL, estado VARCHAR(20),
+    fecha DATETIME, metodo_pago VARCHAR(20), monto_recibido FLOAT, cambio FLOAT, fecha_cierre DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(mesa_id) REFERENCES mesa (id), FOREIGN KEY(mesero_id) REFERENCES user (id)
+);
+CREATE TABLE pedido_detalle (
+    id INTEGER NOT NULL, pedido_id INTEGER NOT NULL, producto_id INTEGER NOT NULL, cantidad INTEGER,
+    PRIMARY KEY (id), FOREIGN KEY(pedido_id) REFERENCES pedido (id),
+    FOREIGN KEY(producto_id) REFERENCES producto (id)
+);
+INSERT INTO user VALUES (1, 'admin', 'x', 'admin', 1), (2, 'mesero', 'x', 'mesero', NULL);
+INSERT INTO mesa VALUES (1, 1, 'libre'), (2, 2, 'ocupada'), (3, 3, 'libre');
+INSERT INTO producto VALUES (1, 'Arroz', 3999.6, 1, 'porciones'), (2, 'Gaseosa', 5000.0, 1, 'bebidas frías');
+INSERT INTO pedido VALUES
+    (1, 1, 2, 'cerrado',   '2024-05-01 12:00:00', 'efectivo', 20000.0, 1000.8, '2024-05-01 12:30:00'),
+    (2, 2, 2, 'abierto',   '2024-05-02 12:00:00', NULL, NULL, NULL, NULL),
+    (3, 2, 2, 'abierto',   '2024-05-02 12:05:00', NULL, NULL, NULL, NULL),
+    (4, 3, 2, 'cancelado', '2024-05-03 12:00:00', NULL, NULL, NULL, NULL);
+INSERT INTO pedido_detalle VALUES
+    (1, 1, 1, 2), (2, 1, 1, 1), (3, 1, 2, 1),
+    (4, 2, 1, 1),
+    (5, 3, 1, 2), (6, 3, 2, 1),
+    (7, 4, 2, 1);
+"""
+UNIDADES = 9
+
+
+def _uno(sql):
+    return db.session.execute(text(sql)).scalar()
+
+
+def _tipo(tabla, columna):
+    return next(str(c["type"]) for c in inspect(db.engine).get_columns(tabla) if c["name"] == columna)
+
+
+def _m001():
+    assert _uno('SELECT COUNT(*) FROM "user" WHERE activo IS NULL') == 0
+
+
+def _m002():
+    # Las dos líneas de arroz del pedido 1 quedan en una.
+    assert _uno("SELECT cantidad FROM pedido_detalle WHERE pedido_id = 1 AND producto_id = 1") == 3
+    assert _uno("SELECT COUNT(*) FROM pedido_detalle WHERE pedido_id = 1") == 2
+
+
+def _m003():
+    assert _uno("SELECT total FROM pedido WHERE id = 1") == pytest.approx(3 * 3999.6 + 5000)
+    assert _uno("SELECT items FROM pedido WHERE id = 1") == 4
+
+
+def _m004():
+    for tabla, columnas in migraciones._DINERO.items():
+        for columna in columnas:
+            assert _tipo(tabla, columna) == "INTEGER", (tabla, columna)
+    assert _uno("SELECT precio FROM producto WHERE id = 1") == 4000
+    assert _uno("SELECT cambio FROM pedido WHERE id = 1") == 1001
+
+
+def _m005():
+    assert _uno("SELECT fecha_cierre FROM pedido WHERE id = 4") is not None
+
+
+def _m006():
+    assert _uno("SELECT SUM(version) FROM pedido") == 0
+
+
+def _m007():
+    # Los dos abiertos de la mesa 2 se fusionan en el más reciente.
+    assert _uno("SELECT estado FROM pedido WHERE id = 2") == "cancelado"
+    assert _uno("SELECT items FROM pedido WHERE id = 3") == 4
+    assert _uno("SELECT total FROM pedido WHERE id = 3") == 3 * 4000 + 5000
+
+
+REVISIONES = {1: _m001, 2: _m002, 3: _m003, 4: _m004, 5: _m005, 6: _m006, 7: _m007}
+
+
+@pytest.fixture
+def app_base(app, tmp_path, monkeypatch):
+    """Otra app sobre una copia del esquema original (pide `app` para no armarse primero)."""
+    ruta = tmp_path / "base.db"
+    with sqlite3.connect(ruta) as conn:
+        conn.executescript(BASE)
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{ruta}")
+    base = modulo_app.create_app()
+    with base.app_context():
+        yield base
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_revisiones_cubren_todas_las_migraciones():
+    assert sorted(REVISIONES) == [m[0] for m in migraciones.MIGRACIONES]
+
+
+def test_migrar_base_paso_a_paso(app_base):
+    db.create_all()
+    assert migraciones.version_actual() == 0
+
+    for version, _, _ in migraciones.MIGRACIONES:
+        assert migraciones.aplicar(hasta=version) == 1
+        assert migraciones.version_actual() == version
+        REVISIONES[version]()
+        # Ningún paso pierde pedidos ni unidades.
+        assert _uno("SELECT COUNT(*) FROM pedido") == 4
+        assert _uno("SELECT SUM(cantidad) FROM pedido_detalle") == UNIDADES
+
+    assert migraciones.aplicar() == 0
+
+
+def test_init_db_sobre_base(app_base):
+    ini_db.inicializar()
+
+    assert migraciones.version_actual() == migraciones.MIGRACIONES[-1][0]
+    assert _uno("SELECT SUM(ventas) FROM venta_dia") == 3 * 4000 + 5000
+    # Un segundo init-db no cambia nada.
+    ini_db.inicializar()
+    assert db.session.execute(select(func.count()).select_from(db.metadata.tables["pedido"])).scalar() == 4
@@ -0,0 +1,31 @@
+"""
+/admin/pedidos.json: el listado completo lleva ETag de la versión de
+pedidos, y ?since=<cursor> devuelve solo lo cambiado sin retroceder.
+"""
+from conftest import agregar, sincronizar
+
+
+def test_listado_completo_responde_304(admin, mesero, mesa, productos):
+    r = admin.get("/admin/pedidos.json")
+    etag = r.headers["ETag"]
+
+    assert admin.get("/admin/pedidos.json", headers={"If-None-Match": etag}).status_code == 304
+
+    sincronizar(mesero, mesa, agregar(f"etag-{mesa}", mesa, {next(iter(productos)): 1}))
+    r = admin.get("/admin/pedidos.json", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+
+
+def test_cursor_de_pedidos_no_retrocede(admin, mesero, mesa, productos):
+    cursor = admin.get("/admin/pedidos.json").json["cursor"]
+
+    pedido = sincronizar(mesero, mesa, agregar(f"cur-{mesa}", mesa, {next(iter(productos)): 1}))
+    pedido_id = pedido["pedidos"][str(mesa)]["id"]
+    delta = admin.get(f"/admin/pedidos.json?since={cursor}").json
+    vacio = admin.get(f"/admin/pedidos.json?since={delta['cursor']}").json
+
+    assert delta["cursor"] > cursor
+    assert [p["id"] for p in delta["pedidos"]].count(pedido_id) == 1
+    assert vacio["cursor"] == delta["cursor"]
+    assert vacio["pedidos"] == [] and vacio["eliminados"] == []
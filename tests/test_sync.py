@@ -0,0 +1,30 @@
+"""
+Reenvíos de la cola offline por /sync: la misma mutación (mismo id) se
+aplica una sola vez. Un lote mal formado recibe 400.
+"""
+from conftest import agregar, sincronizar
+
+
+def test_sync_repetido_no_duplica(mesero, mesa, productos):
+    pid, precio = next(iter(productos.items()))
+    mutacion = agregar(f"sync-{mesa}", mesa, {pid: 2})
+
+    primera = sincronizar(mesero, mesa, mutacion)
+    # Respuesta perdida: la cola reenvía el lote completo, dos veces.
+    segunda = sincronizar(mesero, mesa, mutacion, mutacion)
+
+    assert primera["aplicadas"] == [mutacion["id"]]
+    assert mutacion["id"] in segunda["aplicadas"]
+    pedido = segunda["pedidos"][str(mesa)]
+    assert pedido["items"] == 2
+    assert pedido["total"] == 2 * precio
+
+
+def test_sync_ver_invalido(mesero, mesa):
+    for ver in (5, "1,2", True):
+        r = mesero.post("/sync", json={"mutaciones": [], "ver": ver})
+        assert r.status_code == 400, ver
+
+    r = mesero.post("/sync", json={"mutaciones": [], "ver": [mesa]})
+    assert r.status_code == 200
+    assert str(mesa) in r.json["pedidos"]
@@ -0,0 +1,118 @@
+"""
+versiones.py — versión de cambios compartida entre workers.
+
+Cada escritura que toca el estado de las mesas o las líneas de los pedidos
+sube un contador en la tabla version_cambio dentro de su propia transacción.
+Los endpoints de polling (/mesas.json, /admin/pedidos.json) usan ese número
+como ETag fuerte y responden 304 sin consultar las tablas de pedidos.
+
+Cada pedido lleva además su propia versión (pedido.version) para la
+comanda del mesero, que solo mira un pedido.
+
+Costo: la fila "pedidos" la actualiza toda escritura de pedidos, así que
+en PostgreSQL esas escrituras se serializan en el COMMIT (el UPDATE del
+contador va al final, así que la espera es solo la del COMMIT de la otra,
+no su transacción completa). Los candados por mesa (db_utils.bloquear)
+sí dejan avanzar en paralelo todo lo anterior al COMMIT.
+"""
+from flask import request, make_response
+from sqlalchemy import event, select, update
+
+from extensions import db
+from models import Pedido, VersionCambio
+
+MESAS    = "mesas"
+PEDIDOS  = "pedidos"
+CATALOGO = "catalogo"
+USUARIOS = "usuarios"       # sello de identidades.py, no es un ETag
+
+CLAVES = (MESAS, PEDIDOS, CATALOGO, USUARIOS)
+
+_PENDIENTES = "versiones_pendientes"      # clave en session.info
+
+
+def asegurar():
+    """Crea las filas de contador que falten (se llama al arrancar)."""
+    existentes = set(db.session.execute(select(VersionCambio.clave)).scalars())
+    for clave in CLAVES:
+        if clave not in existentes:
+            db.session.add(VersionCambio(clave=clave, valor=0))
+    db.session.commit()
+
+
+def actual(clave: str) -> int:
+    valor = db.session.execute(
+        select(VersionCambio.valor).where(VersionCambio.clave == clave)
+    ).scalar()
+    return valor or 0
+
+
+def subir(*claves: str):
+    """
+    Marca los contadores para subirlos al confirmar la escritura (no hace
+    commit). El UPDATE de verdad va en _subir_al_confirmar, justo antes
+    del COMMIT y en orden de clave.
+    """
+    db.session.info.setdefault(_PENDIENTES, set()).update(claves)
+
+
+def _subir_al_confirmar(session):
+    # Todas las transacciones toman las filas de version_cambio al final y
+    # en el mismo orden (sorted): en PostgreSQL dos escrituras no pueden
+    # esperarse en cruz (MESAS→PEDIDOS contra PEDIDOS→MESAS = deadlock), y
+    # el candado de la fila dura solo lo que tarda el COMMIT.
+    claves = session.info.pop(_PENDIENTES, None)
+    if not claves:
+        return
+    # before_commit corre antes del último flush: las filas pendientes del
+    # ORM se escriben (y se bloquean) ya, no después de los contadores.
+    session.flush()
+    for clave in sorted(claves):
+        res = session.execute(
+            update(VersionCambio)
+            .where(VersionCambio.clave == clave)
+            .values(valor=VersionCambio.valor + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if res.rowcount == 0:
+            session.add(VersionCambio(clave=clave, valor=1))
+            session.flush()
+
+
+def _descartar(session):
+    # Rollback (p. ej. db_utils.reintentar): el reintento las vuelve a marcar.
+    session.info.pop(_PENDIENTES, None)
+
+
+# Una sola vez por proceso, sobre la sesión global (no por create_app).
+event.listen(db.session, "before_commit", _subir_al_confirmar)
+event.listen(db.session, "after_rollback", _descartar)
+
+
+def subir_pedido(pedido_id: int):
+    """Incrementa pedido.version. No hace commit: va con la escritura."""
+    db.session.execute(
+        update(Pedido)
+        .where(Pedido.id == pedido_id)
+        .values(version=Pedido.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def respuesta_condicional(clave: str, construir):
+    """
+    Devuelve 304 si el cliente ya tiene la versión actual (If-None-Match);
+    si no, llama a construir() y marca la respuesta con el ETag.
+    """
+    return respuesta_con_etag(f"{clave}-{actual(clave)}", construir)
+
+
+def respuesta_con_etag(etag: str, construir):
+    # En débil: compresion.py marca W/ el ETag de las respuestas gzip.
+    if request.if_none_match.contains_weak(etag):
+        resp = make_response("", 304)
+    else:
+        resp = make_response(construir())
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
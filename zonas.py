@@ -0,0 +1,36 @@
+"""
+zonas.py — helpers de zona horaria.
+
+En la BD las fechas se guardan en UTC (naive); el negocio opera en hora de
+Bogotá. app.py re-exporta estos nombres.
+"""
+from zoneinfo import ZoneInfo
+from datetime import datetime, date, time
+
+UTC = ZoneInfo("UTC")
+BOG = ZoneInfo("America/Bogota")
+
+
+def to_bogota(dt: datetime) -> datetime:
+    if not dt:
+        return dt
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return dt.astimezone(BOG)
+
+
+def bogota_now() -> datetime:
+    return datetime.now(tz=BOG)
+
+
+def bogota_day_to_utc_range(d: date):
+    inicio_bog = datetime.combine(d, time.min).replace(tzinfo=BOG)
+    fin_bog    = datetime.combine(d, time.max).replace(tzinfo=BOG)
+    inicio_utc = inicio_bog.astimezone(UTC).replace(tzinfo=None)
+    fin_utc    = fin_bog.astimezone(UTC).replace(tzinfo=None)
+    return inicio_utc, fin_utc
+
+
+def dia_bogota(dt: datetime) -> date:
+    """Día de negocio (fecha local de Bogotá) de una fecha UTC."""
+    return to_bogota(dt).date()